@@ -5,6 +5,52 @@ Ce package fournit des fonctions d'appui pour la génération du notebook princi
 
 Modules principaux :
 - clean_data.py : contient les fonctions de lecture, écriture, nettoyage, imputation.
+- imputation.py : imputation des plus proches voisins sur un index de donneurs commun
+  à plusieurs années, ou par strate (État, FORMTYPE, tranche d'âge).
+- validation.py : contrôle de qualité des bases (contrat déclaré dans la configuration,
+  un passage vectorisé par année, rapport structuré).
 - analyse_data.py : contient les fonctions de visualisation.
+- states.py : table de correspondance des États (FIPS entier, USPS, nom, ligne
+  géographique), clé des jointures des cartes, classements et comparaisons.
 - model.py : contient les fonctions liés à la construction de l'indice synthètique de santé.
+- ranking.py : contient le moteur de classement des États (incertitude sur les rangs,
+  accord entre classements : Kendall, Spearman, top-k).
+- catalog.py : catalogue des statistiques de colonnes (modalités, bornes, valeurs
+  manquantes, totaux pondérés), calculé à l'imputation et conservé en métadonnées.
+- survey.py : bases NSCH imputées au format Feather, lues par projection mémoire, ou en
+  mémoire partagée pour les pools de processus (colonnes en vues numpy sans copie).
+- cube.py : cube des effectifs pondérés par (année, État, FORMTYPE, variable, modalité),
+  d'où se déduisent les indicateurs et les répartitions sans relire les bases.
+- accumulators.py : sommes pondérées par État fusionnables (Σw, Σw·x, Σw·x², effectif),
+  alimentées par morceaux de fichiers SAS/parquet et réparties en map-reduce.
+- state_means.py : moyennes orientées de chaque variable par (année, État) ; les thèmes
+  alternatifs s'évaluent comme sous-ensembles de colonnes.
+- regression.py : régressions linéaires pondérées par (année, État), estimées en lot
+  (produits croisés par groupe, résolution groupée, écarts-types robustes HC1).
+- logistic.py : régressions logistiques pondérées des variables binaires, sur un plan
+  d'expérience creux construit une fois, avec démarrage à chaud et pool de processus.
+- store.py : contient le stock persistant d'indicateurs (parquet partitionné) et son API de lecture.
+- server.py, load_test.py : service HTTP local des indicateurs et son test de charge.
+- sensitivity.py : contient l'analyse de sensibilité aux poids et aux règles d'agrégation.
+- pipeline.py, __main__.py : chaîne de traitement complète en ligne de commande
+  (`python -m script --config config/pipeline.json`).
+- profiling.py : instrumentation des étapes (temps, CPU, mémoire, volumes, cProfile).
+- benchmark.py : mesures de performance (temps d'import, suite de mesures sur données
+  synthétiques et comparaison entre commits).
+- synthetic.py : génération de données synthétiques au format NSCH, BEA et shapefile.
+
+Les sous-modules sont chargés à la demande (`script.model` n'est importé qu'au premier
+accès) et les dépendances lourdes (pile graphique, scikit-learn, scipy) ne sont importées
+que par les fonctions qui les utilisent.
 """
+import importlib
+
+
+def __getattr__(name):
+    # accès paresseux aux sous-modules : `script.model` importe script/model.py à la demande
+    try:
+        return importlib.import_module(f"{__name__}.{name}")
+    except ModuleNotFoundError as error:
+        if error.name != f"{__name__}.{name}":
+            raise
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
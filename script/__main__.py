@@ -0,0 +1,40 @@
+"""
+Point d'entrée en ligne de commande :
+
+    python -m script --config config/pipeline.json --years 2024 2023 --workers 4 \
+        --cache-dir /scratch/data/ --profile
+"""
+import argparse
+import os
+
+from script import pipeline, profiling
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m script",
+        description="Calcul de l'indicateur de santé des enfants par État (NSCH)")
+    parser.add_argument("--config", default=pipeline.DEFAULT_CONFIG,
+                        help="fichier de configuration JSON (chemins et listes de variables)")
+    parser.add_argument("--years", nargs="+", help="années à traiter (par défaut : configuration)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="nombre de processus pour l'imputation")
+    parser.add_argument("--cache-dir", help="dossier local des fichiers téléchargés")
+    parser.add_argument("--output-dir", help="dossier des exports")
+    parser.add_argument("--profile", action="store_true",
+                        help="profil cProfile par étape, écrit dans <output-dir>/profiles/")
+    args = parser.parse_args(argv)
+
+    config = pipeline.load_config(args.config)
+    output_dir = args.output_dir or config["paths"]["output_dir"]
+    kwargs = dict(years=args.years, workers=args.workers, cache_dir=args.cache_dir,
+                  output_dir=output_dir)
+
+    if args.profile:
+        profiling.configure(profile_dir=os.path.join(output_dir, "profiles"))
+    pipeline.run(config, **kwargs)
+    print(profiling.report().to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Accumulateurs fusionnables des sommes pondérées par État : pour chaque (année, FIPSST,
+variable), Σw, Σw·x, Σw·x² et l'effectif des valeurs renseignées, avec Σw et l'effectif
+de toutes les lignes et les modalités observées de chaque variable.
+
+Les accumulateurs (`StateMoments`) sont alimentés par morceaux (`iter_chunks` : fichiers
+SAS, parquet ou Feather lus par blocs, ou DataFrame découpé), puis fusionnés entre
+morceaux, années ou processus (`StateMoments.merge`). Les sous-indicateurs se déduisent
+des sommes finales (`model.theme_indicator_moments`), avec les mêmes valeurs que
+`model.calculate_indicator` sur les bases complètes : le calcul tient en mémoire
+constante et se répartit par partitions, à la manière d'un map-reduce
+(`map_reduce`, pool de processus local).
+
+Exemple :
+    moments = map_reduce({"2024": "data/nsch_2024.parquet",
+                          "2023": "data/nsch_2023.parquet"}, variables, max_workers=4)
+    model.global_health_over_years(years, df_eco, moments, ...)   # comme avec dfs_final
+"""
+import functools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Σw, Σw·x, Σw·x² et effectif des valeurs renseignées (premier axe de `moments`)
+MOMENTS = ("weight", "weighted_sum", "weighted_squares", "count")
+
+
+def _affine(transform, codes):
+    """
+    Coefficients (a, b) tels que transform(x) = a + b·x sur les modalités observées :
+    la moyenne transformée se déduit alors de Σw et Σw·x. Les transformations de
+    `model.orientation` sont affines sur les modalités NSCH (|x - 2| sur {1, 2}).
+    """
+    x = np.asarray(codes, dtype=float)
+    if len(x) == 0:
+        return 0.0, 1.0
+    y = np.asarray(transform(x), dtype=float)
+    if len(x) == 1:
+        return float(y[0]), 0.0
+    b = (y[-1] - y[0]) / (x[-1] - x[0])
+    a = y[0] - b * x[0]
+    if not np.allclose(a + b * x, y):
+        raise ValueError("transformation non affine sur les modalités observées : "
+                         f"{x.tolist()} -> {y.tolist()}")
+    return a, b
+
+
+class StateMoments:
+    """
+    Sommes pondérées par (année, FIPSST, variable), fusionnables.
+
+    Les tableaux sont indexés directement par le code FIPSST (entier) : deux
+    accumulateurs se fusionnent par simple addition, quels que soient les États
+    rencontrés par chacun.
+
+    Args:
+        variables (list) : variables accumulées (catégorielles ou binaires)
+        totals (dict) : année -> tableau (2 x FIPSST) : Σw et effectif de toutes les lignes
+        moments (dict) : année -> tableau (`MOMENTS` x FIPSST x variables)
+        codes (dict) : année -> liste des modalités observées de chaque variable
+    """
+
+    def __init__(self, variables, totals=None, moments=None, codes=None):
+        self.variables = list(variables)
+        self.totals = totals or {}
+        self.moments = moments or {}
+        self.codes = codes or {}
+        self._position = {var: j for j, var in enumerate(self.variables)}
+
+    @property
+    def years(self):
+        return list(self.moments)
+
+    def _grow(self, year, size):
+        # un État de code plus élevé agrandit les tableaux de l'année
+        if year not in self.moments:
+            self.totals[year] = np.zeros((2, 0))
+            self.moments[year] = np.zeros((len(MOMENTS), 0, len(self.variables)))
+            self.codes[year] = [np.empty(0) for _ in self.variables]
+        current = self.totals[year].shape[1]
+        if size > current:
+            self.totals[year] = np.pad(self.totals[year], ((0, 0), (0, size - current)))
+            self.moments[year] = np.pad(self.moments[year],
+                                        ((0, 0), (0, size - current), (0, 0)))
+
+    def update(self, year, chunk, fips="FIPSST", weight="FWC"):
+        """
+        Ajoute un morceau de base aux sommes de l'année.
+
+        Args:
+            year (str) : année
+            chunk : pandas.DataFrame (ou dictionnaire de colonnes) avec les colonnes
+                FIPSST (entier ou texte "01"), FWC et les variables accumulées
+            fips, weight (str) : colonnes de l'État et des poids
+
+        Returns:
+            StateMoments : l'accumulateur lui-même
+        """
+        state = np.asarray(chunk[fips]).astype(np.int64)
+        w = np.asarray(chunk[weight], dtype=float)
+        self._grow(year, int(state.max()) + 1 if len(state) else 0)
+        size = self.totals[year].shape[1]
+        totals, moments, codes = self.totals[year], self.moments[year], self.codes[year]
+
+        totals[0] += np.bincount(state, weights=w, minlength=size)
+        totals[1] += np.bincount(state, minlength=size)
+        for j, var in enumerate(self.variables):
+            x = np.asarray(chunk[var], dtype=float)
+            observed = ~np.isnan(x)
+            x, wx, where = x[observed], w[observed], state[observed]
+            moments[0, :, j] += np.bincount(where, weights=wx, minlength=size)
+            wx = wx * x
+            moments[1, :, j] += np.bincount(where, weights=wx, minlength=size)
+            moments[2, :, j] += np.bincount(where, weights=wx * x, minlength=size)
+            moments[3, :, j] += np.bincount(where, minlength=size)
+            codes[j] = np.union1d(codes[j], pd.unique(x))
+        return self
+
+    def merge(self, other):
+        """
+        Fusion de deux accumulateurs (morceaux, années ou processus différents).
+
+        Returns:
+            StateMoments : nouvel accumulateur, somme des deux
+        """
+        if other.variables != self.variables:
+            raise ValueError("accumulateurs de variables différentes : "
+                             f"{self.variables} / {other.variables}")
+        merged = StateMoments(self.variables)
+        for source in (self, other):
+            for year in source.years:
+                size = source.totals[year].shape[1]
+                merged._grow(year, size)
+                merged.totals[year][:, :size] += source.totals[year]
+                merged.moments[year][:, :size] += source.moments[year]
+                merged.codes[year] = [np.union1d(a, b) for a, b
+                                      in zip(merged.codes[year], source.codes[year])]
+        return merged
+
+    def __add__(self, other):
+        return self.merge(other)
+
+    def states(self, year):
+        """
+        Codes FIPSST des États présents dans l'année.
+        """
+        return pd.Index(np.flatnonzero(self.totals[year][1] > 0), name="FIPSST")
+
+    def statistics(self, year):
+        """
+        Statistiques des variables accumulées, sous la forme du catalogue
+        (`script.catalog.column_statistics`, sans la répartition par FORMTYPE).
+
+        Returns:
+            dict : variable -> {"count", "missing", "min", "max", "distinct", "codes",
+                "weight", "weighted_sum"}
+        """
+        total = int(self.totals[year][1].sum())
+        moments = self.moments[year].sum(axis=1)
+        stats = {}
+        for j, var in enumerate(self.variables):
+            codes = self.codes[year][j]
+            stats[var] = {
+                "count": total,
+                "missing": total - int(moments[3, j]),
+                "min": float(codes[0]) if len(codes) else None,
+                "max": float(codes[-1]) if len(codes) else None,
+                "distinct": len(codes),
+                "codes": codes.tolist(),
+                "weight": float(moments[0, j]),
+                "weighted_sum": float(moments[1, j]),
+            }
+        return stats
+
+    def weighted_means(self, year, variables, transforms=None):
+        """
+        Moyennes pondérées par État, éventuellement après transformation de chaque
+        variable ; comme `model.state_indicator`, les poids des valeurs manquantes
+        comptent au dénominateur.
+
+        Args:
+            year (str) : année
+            variables (list) : variables
+            transforms (dict) : variable -> transformation affine sur les modalités
+                (par exemple `model.orientation`)
+
+        Returns:
+            pandas.DataFrame (FIPSST x variables)
+        """
+        transforms = transforms or {}
+        present = self.totals[year][1] > 0
+        weight = self.totals[year][0][present]
+        means = {}
+        for var in variables:
+            j = self._position[var]
+            a, b = (_affine(transforms[var], self.codes[year][j]) if var in transforms
+                    else (0.0, 1.0))
+            sums = a * self.moments[year][0, present, j] + b * self.moments[year][1, present, j]
+            means[var] = sums / weight
+        return pd.DataFrame(means, index=self.states(year))
+
+    def weighted_variances(self, year, variables, transforms=None):
+        """
+        Variances pondérées par État des valeurs renseignées (Σw·x² / Σw - moyenne²),
+        éventuellement après transformation affine de chaque variable.
+
+        Returns:
+            pandas.DataFrame (FIPSST x variables)
+        """
+        transforms = transforms or {}
+        present = self.totals[year][1] > 0
+        variances = {}
+        for var in variables:
+            j = self._position[var]
+            b = (_affine(transforms[var], self.codes[year][j])[1] if var in transforms
+                 else 1.0)
+            weight, sums, squares = self.moments[year][:3, present, j]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                mean = sums / weight
+                variances[var] = b ** 2 * np.maximum(squares / weight - mean ** 2, 0)
+        return pd.DataFrame(variances, index=self.states(year))
+
+
+def iter_chunks(source, columns, chunksize=100_000, row_groups=None):
+    """
+    Lecture d'une base par morceaux de `chunksize` lignes, sans la charger en entier.
+
+    Args:
+        source : chemin d'un fichier SAS (.sas7bdat), parquet (.parquet) ou Feather
+            (.feather, lu par projection mémoire), ou pandas.DataFrame
+        columns (list) : colonnes lues
+        chunksize (int) : nombre de lignes par morceau
+        row_groups (list) : groupes de lignes à lire (fichiers parquet)
+
+    Yields:
+        pandas.DataFrame
+    """
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunksize):
+            yield source.iloc[start:start + chunksize][columns]
+        return
+    path = str(source)
+    if path.endswith(".sas7bdat"):
+        # pas de sélection de colonnes à la lecture d'un fichier SAS
+        with pd.read_sas(path, format="sas7bdat", encoding="latin1",
+                         chunksize=chunksize) as reader:
+            for chunk in reader:
+                yield chunk[columns]
+    elif path.endswith(".feather"):
+        import pyarrow.feather as feather
+
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        for batch in table.to_batches(max_chunksize=chunksize):
+            yield batch.to_pandas()
+    else:
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=chunksize, row_groups=row_groups,
+                                          columns=columns):
+            yield batch.to_pandas()
+
+
+def partitions(sources, row_groups=1, rows=1_000_000):
+    """
+    Découpage des bases en partitions indépendantes (tâches « map »).
+
+    Args:
+        sources (dict) : année -> chemin de fichier ou pandas.DataFrame
+        row_groups (int) : groupes de lignes par partition (fichiers parquet)
+        rows (int) : lignes par partition (DataFrame)
+
+    Returns:
+        list : (année, source, groupes de lignes ou None)
+    """
+    tasks = []
+    for year, source in sources.items():
+        if isinstance(source, pd.DataFrame):
+            tasks += [(year, source.iloc[start:start + rows], None)
+                      for start in range(0, len(source), rows)]
+        elif str(source).endswith(".parquet"):
+            import pyarrow.parquet as pq
+
+            n_groups = pq.ParquetFile(str(source)).metadata.num_row_groups
+            tasks += [(year, source, list(range(start, min(start + row_groups, n_groups))))
+                      for start in range(0, n_groups, row_groups)]
+        else:
+            tasks.append((year, source, None))
+    return tasks
+
+
+def accumulate(partition, variables, chunksize=100_000, fips="FIPSST", weight="FWC"):
+    """
+    Tâche « map » : sommes pondérées d'une partition, lue par morceaux.
+
+    Args:
+        partition (tuple) : (année, source, groupes de lignes), voir `partitions`
+        variables (list) : variables accumulées
+        chunksize (int) : nombre de lignes par morceau
+
+    Returns:
+        StateMoments
+    """
+    year, source, row_groups = partition
+    moments = StateMoments(variables)
+    columns = list(dict.fromkeys([fips, weight] + list(variables)))
+    for chunk in iter_chunks(source, columns, chunksize, row_groups):
+        moments.update(year, chunk, fips, weight)
+    return moments
+
+
+def map_reduce(sources, variables, max_workers=None, chunksize=100_000, row_groups=1):
+    """
+    Sommes pondérées de toutes les années : une tâche par partition (pool de
+    processus local, à la place d'une grappe de calcul), puis fusion des résultats.
+
+    Args:
+        sources (dict) : année -> chemin de fichier ou pandas.DataFrame
+        variables (list) : variables accumulées (par exemple
+            `pipeline.theme_variables(config["variables"])`)
+        max_workers (int) : nombre de processus (1 : exécution séquentielle)
+        chunksize (int) : nombre de lignes par morceau
+        row_groups (int) : groupes de lignes par partition (fichiers parquet)
+
+    Returns:
+        StateMoments
+    """
+    tasks = partitions(sources, row_groups)
+    task = functools.partial(accumulate, variables=list(variables), chunksize=chunksize)
+    if max_workers is not None and max_workers <= 1:
+        results = map(task, tasks)
+        return functools.reduce(StateMoments.merge, results, StateMoments(variables))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return functools.reduce(StateMoments.merge, executor.map(task, tasks),
+                                StateMoments(variables))
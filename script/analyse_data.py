@@ -1,33 +1,40 @@
-import prince
-import matplotlib.pyplot as plt
 import numpy as np
-import seaborn as sns
-from matplotlib.patches import Ellipse
-import folium
-import geopandas as gpd  # pour la gestion des données géographiques (fichiers .shp)
-import branca
-import ipywidgets as widgets
-from IPython.display import display
-from IPython.display import clear_output
-from scipy.stats import kendalltau
 import pandas as pd
+from script.model import is_columnar
+from script.profiling import profiled
+from script.ranking import pairwise_agreement
 
+# Les bibliothèques de visualisation (prince, matplotlib, seaborn, folium, geopandas,
+# branca, ipywidgets, IPython) sont importées dans les fonctions qui les utilisent :
+# importer ce module ne charge pas la pile graphique.
 
+
+@profiled()
 def bar_plot(year, dfs, variable, guide):
     """
     Réaliser un bar plot.
 
     Args :
         year (str) : années d'intéret
-        dfs (dict) : dictionnaire des bases de données
+        dfs (dict) : dictionnaire des bases de données, ou cube des effectifs pondérés
+            (`script.cube.WeightedCube`) : les effectifs sont alors lus dans le cube
         variable (str) : Le critère de regroupement.
         guide (pd object) : Le guide des variables NSCH.
 
     Returns : un bar plot
     """
-
-    df = dfs[year]
-    ax = sns.countplot(data=df, x=variable)
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    if hasattr(dfs, "distribution"):
+        counts = dfs.distribution(year, variable)
+        # modalités entières affichées sans décimale, comme les clés du guide
+        labels = [str(int(code)) if float(code).is_integer() else str(code)
+                  for code in counts.index]
+        ax = sns.barplot(x=labels, y=counts.to_numpy())
+    else:
+        df = dfs[year]
+        ax = sns.countplot(data=df, x=variable)
 
     # récuperer la signification du codage de la réponse
     responde_str = guide.loc[guide["Variable"] == variable, "Response Code"].iloc[0]
@@ -63,6 +70,8 @@ def interactive_barplot(variables, dfs, df_guide):
     Returns:
         None
     """
+    import ipywidgets as widgets
+    from IPython.display import display
 
     year_selector = widgets.Dropdown(
         options=["2024", "2023", "2022", "2021"],
@@ -87,27 +96,38 @@ def interactive_barplot(variables, dfs, df_guide):
     display(interactive_plot)
 
 
+@profiled()
 def mca_analysis(year, dfs, drop_columns):
     """
     Réaliser une ACM.
 
     Args:
         year (str): L'année du formulaire.
-        dfs (dict): Le dictionnaire des bases des formulaires NSCH.
+        dfs (dict): Le dictionnaire des bases des formulaires NSCH (ou un stockage
+            colonne `script.survey.Survey`).
         drop_columns (list) : La liste des colonnes à filtrer.
 
     Returns:
         df_mca : La base de données adéquate pour réaliser l'ACM.
         mca : Objet mca.
     """
-    df = dfs[year]
-    df_mca = df.drop(columns=[col for col in drop_columns])
-    df_mca = df_mca.drop(columns=[col for col in df_mca.columns if 'imputed' in col])
+    import prince
+
+    if is_columnar(dfs):
+        # stockage colonne : seules les variables de l'ACM sont lues
+        columns = [col for col in dfs.columns(year)
+                   if col not in drop_columns and 'imputed' not in col]
+        df_mca = dfs.frame(year, columns)
+    else:
+        df = dfs[year]
+        df_mca = df.drop(columns=[col for col in drop_columns])
+        df_mca = df_mca.drop(columns=[col for col in df_mca.columns if 'imputed' in col])
 
     mca = prince.MCA(n_components=2).fit(df_mca)
     return df_mca, mca
 
 
+@profiled()
 def mca_plot_individuals(df_mca, mca):
     """
     Visualisation des individus de la base de données dans un plan 2D.
@@ -119,6 +139,8 @@ def mca_plot_individuals(df_mca, mca):
     Returns:
         génération d'un plot (pas de return explicite)
     """
+    import matplotlib.pyplot as plt
+
     row_coords = mca.row_coordinates(df_mca)
 
     plt.figure(figsize=(10, 10))
@@ -145,6 +167,7 @@ def mca_plot_individuals(df_mca, mca):
     plt.show()
 
 
+@profiled()
 def mca_plot_individuals_group(df_mca, mca, variable, guide):
     """
     Visualisation des individus selon un critère de regroument.
@@ -158,6 +181,10 @@ def mca_plot_individuals_group(df_mca, mca, variable, guide):
     Returns:
         génération d'un plot (pas de return explicite)
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from matplotlib.patches import Ellipse
+
     row_coords = mca.row_coordinates(df_mca)
     groups = df_mca[variable].unique()
     # Les variables sont catégorielles et la légende se présente sous forme d'un str
@@ -204,6 +231,7 @@ def mca_plot_individuals_group(df_mca, mca, variable, guide):
     plt.show()
 
 
+@profiled()
 def mca_plot_categories(df_mca, mca, seuil):
     """
     Visualisation des modalités (variables catégorielles) de la base de données dans un plan 2D.
@@ -216,6 +244,8 @@ def mca_plot_categories(df_mca, mca, seuil):
     Returns:
         génération d'une figure avec 2 plot (pas de return explicite)
     """
+    import matplotlib.pyplot as plt
+
     # Pour les modalités, le graphique est très dense
     # La longueur de la flèche indique l’importance de cette modalité dans l’espace MCA
     # plus la flèche est longue, plus cette modalité contribue à la variance
@@ -262,6 +292,7 @@ def mca_plot_categories(df_mca, mca, seuil):
     plt.show()
 
 
+@profiled()
 def heatmap_generator(df):
     """
     Visualisation de la matrice des corrélations de façon hierarchique.
@@ -272,6 +303,9 @@ def heatmap_generator(df):
     Returns:
         génération d'un plot (pas de return explicite)
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     matrix = df.corr()
 
     sns.set_theme(style="white")  # style propre
@@ -298,6 +332,7 @@ def heatmap_generator(df):
     plt.show()
 
 
+@profiled()
 def boxplot_image(title, y_label, column):
     """
     Génère une boîte à moustaches (boxplot) pour une variable numérique et un violin plot.
@@ -313,6 +348,8 @@ def boxplot_image(title, y_label, column):
     Returns:
         None
     """
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(8, 6))
 
     plt.subplot(1, 2, 1)
@@ -330,7 +367,8 @@ def boxplot_image(title, y_label, column):
     plt.show()
 
 
-def map_united_states(df_indicator, df_geo, year):
+@profiled()
+def map_united_states(df_indicator, df_geo, year, crosswalk=None):
     """
     Crée une carte choroplèthe interactive des États-Unis représentant
     un indicateur global de santé des enfants pour une année donnée.
@@ -350,13 +388,16 @@ def map_united_states(df_indicator, df_geo, year):
         df_geo : geopandas.GeoDataFrame
             GeoDataFrame contenant les polygones des États américains.
             Doit inclure les colonnes :
-            - "GeoFIPS" : code FIPS sous forme de chaîne
+            - "FIPSST" : code FIPS entier (ou, à défaut, "GeoFIPS")
             - "GeoName" : nom de l'État
             - "geometry" : géométrie des États
 
         year : str
             Année de l'indicateur de santé à afficher sur la carte.
 
+        crosswalk : script.states.StateCrosswalk, optionnel
+            Correspondance des États construite sur `df_geo` (construite ici si absente).
+
     Returns:
         folium.Map
             Objet Folium représentant la carte interactive des États-Unis,
@@ -368,15 +409,21 @@ def map_united_states(df_indicator, df_geo, year):
     Tutoriel Folium utilisé :
     https://python-visualization.github.io/folium/latest/user_guide/geojson/geojson_popup_and_tooltip.html
     """
+    import branca
+    import folium
+    import geopandas as gpd  # pour la gestion des données géographiques (fichiers .shp)
 
-    new_df = df_geo.copy()
-    new_df["FIPSST"] = new_df["GeoFIPS"].str.replace('"', '').str.strip().str[:-3].astype(int)
+    from script.states import StateCrosswalk
 
-    gdf = gpd.GeoDataFrame(new_df, geometry='geometry')
-    df_indicator = df_indicator.rename_axis('FIPSST')
+    crosswalk = crosswalk or StateCrosswalk.from_frame(df_geo)
+    column = f"indicator_global_health_{year}"
 
-    # Merge pour ajouter l'indicateur dans gdf
-    gdf = gdf.merge(df_indicator, on="FIPSST", how="left")
+    # une ligne par État : géométrie par position, indicateur par clé entière FIPSST
+    gdf = gpd.GeoDataFrame({
+        "FIPSST": crosswalk.fips,
+        "GeoName": crosswalk.names().astype(str).to_numpy(),
+        column: crosswalk.align(df_indicator[column]).to_numpy(),
+    }, geometry=crosswalk.rows(df_geo)["geometry"].array)
 
     # Centrer la carte sur les USA
     m = folium.Map([43, -100], zoom_start=4, min_zoom=3, max_zoom=6)
@@ -389,11 +436,15 @@ def map_united_states(df_indicator, df_geo, year):
         caption=f"Indice global de santé (0-1) pour l'année {year}"
     )
 
+    def fill_color(value):
+        # territoire sans indicateur (Porto Rico dans le shapefile du Census) : gris neutre
+        return "lightgray" if value is None or value != value else colormap(value)
+
     # ajout des polygones et des messages
     folium.GeoJson(
         gdf,
         style_function=lambda feature: {
-            'fillColor': colormap(feature['properties'][f'indicator_global_health_{year}']),
+            'fillColor': fill_color(feature['properties'][f'indicator_global_health_{year}']),
             'color': 'black',
             'weight': 0.5,
             'fillOpacity': 0.8,
@@ -436,6 +487,8 @@ def interactive_map(df_indicator, df_geo):
             La fonction ne retourne rien. Elle affiche directement un widget
             interactif et une carte Folium dans le notebook Jupyter.
     """
+    import ipywidgets as widgets
+    from IPython.display import clear_output, display
 
     years = ["2021", "2022", "2023", "2024"]
     year_selector = widgets.Dropdown(
@@ -458,11 +511,14 @@ def interactive_map(df_indicator, df_geo):
         display(map_united_states(df_indicator, df_geo, year=year_selector.value))
 
 
-def kendall_analysis(df_indicator):
+def kendall_analysis(df_indicator, years=("2024", "2023", "2022", "2021"), k=10):
     """
     Calcule le taux de Kendall (tau) entre l'indicateur global de santé et
     plusieurs sous-indicateurs pour chaque année, et retourne un DataFrame récapitulatif.
 
+    Tous les couples (année, sous-indicateur) sont évalués en une seule passe
+    par `ranking.pairwise_agreement`, directement sur les scores des États.
+
     Args:
         df_indicator : pandas.DataFrame
             DataFrame contenant les colonnes suivantes pour chaque année :
@@ -471,6 +527,12 @@ def kendall_analysis(df_indicator):
             - sub_indicator_health_{year}
             - sub_indicator_mental_{year}
 
+        years : list
+            Années à analyser.
+
+        k : int
+            Taille du sommet de classement utilisé pour le recouvrement top-k.
+
     Returns:
         pandas.DataFrame
             DataFrame contenant pour chaque sous-indicateur et chaque année :
@@ -478,37 +540,32 @@ def kendall_analysis(df_indicator):
             - Sub_indicator : le nom du sous-indicateur
             - Kendall_tau : le taux de Kendall entre le sous-indicateur et l'indicateur global
             - p_value : la p-value du test de Kendall
+            - Spearman_rho, Spearman_p_value : corrélation de Spearman et sa p-value
+            - Top_k_overlap : part des k meilleurs États communs aux deux classements
     """
 
-    years = ["2024", "2023", "2022", "2021"]
     sub_indicators = ["sub_indicator_eco", "sub_indicator_health", "sub_indicator_mental"]
 
-    results = []
+    keys = [(str(year), sub) for year in years for sub in sub_indicators]
+    pairs = [(f"indicator_global_health_{year}", f"{sub}_{year}") for year, sub in keys]
 
-    for year in years:
-        for sub in sub_indicators:
-            # Calcul du tau de Kendall et de la p-value pour tester la signification statistique
-            df1 = df_indicator[f"indicator_global_health_{year}"].sort_values(ascending=True)
-            df_global = df1.index.tolist()
-
-            df2 = df_indicator[f"{sub}_{year}"].sort_values(ascending=True)
-            df_sub = df2.index.tolist()
-
-            tau, _ = kendalltau(
-                df_global, df_sub
-            )
-
-            results.append({
-                "Year": year,
-                "Sub_indicator": sub,
-                "Kendall_tau": tau
-            })
+    agreement = pairwise_agreement(df_indicator, pairs=pairs, k=k)
 
     # Retourner un DataFrame
-    return pd.DataFrame(results)
-
-
-def state_rankings(df_indicator, df_geo):
+    return pd.DataFrame({
+        "Year": [year for year, _ in keys],
+        "Sub_indicator": [sub for _, sub in keys],
+        "Kendall_tau": agreement["kendall_tau"],
+        "p_value": agreement["kendall_p_value"],
+        "Spearman_rho": agreement["spearman_rho"],
+        "Spearman_p_value": agreement["spearman_p_value"],
+        "Top_k_overlap": agreement["top_k_overlap"],
+    })
+
+
+@profiled()
+def state_rankings(df_indicator, df_geo, years=("2024", "2023", "2022", "2021"),
+                   rank_intervals=None, crosswalk=None):
     """
     Génère et sauvegarde une heatmap représentant le classement des États
     américains selon un indicateur global de santé pour plusieurs années.
@@ -517,7 +574,7 @@ def state_rankings(df_indicator, df_geo):
     aux noms des États présents dans `df_geo`, calcule les classements
     annuels (1 = meilleur État), puis affiche une matrice colorée où les
     lignes correspondent aux États et les colonnes aux années. Les États
-    sont triés selon leur classement pour l'année la plus récente (2024).
+    sont triés selon leur classement pour la première année de `years` (2024 par défaut).
 
     Le graphique utilise une échelle de couleurs allant du vert (meilleur
     classement) au rouge (moins bon classement), avec les années affichées
@@ -533,44 +590,71 @@ def state_rankings(df_indicator, df_geo):
         df_geo : pandas.DataFrame
             Table de correspondance géographique contenant les informations
             des États. Doit inclure les colonnes :
-            - `GeoFIPS` : code FIPS géographique de l'État
+            - `FIPSST` : code FIPS entier de l'État (ou, à défaut, `GeoFIPS`)
             - `GeoName` : nom de l'État
 
+        years : list
+            Années à représenter, la première servant de classement de référence.
+
+        rank_intervals : pandas.DataFrame, optionnel
+            Résumé de l'incertitude des rangs produit par `ranking.rank_summary`
+            (colonnes FIPSST, Year, median_rank, rank_low, rank_high). Lorsqu'il
+            est fourni, la couleur suit le rang médian et chaque case affiche
+            l'intervalle de rang.
+
+        crosswalk : script.states.StateCrosswalk, optionnel
+            Correspondance des États construite sur `df_geo` (construite ici si absente).
+
     Returns:
     None
         La fonction affiche le graphique et l'enregistre au format JPG
         dans le dossier `docs/`.
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
-    df = df_indicator.reset_index()
-    new_df = df_geo.copy()
-    new_df["FIPSST"] = new_df["GeoFIPS"].str.replace('"', '').str.strip().str[:-3].astype(int)
-    df = df.merge(
-        new_df[['FIPSST', 'GeoName']],
-        on='FIPSST',
-        how='left'
-    )
-    df = df.set_index('GeoName')
-    years = [2024, 2023, 2023, 2021]
-    cols = [f'indicator_global_health_{y}' for y in years]
-
-    df_scores = df[cols]
-    df_rank = df_scores.rank(
-        axis=0,
-        ascending=False,   # Meilleur état - score le plus grand
-        method='min'
-    )
-    # renommer les colonnes
-    df_rank.columns = [str(y) for y in years]
+    from script.states import StateCrosswalk
 
-    # classement de référence : l'année 2024
-    df_rank = df_rank.sort_values(by='2024')
+    crosswalk = crosswalk or StateCrosswalk.from_frame(df_geo)
+    # noms des États par la clé entière FIPSST
+    names = crosswalk.names(df_indicator.index).astype(str).to_numpy()
+    df = df_indicator.rename_axis("FIPSST").reset_index().assign(GeoName=names)
+    df = df.set_index('GeoName')
+    years = [str(y) for y in years]
+
+    if rank_intervals is None:
+        cols = [f'indicator_global_health_{y}' for y in years]
+        df_scores = df[cols]
+        df_rank = df_scores.rank(
+            axis=0,
+            ascending=False,   # Meilleur état - score le plus grand
+            method='min'
+        )
+        # renommer les colonnes
+        df_rank.columns = years
+        annot, fmt = True, ".0f"
+    else:
+        # rang médian et intervalle de rang issus des réplications
+        intervals = rank_intervals.assign(Year=rank_intervals["Year"].astype(str))
+        names = crosswalk.names(intervals["FIPSST"]).astype(str).to_numpy()
+        intervals = intervals.assign(GeoName=names)
+        df_rank = intervals.pivot(index="GeoName", columns="Year", values="median_rank")[years]
+        low = intervals.pivot(index="GeoName", columns="Year", values="rank_low")[years]
+        high = intervals.pivot(index="GeoName", columns="Year", values="rank_high")[years]
+        annot = (df_rank.map("{:.0f}".format) + "\n[" + low.map("{:.0f}".format) + "-"
+                 + high.map("{:.0f}".format) + "]")
+        fmt = ""
+
+    # classement de référence : la première année
+    df_rank = df_rank.sort_values(by=years[0])
+    if not isinstance(annot, bool):
+        annot = annot.loc[df_rank.index]
 
     plt.figure(figsize=(15, 30))
     ax = sns.heatmap(
         df_rank,
-        annot=True,
-        fmt=".0f",
+        annot=annot,
+        fmt=fmt,
         cmap="RdYlGn_r",   # échelle : rouge (pire) ---> vert (meilleur)
         cbar_kws={'label': 'Classement'}
     )
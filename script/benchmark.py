@@ -0,0 +1,584 @@
+"""
+Mesures de performance du package.
+
+Exemples :
+    python -m script.benchmark imports
+    python -m script.benchmark imports --module script.analyse_data
+    python -m script.benchmark suite --sizes 10000 100000 --repeat 3
+    python -m script.benchmark knn --rows 2000
+    python -m script.benchmark compare results/benchmarks/<avant>.json \
+        results/benchmarks/<après>.json
+"""
+import argparse
+import datetime
+import functools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+# modules qui ne doivent pas être chargés par le chemin de calcul de l'indicateur
+PLOTTING_MODULES = ("matplotlib", "folium", "ipywidgets", "seaborn", "prince", "branca")
+COMPUTE_MODULES = ("script.model", "script.clean_data")
+
+# tailles (nombre d'individus NSCH par année) et dossier des résultats de la suite
+SIZES = (10_000, 100_000, 1_000_000)
+RESULTS_DIR = os.path.join("results", "benchmarks")
+
+
+def import_time(module, top=10):
+    """
+    Mesure le temps d'import d'un module dans un interpréteur neuf (`python -X importtime`).
+
+    Args:
+        module (str) : module à importer (ex. "script.model")
+        top (int) : nombre de modules les plus coûteux à rapporter
+
+    Returns:
+        dict : temps total (ms) et liste des `top` imports les plus coûteux
+        (temps cumulé en ms, nom du module)
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        # le nom est indenté de deux espaces par niveau d'import imbriqué
+        timings.append((int(cumulative_us) / 1000, name[1:].rstrip()))
+
+    # les imports de premier niveau (non indentés) se cumulent au temps total
+    total = sum(ms for ms, name in timings if not name.startswith(" "))
+    timings.sort(reverse=True)
+    return {"module": module, "total_ms": total, "top": timings[:top]}
+
+
+def loaded_modules(module):
+    """
+    Liste les modules présents dans `sys.modules` après l'import de `module`
+    dans un interpréteur neuf.
+
+    Args:
+        module (str) : module à importer
+
+    Returns:
+        set : noms des modules chargés
+    """
+    code = f"import json, sys, {module}; print(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code],
+                            capture_output=True, text=True, check=True)
+    return set(json.loads(result.stdout))
+
+
+def check_lazy_imports(modules=COMPUTE_MODULES, forbidden=PLOTTING_MODULES):
+    """
+    Vérifie que le chemin de calcul n'importe pas la pile graphique.
+
+    Args:
+        modules (tuple) : modules du chemin de calcul
+        forbidden (tuple) : paquets qui ne doivent pas être chargés
+
+    Returns:
+        rien ; lève une AssertionError listant les imports fautifs
+    """
+    offenders = {}
+    for module in modules:
+        loaded = loaded_modules(module)
+        found = sorted(name for name in forbidden
+                       if any(m == name or m.startswith(name + ".") for m in loaded))
+        if found:
+            offenders[module] = found
+    assert not offenders, f"Imports non paresseux : {offenders}"
+
+
+def check_knn_imputer(n_rows=2000, years=("2024", "2023"), seed=0, n_neighbors=3):
+    """
+    Vérifie que `DonorIndex` en mode "stratum", construit sur plusieurs années, donne
+    exactement les valeurs de `KNNImputer` ajusté année par année (variables
+    générales, puis HEIGHT/WEIGHT pour FORMTYPE != T1, comme `clean_data.impute_values`).
+
+    Args:
+        n_rows (int) : nombre d'individus par année (données synthétiques)
+        years (tuple) : années
+        seed (int) : graine des données synthétiques
+        n_neighbors (int) : nombre de voisins
+
+    Returns:
+        rien ; lève une AssertionError donnant le nombre de cellules différentes
+    """
+    from sklearn.impute import KNNImputer
+
+    from script.imputation import DonorIndex
+
+    dfs = {}
+    for year, df in Fixture(n_rows, years, seed).dfs.items():
+        df = df.copy()
+        df["FORMTYPE"] = df["FORMTYPE"].str.replace("T", "").astype(float)
+        dfs[year] = df
+    other_cols = list(dfs[years[0]].columns.difference(["HEIGHT", "WEIGHT"]))
+
+    mismatches = {}
+    for cols, rows in ((other_cols, lambda df: df.index),
+                       (["HEIGHT", "WEIGHT"], lambda df: df["FORMTYPE"] != 1)):
+        index = DonorIndex(cols, year_as="stratum")
+        for year, df in dfs.items():
+            index.add(year, df.loc[rows(df)])
+        for year, df in dfs.items():
+            X = df.loc[rows(df), cols].astype(float)
+            expected = KNNImputer(n_neighbors=n_neighbors).fit_transform(X)
+            different = (index.query(year, X, n_neighbors) != expected).sum()
+            if different:
+                mismatches[(year, cols[0])] = int(different)
+    assert not mismatches, f"Cellules différentes de KNNImputer : {mismatches}"
+
+
+class Fixture:
+    """
+    Données synthétiques d'une taille donnée, construites à la demande et
+    partagées entre les mesures (voir `script.synthetic`).
+    """
+
+    def __init__(self, n_rows, years=("2024", "2023"), seed=0):
+        self.n_rows = n_rows
+        self.years = list(years)
+        self.seed = seed
+
+    @functools.cached_property
+    def config(self):
+        from script.pipeline import DEFAULT_CONFIG, load_config
+        return load_config(DEFAULT_CONFIG)
+
+    @functools.cached_property
+    def dfs(self):
+        from script.synthetic import synthetic_dfs
+        return synthetic_dfs(self.years, self.n_rows, self.seed,
+                             variables=self.config["variables"])
+
+    @functools.cached_property
+    def dfs_final(self):
+        from script.synthetic import synthetic_dfs
+        return synthetic_dfs(self.years, self.n_rows, self.seed,
+                             variables=self.config["variables"], imputed=True)
+
+    @functools.cached_property
+    def survey(self):
+        import tempfile
+        from script.survey import write_survey
+        return write_survey(self.dfs_final, tempfile.mkdtemp(prefix="survey_"))
+
+    @functools.cached_property
+    def cube(self):
+        from script.cube import build_cube
+        from script.pipeline import theme_variables
+        return build_cube(self.dfs_final, theme_variables(self.config["variables"]), self.years)
+
+    @functools.cached_property
+    def parquet(self):
+        import os
+        import tempfile
+        # un fichier parquet par année, en groupes de 100 000 lignes (sources « streaming »)
+        directory = tempfile.mkdtemp(prefix="parquet_")
+        paths = {year: os.path.join(directory, f"{year}.parquet") for year in self.years}
+        for year, path in paths.items():
+            self.dfs_final[year].to_parquet(path, row_group_size=100_000)
+        return paths
+
+    @functools.cached_property
+    def moments(self):
+        from script.accumulators import map_reduce
+        from script.pipeline import theme_variables
+        return map_reduce(self.dfs_final, theme_variables(self.config["variables"]),
+                          max_workers=1)
+
+    @functools.cached_property
+    def enrichment(self):
+        from script.pipeline import enrichment
+        from script.synthetic import synthetic_gdp, synthetic_shapefile
+        return enrichment(synthetic_gdp(self.seed), synthetic_shapefile())
+
+    @functools.cached_property
+    def df_indicator(self):
+        from script.pipeline import indicators
+        return indicators(self.config, self.years, self.dfs_final, self.enrichment[1])
+
+    @functools.cached_property
+    def annual_report(self):
+        from script.synthetic import synthetic_annual_report
+        return synthetic_annual_report(self.seed)
+
+
+def _bench_impute_values(fixture):
+    from script.clean_data import impute_values
+
+    year = fixture.years[0]
+    # impute_values modifie la base reçue : copie à chaque exécution
+    return lambda: impute_values(year, fixture.dfs[year].copy())
+
+
+def _bench_impute_values_pooled(fixture):
+    from script.imputation import impute_values_pooled
+
+    return lambda: impute_values_pooled(fixture.years, fixture.dfs)
+
+
+def _bench_impute_values_stratified(fixture):
+    from script.imputation import impute_values_stratified
+
+    year = fixture.years[0]
+    return lambda: impute_values_stratified(year, fixture.dfs[year])
+
+
+def _bench_state_indicator(fixture):
+    from script.model import scale_transformation, state_indicator
+
+    variables = fixture.config["variables"]
+    cat, bins = variables["health_category_vars"], variables["health_bin_vars"]
+    year = fixture.years[0]
+    df_theme = scale_transformation(year, fixture.dfs_final, cat + bins, cat, bins,
+                                    variables["groups"], "health")
+    maximum = df_theme[cat + bins].max().mean()
+    minimum = df_theme[cat + bins].min().mean()
+    return lambda: state_indicator(df_theme, cat + bins, "health", year, minimum, maximum)
+
+
+def _bench_global_health_over_years(fixture):
+    from script.pipeline import indicators
+
+    df_eco = fixture.enrichment[1]
+    return lambda: indicators(fixture.config, fixture.years, fixture.dfs_final, df_eco)
+
+
+def _bench_global_health_over_years_survey(fixture):
+    from script.pipeline import indicators
+
+    survey, df_eco = fixture.survey, fixture.enrichment[1]
+    return lambda: indicators(fixture.config, fixture.years, survey, df_eco)
+
+
+def _bench_build_cube(fixture):
+    from script.cube import build_cube
+    from script.pipeline import theme_variables
+
+    variables = theme_variables(fixture.config["variables"])
+    return lambda: build_cube(fixture.dfs_final, variables, fixture.years)
+
+
+def _bench_global_health_over_years_cube(fixture):
+    from script.pipeline import indicators
+
+    weighted_cube, df_eco = fixture.cube, fixture.enrichment[1]
+    return lambda: indicators(fixture.config, fixture.years, weighted_cube, df_eco)
+
+
+def _bench_map_reduce_moments(fixture):
+    from script.accumulators import map_reduce
+    from script.pipeline import theme_variables
+
+    variables, sources = theme_variables(fixture.config["variables"]), fixture.parquet
+    return lambda: map_reduce(sources, variables, max_workers=1)
+
+
+def _bench_global_health_over_years_moments(fixture):
+    from script.pipeline import indicators
+
+    moments, df_eco = fixture.moments, fixture.enrichment[1]
+    return lambda: indicators(fixture.config, fixture.years, moments, df_eco)
+
+
+def _bench_state_means_evaluate(fixture):
+    import numpy as np
+    from script.state_means import build_state_means
+
+    means = build_state_means(fixture.cube, fixture.config["variables"])
+    # 200 compositions de thèmes tirées au hasard parmi les variables candidates
+    rng = np.random.default_rng(fixture.seed)
+    compositions = {f"theme_{k}": list(rng.choice(means.variables, size=rng.integers(2, 10),
+                                                  replace=False)) for k in range(200)}
+    return lambda: means.evaluate(compositions)
+
+
+def _bench_validate(fixture):
+    from script.validation import build_contract, validate
+
+    contract = build_contract(fixture.config)
+    return lambda: validate(fixture.dfs_final, contract, fixture.years)
+
+
+def _bench_weighted_regressions(fixture):
+    from script.regression import weighted_regressions
+
+    settings, dfs_final = fixture.config["regression"], fixture.dfs_final
+    return lambda: weighted_regressions(dfs_final, settings["outcomes"],
+                                        settings["regressors"], fixture.years)
+
+
+def _bench_weighted_regressions_statsmodels(fixture):
+    from script.regression import regressions_statsmodels
+
+    # référence : un statsmodels.WLS par (année, État, variable expliquée)
+    settings, dfs_final = fixture.config["regression"], fixture.dfs_final
+    return lambda: regressions_statsmodels(dfs_final, settings["outcomes"],
+                                           settings["regressors"], fixture.years)
+
+
+def _bench_weighted_logistic_models(fixture):
+    from script.logistic import weighted_logistic_models
+
+    settings, variables = fixture.config["logistic"], fixture.config["variables"]
+    outcomes = [var for key in settings["outcomes"] for var in variables[key]]
+    dfs_final = fixture.dfs_final
+    return lambda: weighted_logistic_models(dfs_final, outcomes, settings["determinants"],
+                                            fixture.years, max_workers=1)
+
+
+def _bench_logistic_statsmodels(fixture):
+    from script.logistic import logistic_statsmodels
+
+    # référence : un statsmodels.GLM par (année, modèle, variable expliquée)
+    settings, variables = fixture.config["logistic"], fixture.config["variables"]
+    outcomes = [var for key in settings["outcomes"] for var in variables[key]]
+    dfs_final = fixture.dfs_final
+    return lambda: logistic_statsmodels(dfs_final, outcomes, settings["determinants"],
+                                        fixture.years)
+
+
+def _bench_mca_analysis(fixture):
+    from script.analyse_data import mca_analysis
+
+    drop_columns = fixture.config["variables"]["groups"] + ["HEIGHT", "WEIGHT"]
+    return lambda: mca_analysis(fixture.years[0], fixture.dfs_final, drop_columns)
+
+
+def _bench_comparison_new_indicator(fixture):
+    from script.model import comparison_new_indicator
+
+    df_indicator, df_eco_geo = fixture.df_indicator, fixture.enrichment[0]
+    return lambda: comparison_new_indicator(fixture.annual_report, df_indicator, df_eco_geo)
+
+
+def _bench_map_united_states(fixture):
+    from script.analyse_data import map_united_states
+
+    df_indicator, df_eco_geo = fixture.df_indicator, fixture.enrichment[0]
+    # la carte folium n'est sérialisée qu'au rendu : il fait partie de la mesure
+    return lambda: map_united_states(df_indicator, df_eco_geo,
+                                     fixture.years[0]).get_root().render()
+
+
+def _bench_server_map(fixture):
+    import tempfile
+    from script.server import IndicatorServer
+    from script.store import IndicatorStore, write_indicator_store
+    from script.synthetic import synthetic_shapefile
+
+    # stock écrit comme par le pipeline ; shapefile avec Porto Rico (sans indicateur)
+    path = tempfile.mkdtemp(prefix="store_")
+    write_indicator_store(fixture.df_indicator, path)
+    server = IndicatorServer(IndicatorStore(path), synthetic_shapefile())
+    target = f"/map/{fixture.years[0]}"
+
+    def render():
+        result = server.render(target, {})
+        assert result is not None, f"{target} : aucune carte"
+        return result
+    return render
+
+
+# nom -> (préparation renvoyant la fonction mesurée, taille maximale raisonnable)
+# KNNImputer et l'ACM (prince) ne passent pas à l'échelle du million de lignes
+BENCHMARKS = {
+    "impute_values": (_bench_impute_values, 10_000),
+    "impute_values_pooled": (_bench_impute_values_pooled, 10_000),
+    "impute_values_stratified": (_bench_impute_values_stratified, 100_000),
+    "state_indicator": (_bench_state_indicator, None),
+    "global_health_over_years": (_bench_global_health_over_years, None),
+    "global_health_over_years_survey": (_bench_global_health_over_years_survey, None),
+    "build_cube": (_bench_build_cube, None),
+    "global_health_over_years_cube": (_bench_global_health_over_years_cube, None),
+    "map_reduce_moments": (_bench_map_reduce_moments, None),
+    "global_health_over_years_moments": (_bench_global_health_over_years_moments, None),
+    "state_means_evaluate": (_bench_state_means_evaluate, None),
+    "validate": (_bench_validate, None),
+    "weighted_regressions": (_bench_weighted_regressions, None),
+    "weighted_regressions_statsmodels": (_bench_weighted_regressions_statsmodels, None),
+    "weighted_logistic_models": (_bench_weighted_logistic_models, None),
+    "logistic_statsmodels": (_bench_logistic_statsmodels, 100_000),
+    "mca_analysis": (_bench_mca_analysis, 100_000),
+    "comparison_new_indicator": (_bench_comparison_new_indicator, None),
+    "map_united_states": (_bench_map_united_states, None),
+    "server_map": (_bench_server_map, None),
+}
+
+
+def git_commit():
+    """
+    Identifiant du commit courant (suffixé par "-dirty" si l'arbre est modifié).
+
+    Returns:
+        str : hash court, ou "unknown" hors dépôt git
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def time_function(func, repeat=3):
+    """
+    Temps d'exécution (secondes) de `func`, mesuré `repeat` fois.
+
+    Returns:
+        dict : min, médiane et moyenne des temps
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {"min_s": min(timings), "median_s": statistics.median(timings),
+            "mean_s": statistics.fmean(timings), "repeat": repeat}
+
+
+def run_suite(sizes=SIZES, names=None, repeat=3, seed=0, output_dir=RESULTS_DIR):
+    """
+    Exécute la suite de mesures sur des données synthétiques et écrit les résultats
+    dans `<output_dir>/<commit>.json`.
+
+    Args:
+        sizes (tuple) : nombres d'individus NSCH par année
+        names (list) : mesures à exécuter (par défaut toutes celles de `BENCHMARKS`)
+        repeat (int) : nombre d'exécutions par mesure
+        seed (int) : graine des données synthétiques
+        output_dir (str) : dossier des résultats (None pour ne rien écrire)
+
+    Returns:
+        dict : métadonnées de l'exécution et liste des résultats
+    """
+    names = names or list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError(f"Mesures inconnues : {sorted(unknown)}")
+
+    results = []
+    for n_rows in sizes:
+        fixture = Fixture(n_rows, seed=seed)
+        for name in names:
+            setup, max_rows = BENCHMARKS[name]
+            if max_rows is not None and n_rows > max_rows:
+                results.append({"benchmark": name, "n_rows": n_rows, "skipped": True})
+                continue
+            timing = time_function(setup(fixture), repeat)
+            results.append({"benchmark": name, "n_rows": n_rows, "skipped": False, **timing})
+            print(f"{name:<32} {n_rows:>9} lignes : {timing['median_s']:.4f} s", flush=True)
+
+    run = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "seed": seed,
+        "results": results,
+    }
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, f"{run['commit']}.json"), "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+    return run
+
+
+def _load_run(run):
+    if isinstance(run, dict):
+        return run
+    with open(run, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Compare deux exécutions de la suite (médianes des temps).
+
+    Args:
+        baseline : résultats de référence (dict ou chemin du fichier JSON)
+        current : résultats à comparer (dict ou chemin du fichier JSON)
+        threshold (float) : hausse relative au-delà de laquelle une mesure est
+            signalée comme une régression
+
+    Returns:
+        pandas.DataFrame : une ligne par (mesure, taille) présente dans les deux exécutions
+    """
+    import pandas as pd
+
+    frames = []
+    for label, run in [("baseline", baseline), ("current", current)]:
+        df = pd.DataFrame(_load_run(run)["results"])
+        df = df[~df["skipped"]].set_index(["benchmark", "n_rows"])["median_s"]
+        frames.append(df.rename(f"{label}_s"))
+    df = pd.concat(frames, axis=1, join="inner").reset_index()
+    df["ratio"] = df["current_s"] / df["baseline_s"]
+    df["regression"] = df["ratio"] > 1 + threshold
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mesures de performance du package script")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imports = sub.add_parser("imports", help="temps d'import (python -X importtime)")
+    imports.add_argument("--module", action="append",
+                         help="module à mesurer (par défaut : script.model, "
+                              "script.clean_data, script.analyse_data)")
+    imports.add_argument("--top", type=int, default=10)
+
+    suite = sub.add_parser("suite", help="mesures sur données synthétiques")
+    suite.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    suite.add_argument("--benchmark", action="append", choices=list(BENCHMARKS),
+                       help="mesure à exécuter (par défaut : toutes)")
+    suite.add_argument("--repeat", type=int, default=3)
+    suite.add_argument("--seed", type=int, default=0)
+    suite.add_argument("--output-dir", default=RESULTS_DIR)
+
+    knn = sub.add_parser("knn", help="DonorIndex (strate = année) contre KNNImputer")
+    knn.add_argument("--rows", type=int, default=2000)
+    knn.add_argument("--seed", type=int, default=0)
+
+    comparison = sub.add_parser("compare", help="comparaison de deux exécutions de la suite")
+    comparison.add_argument("baseline")
+    comparison.add_argument("current")
+    comparison.add_argument("--threshold", type=float, default=0.1)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "imports":
+        modules = args.module or list(COMPUTE_MODULES) + ["script.analyse_data"]
+        for module in modules:
+            report = import_time(module, args.top)
+            print(f"{module} : {report['total_ms']:.1f} ms")
+            for ms, name in report["top"]:
+                print(f"    {ms:8.1f} ms  {name.strip()}")
+        check_lazy_imports()
+        print("Chemin de calcul : aucun import de la pile graphique")
+
+    elif args.command == "suite":
+        run_suite(args.sizes, args.benchmark, args.repeat, args.seed, args.output_dir)
+
+    elif args.command == "knn":
+        check_knn_imputer(args.rows, seed=args.seed)
+        print("DonorIndex : valeurs identiques à KNNImputer")
+
+    elif args.command == "compare":
+        df = compare(args.baseline, args.current, args.threshold)
+        print(df.to_string(index=False))
+        if df["regression"].any():
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Catalogue des statistiques de colonnes des bases NSCH, calculé une fois par année à
+l'imputation (ou à la lecture des bases imputées, `clean_data.read_on_S3`) : effectif,
+valeurs manquantes (au total et par FORMTYPE), minimum, maximum, modalités distinctes,
+somme des poids FWC et somme pondérée.
+
+Le catalogue voyage avec les données, sous forme de métadonnées :
+- `DataFrame.attrs` pour les bases en mémoire, que pandas écrit dans les métadonnées
+  des fichiers parquet (`clean_data.write_on_S3`) et restaure à la lecture,
+- métadonnées du schéma Arrow des fichiers Feather (`script.survey`),
+- description des blocs de `script.survey.SharedSurvey`.
+
+`model.scale_transformation` et `model.calculate_indicator` lisent le nombre de
+modalités et les bornes dans le catalogue au lieu de parcourir les colonnes ;
+`catalog` donne les taux de valeurs manquantes de toutes les années.
+
+Exemple :
+    attach_statistics(dfs_final)
+    statistics(dfs_final, "2024")["K2Q01"]["codes"]   # [1.0, 2.0, 3.0, 4.0, 5.0]
+    catalog(dfs_final)                                 # tableau (année, variable)
+"""
+import functools
+import json
+
+import numpy as np
+import pandas as pd
+
+# clé des métadonnées (attrs pandas, schéma Arrow)
+STATISTICS_KEY = "nsch_statistics"
+
+# au-delà de ce nombre de modalités, seules les bornes et le nombre de modalités sont gardés
+MAX_CODES = 50
+
+
+def _scalar(value):
+    # types numpy -> types JSON
+    if isinstance(value, (np.bool_, bool)):
+        return bool(value)
+    if isinstance(value, (np.integer, np.floating)):
+        return float(value)
+    return value
+
+
+def column_statistics(df, weight="FWC", formtype="FORMTYPE", max_codes=MAX_CODES,
+                      columns=None):
+    """
+    Statistiques de chaque colonne d'une base.
+
+    Args:
+        df (pandas.DataFrame) : base NSCH
+        weight (str) : colonne des poids (sommes pondérées omises si absente)
+        formtype (str) : colonne du type de questionnaire (valeurs manquantes par FORMTYPE)
+        max_codes (int) : nombre maximal de modalités conservées dans `codes`
+        columns (list) : colonnes décrites (par défaut toutes)
+
+    Returns:
+        dict : variable -> {"count", "missing", "missing_by_formtype", "min", "max",
+            "distinct", "codes", "weight", "weighted_sum"}
+    """
+    weights = df[weight].to_numpy(dtype=float) if weight in df.columns else None
+    if formtype in df.columns:
+        form_code, forms = pd.factorize(df[formtype].astype(str).to_numpy(), sort=True)
+    else:
+        forms, form_code = np.array(["all"]), np.zeros(len(df), dtype=int)
+
+    stats = {}
+    for col in (df.columns if columns is None else columns):
+        values = df[col].to_numpy()
+        numeric = values.dtype.kind in "biuf"
+        if numeric:
+            values = values.astype(float)
+            missing = np.isnan(values)
+        else:
+            missing = pd.isna(values)
+        observed = values[~missing]
+        # modalités distinctes par hachage, puis tri des seules modalités (minimum, maximum)
+        codes = np.sort(pd.unique(observed if numeric else observed.astype(str)))
+
+        entry = {
+            "count": len(values),
+            "missing": int(missing.sum()),
+            "missing_by_formtype": dict(zip(
+                forms.tolist(), np.bincount(form_code[missing], minlength=len(forms)).tolist())),
+            "min": _scalar(codes[0]) if numeric and len(codes) else None,
+            "max": _scalar(codes[-1]) if numeric and len(codes) else None,
+            "distinct": len(codes),
+            "codes": [_scalar(code) for code in codes] if len(codes) <= max_codes else None,
+            "weight": None,
+            "weighted_sum": None,
+        }
+        if weights is not None and numeric:
+            entry["weight"] = float(weights[~missing].sum())
+            entry["weighted_sum"] = float(observed @ weights[~missing])
+        stats[col] = entry
+    return stats
+
+
+def attach_statistics(dfs, years=None):
+    """
+    Calcule le catalogue de chaque année et l'attache à la base (`df.attrs`).
+
+    Le catalogue décrit la base au moment du calcul : il est à recalculer si la
+    base est modifiée ensuite.
+
+    Args:
+        dfs (dict) : dictionnaire des dataset NSCH
+        years (list) : années (par défaut toutes)
+
+    Returns:
+        dict : le même dictionnaire
+    """
+    for year in (years or list(dfs)):
+        dfs[year].attrs[STATISTICS_KEY] = json.dumps(column_statistics(dfs[year]))
+    return dfs
+
+
+@functools.lru_cache(maxsize=64)
+def parse_statistics(text):
+    # lecture des métadonnées JSON, une seule fois par catalogue
+    return json.loads(text)
+
+
+def attached_statistics(df):
+    """
+    Catalogue attaché à une base (`df.attrs`), s'il la décrit encore : mêmes colonnes,
+    dans le même ordre, et même nombre de lignes. pandas recopie les attrs sur les
+    sélections et les copies, dont le catalogue n'est alors plus celui de la base.
+
+    Args:
+        df (pandas.DataFrame) : base NSCH
+
+    Returns:
+        str : catalogue au format JSON, ou None s'il est absent ou ne correspond pas
+    """
+    text = df.attrs.get(STATISTICS_KEY)
+    if text is None:
+        return None
+    stats = parse_statistics(text)
+    if list(stats) != list(df.columns) or any(entry["count"] != len(df)
+                                              for entry in stats.values()):
+        return None
+    return text
+
+
+def statistics(dfs, year, columns=None):
+    """
+    Catalogue d'une année : lu dans les métadonnées du stockage colonne ou de la base,
+    calculé (sans être attaché) s'il est absent ou ne décrit pas la base ; le calcul
+    se limite alors à `columns`.
+
+    Le catalogue n'est attaché qu'à l'imputation (`imputation.format_imputed`) ou par
+    `attach_statistics` : une base modifiée ensuite sans changer de dimensions doit
+    être recataloguée explicitement.
+
+    Args:
+        dfs : dictionnaire des dataset NSCH, ou stockage colonne (`script.survey`)
+        year (str) : année
+        columns (list) : colonnes utiles à l'appelant (par défaut toutes)
+
+    Returns:
+        dict : variable -> statistiques (voir `column_statistics`) ; à ne pas modifier
+    """
+    if hasattr(dfs, "statistics"):
+        return dfs.statistics(year)
+    text = attached_statistics(dfs[year])
+    if text is None:
+        return column_statistics(dfs[year], columns=columns)
+    return parse_statistics(text)
+
+
+def catalog(dfs, years=None):
+    """
+    Catalogue de plusieurs années sous forme de tableau, avec le taux de valeurs
+    manquantes (en %).
+
+    Args:
+        dfs : dictionnaire des dataset NSCH, ou stockage colonne (`script.survey`)
+        years (list) : années (par défaut toutes)
+
+    Returns:
+        pandas.DataFrame indexé par (year, variable)
+    """
+    years = list(years or (dfs.years if hasattr(dfs, "years") else dfs))
+    frames = {year: pd.DataFrame.from_dict(statistics(dfs, year), orient="index")
+              for year in years}
+    df = pd.concat(frames, names=["year", "variable"])
+    df["missing_rate"] = 100 * df["missing"] / df["count"]
+    return df
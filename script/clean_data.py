@@ -1,50 +1,228 @@
 # Librairies
 
+import hashlib
+import json
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
+
 import pandas as pd
-import geopandas as gpd
-from sklearn.impute import KNNImputer
+
+from script.catalog import attach_statistics, attached_statistics
+from script.imputation import format_imputed, impute_values_pooled, impute_values_stratified
+from script.profiling import profiled
+from script.states import parse_geofips
+
+# geopandas et scikit-learn sont importés dans les fonctions qui les utilisent.
 
 # Lecture des données
 
 
-def lecture_fichier(fs, chemin_lecture, chemin_ecriture):
+def _signature_distante(info):
+    """
+    Taille, ETag et date de modification d'un objet distant (sortie de `fs.info`).
+    """
+    etag = info.get("ETag") or info.get("etag")
+    mtime = info.get("LastModified") or info.get("last_modified") or info.get("mtime")
+    return {"size": info.get("size"),
+            "etag": etag.strip('"') if isinstance(etag, str) else etag,
+            "mtime": None if mtime is None else str(mtime)}
+
+
+def _chemin_meta(chemin_ecriture):
+    # fichier de métadonnées associé à une copie locale
+    return f"{chemin_ecriture}.meta.json"
+
+
+def _empreintes(chemin):
+    """
+    Empreintes MD5 (comparée à l'ETag S3 d'un envoi en une partie) et SHA-256 d'un fichier.
+    """
+    md5, sha256 = hashlib.md5(), hashlib.sha256()
+    with open(chemin, "rb") as f:
+        for bloc in iter(lambda: f.read(1 << 20), b""):
+            md5.update(bloc)
+            sha256.update(bloc)
+    return md5.hexdigest(), sha256.hexdigest()
+
+
+def copie_locale_valide(chemin_ecriture, signature, verifier_contenu=False):
+    """
+    Vrai si la copie locale correspond à l'objet distant décrit par `signature`.
+
+    La copie est valide si ses métadonnées (écrites au téléchargement) portent la même
+    signature distante et si sa taille et sa date de modification locales n'ont pas
+    changé ; avec `verifier_contenu`, le SHA-256 du fichier est aussi recalculé.
+
+    Args:
+        chemin_ecriture (str) : chemin de la copie locale
+        signature (dict) : taille, ETag et date de modification de l'objet distant
+        verifier_contenu (bool) : recalculer l'empreinte du fichier local
+
+    Returns:
+        bool
     """
-    Lecture depuis l'espace de stockage S3.
+    try:
+        with open(_chemin_meta(chemin_ecriture), encoding="utf-8") as f:
+            meta = json.load(f)
+        stat = os.stat(chemin_ecriture)
+    except (OSError, ValueError):
+        return False
+    if meta.get("remote") != signature:
+        return False
+    if stat.st_size != meta.get("size") or stat.st_mtime_ns != meta.get("local_mtime_ns"):
+        return False
+    return not verifier_contenu or _empreintes(chemin_ecriture)[1] == meta.get("sha256")
+
+
+def lecture_fichier(fs, chemin_lecture, chemin_ecriture, cache=True, verifier_contenu=False):
+    """
+    Lecture depuis l'espace de stockage S3, avec cache local validé.
+
+    Le transfert est évité si la copie locale est valide (voir `copie_locale_valide`) :
+    une session dont le cache est à jour n'échange que les métadonnées des objets.
+    Sinon, le fichier est téléchargé dans un fichier temporaire, contrôlé (taille,
+    MD5 comparé à l'ETag lorsque celui-ci est un MD5) puis renommé de façon atomique :
+    des traitements concurrents partageant le dossier ne lisent jamais un fichier
+    partiellement écrit.
 
     Args:
         fs : abstraction du filesystem
         chemin_lecture (str)
         chemin_ecriture (str)
+        cache (bool) : réutiliser une copie locale valide
+        verifier_contenu (bool) : recalculer l'empreinte de la copie locale avant réutilisation
 
     Returns:
-        rien
+        bool : vrai si le fichier a été téléchargé
+    """
+    signature = _signature_distante(fs.info(chemin_lecture))
+    if cache and copie_locale_valide(chemin_ecriture, signature, verifier_contenu):
+        return False
+
+    temporaire = f"{chemin_ecriture}.{uuid.uuid4().hex}.part"
+    try:
+        fs.get(chemin_lecture, temporaire)
+        md5, sha256 = _empreintes(temporaire)
+        taille = os.path.getsize(temporaire)
+        if signature["size"] is not None and taille != signature["size"]:
+            raise IOError(f"{chemin_lecture} : {taille} octets reçus, "
+                          f"{signature['size']} attendus")
+        etag = signature["etag"]
+        if isinstance(etag, str) and "-" not in etag and len(etag) == 32 and etag != md5:
+            raise IOError(f"{chemin_lecture} : MD5 {md5} différent de l'ETag {etag}")
+
+        os.replace(temporaire, chemin_ecriture)
+        meta = {"remote": signature, "size": taille, "sha256": sha256,
+                "local_mtime_ns": os.stat(chemin_ecriture).st_mtime_ns}
+        with open(f"{temporaire}.meta", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(f"{temporaire}.meta", _chemin_meta(chemin_ecriture))
+    finally:
+        for reste in [temporaire, f"{temporaire}.meta"]:
+            if os.path.exists(reste):
+                os.remove(reste)
+    return True
+
+
+def lecture_concurrente(fs, taches, max_workers=None):
+    """
+    Téléchargements concurrents et lecture de chaque fichier dès son arrivée.
+
+    Tous les transferts sont lancés en même temps dans un pool de threads ; une tâche
+    est lue (dans le thread appelant) dès que ses fichiers sont arrivés, pendant que
+    les autres téléchargements continuent. La durée d'une ingestion à froid est ainsi
+    bornée par le plus gros fichier plutôt que par la somme des fichiers.
+
+    Args:
+        fs : abstraction du filesystem
+        taches (dict) : nom -> (liste de transferts (chemin_lecture, chemin_ecriture),
+            fonction sans argument lisant les fichiers téléchargés)
+        max_workers (int) : nombre de téléchargements simultanés (par défaut, tous)
+
+    Returns:
+        dict : nom -> résultat de la fonction de lecture
     """
-    fs.get(chemin_lecture, chemin_ecriture)
+    restants = {nom: len(transferts) for nom, (transferts, _) in taches.items()}
+    resultats = {nom: lecteur() for nom, (transferts, lecteur) in taches.items()
+                 if not transferts}
+    n_transferts = sum(restants.values())
+    if n_transferts == 0:
+        return resultats
+
+    with ThreadPoolExecutor(max_workers=max_workers or n_transferts) as executor:
+        futures = {executor.submit(lecture_fichier, fs, lecture, ecriture): nom
+                   for nom, (transferts, _) in taches.items()
+                   for lecture, ecriture in transferts}
+        for future in as_completed(futures):
+            future.result()  # propage les erreurs de téléchargement
+            nom = futures[future]
+            restants[nom] -= 1
+            if restants[nom] == 0:
+                resultats[nom] = taches[nom][1]()
+    return resultats
+
+
+def taches_sas(chemin_lecture, chemin_ecriture, years=("2024", "2023", "2022", "2021")):
+    """
+    Tâches de `lecture_concurrente` pour les fichiers sas NSCH (une par année).
+    """
+    taches = {}
+    for year in years:
+        local = f"{chemin_ecriture}nsch_{year}e_topical.sas7bdat"
+        taches[year] = ([(f"{chemin_lecture}nsch_{year}e_topical.sas7bdat", local)],
+                        partial(pd.read_sas, local, format='sas7bdat', encoding='latin1'))
+    return taches
 
 
-def lecture_fichier_sas(fs, chemin_lecture, chemin_ecriture):
+def tache_csv(chemin_lecture, chemin_ecriture, latin_encoding=False):
+    """
+    Tâche de `lecture_concurrente` pour un fichier csv.
     """
-    Lecture des fichiers sas.
+    if latin_encoding is False:
+        lecteur = partial(pd.read_csv, chemin_ecriture, index_col=False)
+    else:
+        lecteur = partial(pd.read_csv, chemin_ecriture, index_col=False,
+                          encoding='ISO-8859-1', low_memory=False)
+    return [(chemin_lecture, chemin_ecriture)], lecteur
+
+
+def tache_shapefile(chemin_lecture, chemin_ecriture):
+    """
+    Tâche de `lecture_concurrente` pour le shapefile des États (.shp, .shx, .dbf, .prj).
+    """
+    def lecteur():
+        import geopandas as gpd
+        return gpd.read_file(f"{chemin_ecriture}cb_2024_us_state_20m.shp")
+
+    transferts = [(f"{chemin_lecture}cb_2024_us_state_20m.{ext}",
+                   f"{chemin_ecriture}cb_2024_us_state_20m.{ext}")
+                  for ext in ["shp", "shx", "dbf", "prj"]]
+    return transferts, lecteur
+
+
+@profiled()
+def lecture_fichier_sas(fs, chemin_lecture, chemin_ecriture,
+                        years=("2024", "2023", "2022", "2021")):
+    """
+    Lecture des fichiers sas (téléchargements concurrents, lecture de chaque année
+    dès l'arrivée de son fichier).
 
     Args:
         fs : abstraction du filesystem
         chemin_lecture (str)
         chemin_ecriture (str)
+        years (list) : années des enquetes NSCH
 
     Returns:
         génération d'un objet dataframe
     """
-    for year in ["2024", "2023", "2022", "2021"]:
-        lecture_fichier(fs, f"{chemin_lecture}nsch_{year}e_topical.sas7bdat",
-                        f"{chemin_ecriture}nsch_{year}e_topical.sas7bdat")
-    dfs = {}
-
-    for year in ["2024", "2023", "2022", "2021"]:
-        dfs[year] = pd.read_sas(f"{chemin_ecriture}nsch_{year}e_topical.sas7bdat",
-                                format='sas7bdat', encoding='latin1')
-    return dfs
+    dfs = lecture_concurrente(fs, taches_sas(chemin_lecture, chemin_ecriture, years))
+    return {year: dfs[year] for year in years}
 
 
+@profiled()
 def lecture_fichier_csv(fs, chemin_lecture, chemin_ecriture, latin_encoding=False):
     """
     Lecture des fichiers csv.
@@ -58,19 +236,14 @@ def lecture_fichier_csv(fs, chemin_lecture, chemin_ecriture, latin_encoding=Fals
     Returns:
         génération d'un objet dataframe
     """
-    lecture_fichier(fs, chemin_lecture, chemin_ecriture)
-    if latin_encoding is False:
-        df_csv = pd.read_csv(chemin_ecriture, index_col=False)
-    else:
-        df_csv = pd.read_csv(chemin_ecriture, index_col=False, encoding='ISO-8859-1',
-                             low_memory=False)
-
-    return df_csv
+    tache = tache_csv(chemin_lecture, chemin_ecriture, latin_encoding)
+    return lecture_concurrente(fs, {"csv": tache})["csv"]
 
 
+@profiled()
 def lecture_fichier_shapefile(fs, chemin_lecture, chemin_ecriture):
     """
-    Lecture des fichiers géographiques (.shp, principalement).
+    Lecture des fichiers géographiques (.shp, principalement), téléchargés simultanément.
 
     Args:
         fs : abstraction du filesystem
@@ -80,11 +253,8 @@ def lecture_fichier_shapefile(fs, chemin_lecture, chemin_ecriture):
     Returns:
         génération d'un objet geopandas
     """
-    for ext in ["shp", "shx", "dbf", "prj"]:
-        lecture_fichier(fs, f"{chemin_lecture}cb_2024_us_state_20m.{ext}",
-                            f"{chemin_ecriture}cb_2024_us_state_20m.{ext}")
-    gdf = gpd.read_file(f"{chemin_ecriture}cb_2024_us_state_20m.shp")
-    return gdf
+    tache = tache_shapefile(chemin_lecture, chemin_ecriture)
+    return lecture_concurrente(fs, {"shapefile": tache})["shapefile"]
 
 
 def write_questions(variables, guide):
@@ -110,6 +280,7 @@ def write_questions(variables, guide):
                 count = count + 1
 
 
+@profiled()
 def impute_values(year, df):
     """
     Méthode d'imputation des variables manquantes.
@@ -121,6 +292,8 @@ def impute_values(year, df):
     Returns:
         génération d'un objet geopandas
     """
+    from sklearn.impute import KNNImputer
+
     # Ce code prend environ 2 minutes à tourner en vue du choix de voisins = 3
     # (la version avec un seul voisin est plus rapide)
 
@@ -149,35 +322,51 @@ def impute_values(year, df):
     df_final[other_cols] = df_other_imputed
     df_final.loc[mask_hw, ["HEIGHT", "WEIGHT"]] = df_hw_imputed
 
-    # Arrondir les colonnes (puisque on est sur des variables principalement catégorielles)
-    df_final = df_final.round().astype(int, errors='ignore')
-    df_final["FORMTYPE"] = "T" + df_final["FORMTYPE"].astype(int).astype(str)
-
-    # Ajouter les colonnes _imputed pour savoir quelles valeurs ont été imputées
-    for col in df.columns:
-        df_final[col + "_imputed"] = missing_mask[col]
-
-    return df_final
+    # arrondi, FORMTYPE en "T1"/"T2"/"T3" et colonnes _imputed
+    return format_imputed(df, df_final, missing_mask)
 
 
-def impute_values_over_dataset(years, dfs):
+def impute_values_over_dataset(years, dfs, max_workers=1, mode="year", **kwargs):
     """
     Réalisation de l'amputation sur l'ensemble des bases de données.
 
     Args:
         years (list) : années des enquetes NSCH
         dfs (dict) : dictionnaire des dataset NSCH
+        max_workers (int) : nombre de processus (une année par processus si > 1)
+        mode (str) : "year" (un KNNImputer par année), "pooled" (index de donneurs
+            commun à toutes les années, voir `script.imputation.impute_values_pooled`)
+            ou "stratified" (voisins recherchés par strate, voir
+            `script.imputation.impute_values_stratified`)
+        **kwargs : arguments de `impute_values_pooled` (year_as, year_weight,
+            year_window, n_neighbors)
+            ou de `impute_values_stratified` (strata, min_stratum_size, n_neighbors)
 
     Returns:
         génération d'un dictionnaire de dataframes
     """
+    if mode == "pooled":
+        return impute_values_pooled(years, dfs, **kwargs)
+    if mode == "stratified":
+        # parallélisme à l'intérieur d'une année, entre les strates
+        return {year: impute_values_stratified(year, dfs[year], max_workers=max_workers,
+                                               **kwargs)
+                for year in years}
+    if mode != "year":
+        raise ValueError(f"mode doit valoir 'year', 'pooled' ou 'stratified', pas {mode!r}")
+
     # execution de l'imputation sur l'ensemble des bases de données
-    dfs_final = {}
-    for year in years:
-        df = dfs[year]
-        df_final = impute_values(year, df)
-        dfs_final[year] = df_final
-    return dfs_final
+    if max_workers is not None and max_workers <= 1:
+        dfs_final = {}
+        for year in years:
+            df = dfs[year]
+            df_final = impute_values(year, df)
+            dfs_final[year] = df_final
+        return dfs_final
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {year: executor.submit(impute_values, year, dfs[year]) for year in years}
+        return {year: future.result() for year, future in futures.items()}
 
 
 def write_on_S3(fs, years, dfs_final):
@@ -226,36 +415,37 @@ def read_on_S3(fs, years):
             df = pd.read_parquet(file_in)
             dfs_final[year] = df
 
-    return dfs_final
+    # catalogue des statistiques de colonnes, calculé une fois à la lecture s'il n'a pas
+    # été écrit avec la base (fichiers antérieurs au catalogue)
+    stale = [year for year in years if attached_statistics(dfs_final[year]) is None]
+    return attach_statistics(dfs_final, stale) if stale else dfs_final
 
 
-def test_imputed(years, dfs_final):
+def test_imputed(years, dfs_final, contract=None):
     """
-    Tester l'imputation.
+    Tester l'imputation : contrôle du contrat de qualité (`script.validation`) sur
+    toutes les années, en parallèle.
 
     Args:
         years (list) : années des enquetes NSCH
         dfs_final (dict) : dictionnaire des dataset NSCH
+        contract (dict) : contrat de qualité (par défaut, celui de `config/pipeline.json`)
 
     Returns:
-        rien
+        ValidationReport ; lève une ValidationError (AssertionError) listant tous les échecs
     """
-    # tester que l'imputation a été bien effectuée
-    # on trie en ordre décroissant le pourcentage de valeurs manquantes
-    # on regarde la première valeur
-    for year in years:
-        df = dfs_final[year]
+    from script.validation import build_contract, validate
 
-        # Exclure HEIGHT et WEIGHT du test
-        cols_to_check = df.columns.difference(["HEIGHT", "WEIGHT"])
-        missing_values = df[cols_to_check].isna().mean().sort_values(ascending=False) * 100
-        assert missing_values.iloc[0] == 0.0, f"Erreur: première valeur non-nulle pour {year}"
+    if contract is None:
+        from script.pipeline import DEFAULT_CONFIG, load_config
+        contract = build_contract(load_config(DEFAULT_CONFIG))
 
-        mask = df["FORMTYPE"] != "T1"
-        for col in ["HEIGHT", "WEIGHT"]:
-            missing_pct = df.loc[mask, col].isna().mean() * 100
-            assert missing_pct == 0.0, f"Erreur : {col} contient des NA pour {year}"
+    # pas de valeur manquante hors HEIGHT/WEIGHT, HEIGHT/WEIGHT complets hors T1,
+    # modalités dans les bornes du codebook, poids positifs, tous les États présents
+    report = validate(dfs_final, contract, years)
+    report.raise_for_failures()
     print("---------------OK----------------------")
+    return report
 
 
 def clean_gpd_dataframe(gdp):
@@ -310,11 +500,12 @@ def merge_gdp_on_gdf(gdp, gdf):
     wide.columns = [f"{ind}_{year}" for (ind, year) in wide.columns]
     gdp = wide.reset_index()
 
-    # Clé commune :
-    gdp["STATEFP"] = gdp["GeoFIPS"].str[2:4]
+    # Clé commune : code FIPS entier, extrait une seule fois (voir script.states)
+    gdp["FIPSST"] = parse_geofips(gdp["GeoFIPS"])
+    gdf = gdf.assign(FIPSST=gdf["STATEFP"].astype(int)).drop(columns="STATEFP")
 
     # Jointure :
-    df_eco_geo = gdp.merge(gdf, how="left")
+    df_eco_geo = gdp.merge(gdf, on="FIPSST", how="left")
 
     return df_eco_geo
 
@@ -336,6 +527,7 @@ def numeric_only(df, prefixes=[str(y) for y in range(2018, 2025)]):
     return df
 
 
+@profiled()
 def clean_enrichment_datasets(gdp, gdf):
     """
     Regrouper les deux fonctions précédentes.
@@ -351,7 +543,7 @@ def clean_enrichment_datasets(gdp, gdf):
     df = merge_gdp_on_gdf(gdp, gdf)
 
     # drop la ligne sur les états unis au niveau agrégé
-    df = df[df["GeoFIPS"] != ' "00000"']
+    df = df[df["FIPSST"] != 0]
 
     df = df.reset_index(drop=True)
     df = numeric_only(df)
@@ -362,7 +554,7 @@ def clean_eco_data(df_eco):
     """
     Nettoie les données économiques :
     - suppression des colonnes inutiles (années anciennes, variables inutiles pour l'étude)
-    - renommage de STATEFP en FIPSST pour les jointures
+    - la clé de jointure FIPSST (entière) est celle de `clean_enrichment_datasets`
     """
 
     # Variables économiques sans l'année (structure commune)
@@ -424,7 +616,6 @@ def clean_eco_data(df_eco):
     df_eco_geo_indic = (
         df_eco
         .dropna(axis=1)
-        .rename(columns={"STATEFP": "FIPSST"})
         .drop(columns=cols_to_drop, errors="ignore")
     )
 
@@ -0,0 +1,191 @@
+"""
+Cube des effectifs pondérés : pour chaque (année, FIPSST, FORMTYPE, variable, modalité),
+le nombre de répondants et la somme des poids FWC, calculés en un seul passage sur
+chaque base, ainsi que les totaux par (année, FIPSST, FORMTYPE).
+
+Les indicateurs (`model.calculate_indicator`) et les diagrammes en barres
+(`analyse_data.bar_plot`) se calculent à partir du cube, sans relire les données
+individuelles.
+
+Exemple :
+    cube = build_cube(dfs_final, variables, years)
+    cube.write("results/cube")
+    cube = WeightedCube.read("results/cube")
+    cube.weighted_means("2024", ["K2Q01", "K2Q01_D"])
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+COUNT_COLUMNS = ["year", "FIPSST", "FORMTYPE", "variable", "code", "count", "weight"]
+TOTAL_COLUMNS = ["year", "FIPSST", "FORMTYPE", "count", "weight"]
+
+
+def _column(dfs, year, name):
+    # dictionnaire de DataFrames ou stockage colonne (script.survey)
+    if hasattr(dfs, "column"):
+        return dfs.column(year, name)
+    return dfs[year][name].to_numpy()
+
+
+def build_cube(dfs, variables, years=None):
+    """
+    Construit le cube des effectifs pondérés.
+
+    Args:
+        dfs (dict) : dictionnaire des dataset NSCH (ou stockage colonne `script.survey.Survey`),
+            avec les colonnes FIPSST, FORMTYPE et FWC
+        variables (list) : variables catégorielles ou binaires à agréger
+        years (list) : années (par défaut, toutes celles de `dfs`)
+
+    Returns:
+        WeightedCube
+    """
+    years = list(years or (dfs.years if hasattr(dfs, "years") else dfs))
+    counts, totals = [], []
+    for year in years:
+        weights = _column(dfs, year, "FWC").astype(float)
+        cell, cells = pd.MultiIndex.from_arrays(
+            [_column(dfs, year, "FIPSST"), _column(dfs, year, "FORMTYPE")]).factorize()
+        n_cells = len(cells)
+        totals.append(pd.DataFrame({
+            "year": year,
+            "FIPSST": cells.get_level_values(0).astype(int),
+            "FORMTYPE": cells.get_level_values(1).astype(str),
+            "count": np.bincount(cell, minlength=n_cells),
+            "weight": np.bincount(cell, weights=weights, minlength=n_cells),
+        }))
+
+        for var in variables:
+            # modalités observées (les valeurs manquantes forment une modalité NaN)
+            codes, code = np.unique(_column(dfs, year, var).astype(float), return_inverse=True)
+            key = cell * len(codes) + code
+            size = n_cells * len(codes)
+            count = np.bincount(key, minlength=size)
+            present = np.flatnonzero(count)
+            counts.append(pd.DataFrame({
+                "year": year,
+                "FIPSST": cells.get_level_values(0).astype(int)[present // len(codes)],
+                "FORMTYPE": cells.get_level_values(1).astype(str)[present // len(codes)],
+                "variable": var,
+                "code": codes[present % len(codes)],
+                "count": count[present],
+                "weight": np.bincount(key, weights=weights, minlength=size)[present],
+            }))
+
+    return WeightedCube(pd.concat(counts, ignore_index=True),
+                        pd.concat(totals, ignore_index=True))
+
+
+class WeightedCube:
+    """
+    Cube des effectifs pondérés (voir `build_cube`).
+
+    Args:
+        counts (pandas.DataFrame) : colonnes year, FIPSST, FORMTYPE, variable, code,
+            count, weight
+        totals (pandas.DataFrame) : colonnes year, FIPSST, FORMTYPE, count, weight
+    """
+
+    def __init__(self, counts, totals):
+        self.counts = _compact(counts[COUNT_COLUMNS])
+        self.totals = _compact(totals[TOTAL_COLUMNS])
+
+    @property
+    def years(self):
+        return list(self.totals["year"].cat.categories)
+
+    @property
+    def variables(self):
+        return list(self.counts["variable"].cat.categories)
+
+    def write(self, path):
+        """
+        Écrit le cube (deux fichiers parquet) dans le dossier `path`.
+        """
+        os.makedirs(path, exist_ok=True)
+        self.counts.to_parquet(os.path.join(path, "counts.parquet"), index=False)
+        self.totals.to_parquet(os.path.join(path, "totals.parquet"), index=False)
+
+    @classmethod
+    def read(cls, path):
+        """
+        Lit un cube écrit par `write`.
+        """
+        return cls(pd.read_parquet(os.path.join(path, "counts.parquet")),
+                   pd.read_parquet(os.path.join(path, "totals.parquet")))
+
+    def select(self, year, variables=None, formtypes=None):
+        """
+        Lignes du cube pour une année, des variables et des FORMTYPE donnés.
+        """
+        mask = self.counts["year"] == year
+        if variables is not None:
+            mask &= self.counts["variable"].isin(list(variables))
+        if formtypes is not None:
+            mask &= self.counts["FORMTYPE"].isin(list(formtypes))
+        return self.counts[mask]
+
+    def state_totals(self, year, formtypes=None):
+        """
+        Somme des poids par État (tous répondants, valeurs manquantes comprises).
+
+        Returns:
+            pandas.Series indexée par FIPSST
+        """
+        totals = self.totals[self.totals["year"] == year]
+        if formtypes is not None:
+            totals = totals[totals["FORMTYPE"].isin(list(formtypes))]
+        return totals.groupby("FIPSST")["weight"].sum()
+
+    def distribution(self, year, variable, weighted=False):
+        """
+        Répartition nationale des modalités d'une variable (hors valeurs manquantes).
+
+        Args:
+            year (str) : année
+            variable (str) : variable
+            weighted (bool) : somme des poids FWC plutôt que nombre de répondants
+
+        Returns:
+            pandas.Series indexée par modalité
+        """
+        rows = self.select(year, [variable])
+        return rows.groupby("code")["weight" if weighted else "count"].sum()
+
+    def weighted_means(self, year, variables, transforms=None):
+        """
+        Moyennes pondérées par État, identiques à `model.weighted_mean` : les valeurs
+        manquantes sont exclues du numérateur mais leur poids reste au dénominateur.
+
+        Args:
+            year (str) : année
+            variables (list) : variables
+            transforms (dict) : variable -> fonction appliquée aux modalités avant la moyenne
+
+        Returns:
+            pandas.DataFrame (FIPSST x variables)
+        """
+        rows = self.select(year, variables)
+        code = rows["code"].to_numpy()
+        if transforms:
+            code = code.copy()
+            variable = rows["variable"].to_numpy()
+            for var, transform in transforms.items():
+                mask = variable == var
+                code[mask] = transform(code[mask])
+        weighted = np.where(np.isnan(code), 0, code * rows["weight"].to_numpy())
+        sums = (pd.Series(weighted, index=rows.index)
+                .groupby([rows["FIPSST"], rows["variable"]], observed=True).sum()
+                .unstack("variable"))
+        means = sums.div(self.state_totals(year), axis=0)[list(variables)]
+        return means.set_axis(means.index.astype("int64").rename("FIPSST"), axis=0)
+
+
+def _compact(df):
+    # types compacts : catégories pour les libellés, entiers courts pour les codes d'État
+    df = df.astype({"year": "category", "FORMTYPE": "category", "FIPSST": "int16"})
+    if "variable" in df.columns:
+        df = df.astype({"variable": "category", "code": "float32"})
+    return df.reset_index(drop=True)
@@ -0,0 +1,389 @@
+"""
+Imputation des plus proches voisins sur plusieurs années d'enquête.
+
+`impute_values` (clean_data.py) ajuste un KNNImputer par année. Ici, un index de
+donneurs unique (`DonorIndex`) est construit sur l'ensemble des années : l'année y
+est une strate (`year_as="stratum"`, par défaut : mêmes valeurs que l'imputation année
+par année, vérifié par `python -m script.benchmark knn`, sans le coût de KNNImputer) ou
+une variable supplémentaire (`year_as="feature"`). Dans ce second mode, chaque receveur
+est comparé aux donneurs de toutes les années retenues : le coût croît avec le nombre
+d'années, que `year_window` limite aux années voisines. Une nouvelle année s'ajoute à
+l'index sans reconstruire les précédentes.
+
+`impute_values_stratified` restreint au contraire la recherche des voisins à des
+strates (État, FORMTYPE, tranche d'âge) traitées en parallèle, avec repli sur
+l'échantillon national pour les petites strates.
+
+La distance est celle de KNNImputer (euclidienne en ignorant les valeurs
+manquantes, `nan_euclidean`) ; pour une colonne, seuls les individus qui l'ont
+renseignée sont donneurs.
+"""
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from script.catalog import STATISTICS_KEY, column_statistics
+
+
+class DonorIndex:
+    """
+    Index des donneurs pour l'imputation des plus proches voisins.
+
+    Chaque année forme un bloc dont les tableaux (valeurs, masque, carrés, normes,
+    sommes par colonne) sont calculés une fois, à l'ajout. En mode "stratum", une
+    requête n'utilise que le bloc de son année et reproduit `KNNImputer` ajusté sur
+    cette année (mêmes opérations pour les distances, même règle d'ex æquo).
+
+    Args:
+        columns (list) : variables utilisées comme coordonnées (et imputées)
+        year_as (str) : "feature" (l'année est une coordonnée) ou "stratum"
+            (seuls les donneurs de la même année sont retenus)
+        year_weight (float) : écart, sur la coordonnée année, entre deux années
+            consécutives (mode "feature")
+        year_window (int) : écart maximal, en années, entre un receveur et ses donneurs
+            (mode "feature" ; par défaut toutes les années)
+    """
+
+    def __init__(self, columns, year_as="stratum", year_weight=1.0, year_window=None):
+        if year_as not in ("feature", "stratum"):
+            raise ValueError(f"year_as doit valoir 'feature' ou 'stratum', pas {year_as!r}")
+        self.columns = list(columns)
+        self.year_as = year_as
+        self.year_weight = year_weight
+        self.year_window = year_window
+        self._blocks = {}
+
+    def __len__(self):
+        return sum(len(block["values"]) for block in self._blocks.values())
+
+    @property
+    def years(self):
+        return list(self._blocks)
+
+    def _coordinates(self, year, X):
+        X = np.asarray(X[self.columns], dtype=float)
+        if self.year_as == "feature":
+            year_column = np.full((len(X), 1), int(year) * self.year_weight, dtype=float)
+            X = np.hstack([X, year_column])
+        return X
+
+    def add(self, year, df):
+        """
+        Ajoute les individus d'une année à l'index (sans recalcul des années déjà présentes).
+
+        Args:
+            year (str) : année de l'enquête
+            df (pandas.DataFrame) : base contenant les colonnes de l'index
+        """
+        if str(year) in self._blocks:
+            raise ValueError(f"L'année {year} est déjà dans l'index")
+        X = self._coordinates(year, df)
+        observed = ~np.isnan(X)
+        filled = np.where(observed, X, 0.0)
+        self._blocks[str(year)] = {
+            "values": filled,
+            "observed": observed,
+            "missing": (~observed).astype(float),
+            "squares": filled * filled,
+            "norms": np.einsum("ij,ij->i", filled, filled),
+            # sommes par colonne contiguë (même sommation que la moyenne de KNNImputer)
+            "sums": np.ascontiguousarray(filled.T).sum(axis=1),
+            "counts": observed.sum(axis=0),
+        }
+
+    def _donors(self, year):
+        # bloc de l'année (strate) ou blocs des années de la fenêtre (année en coordonnée)
+        if self.year_as == "stratum":
+            if str(year) not in self._blocks:
+                raise ValueError(f"L'année {year} n'est pas dans l'index")
+            return [self._blocks[str(year)]]
+        blocks = [block for other, block in self._blocks.items()
+                  if self.year_window is None or abs(int(other) - int(year)) <= self.year_window]
+        if not blocks:
+            raise ValueError(f"Aucune année de l'index à moins de {self.year_window} ans de {year}")
+        return blocks
+
+    @staticmethod
+    def _distances(receivers, observed, donors):
+        """
+        Distances `nan_euclidean` entre receveurs et donneurs d'un bloc, calculées dans
+        le même ordre que `sklearn.metrics.pairwise.nan_euclidean_distances`.
+        """
+        filled = np.where(observed, receivers, 0.0)
+        squared = -2 * (filled @ donors["values"].T)
+        squared += np.einsum("ij,ij->i", filled, filled)[:, None]
+        squared += donors["norms"][None, :]
+        np.maximum(squared, 0, out=squared)
+        squared -= (filled * filled) @ donors["missing"].T
+        squared -= (~observed).astype(float) @ donors["squares"].T
+        np.clip(squared, 0, None, out=squared)
+        common = observed.astype(np.int64) @ donors["observed"].T.astype(np.int64)
+        squared[common == 0] = np.nan
+        np.maximum(1, common, out=common)
+        squared /= common
+        squared *= receivers.shape[1]
+        return np.sqrt(squared)
+
+    def query(self, year, df, n_neighbors=3, working_memory=256):
+        """
+        Impute les valeurs manquantes d'une base à partir des donneurs de l'index.
+
+        Args:
+            year (str) : année de la base (coordonnée ou strate)
+            df (pandas.DataFrame) : base à imputer (colonnes de l'index)
+            n_neighbors (int) : nombre de voisins (moyenne uniforme, comme KNNImputer)
+            working_memory (int) : mémoire (Mo) allouée à un bloc de distances
+
+        Returns:
+            numpy.ndarray : valeurs des colonnes de l'index après imputation
+        """
+        blocks = self._donors(year)
+        X = self._coordinates(year, df)
+        result = X.copy()
+        missing = np.isnan(X)
+        receivers = np.flatnonzero(missing.any(axis=1))
+        if len(receivers) == 0:
+            return result[:, :len(self.columns)]
+
+        donor_values = np.concatenate([block["values"] for block in blocks])
+        donor_observed = np.concatenate([block["observed"] for block in blocks])
+        # moyennes des donneurs retenus (bloc de la strate, ou tous les blocs)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means = (sum(block["sums"] for block in blocks)
+                     / sum(block["counts"] for block in blocks))
+
+        # un bloc de receveurs occupe environ cinq matrices (receveurs x donneurs) de float64
+        chunk = max(1, int(working_memory * 2 ** 20 // (40 * max(len(donor_values), 1))))
+        for start in range(0, len(receivers), chunk):
+            rows = receivers[start:start + chunk]
+            distances = np.hstack([self._distances(X[rows], ~missing[rows], block)
+                                   for block in blocks])
+            for col in np.flatnonzero(missing[rows].any(axis=0)):
+                targets = np.flatnonzero(missing[rows, col])
+                valid = np.flatnonzero(donor_observed[:, col])
+                if len(valid) == 0:
+                    result[rows[targets], col] = means[col]
+                    continue
+                dist = distances[np.ix_(targets, valid)]
+                # receveur sans distance définie : moyenne de la colonne (comme KNNImputer)
+                defined = ~np.isnan(dist).all(axis=1)
+                result[rows[targets[~defined]], col] = means[col]
+                if not defined.any():
+                    continue
+                dist = dist[defined]
+                k = min(n_neighbors, len(valid))
+                # argpartition sur les distances brutes (NaN en dernier) : mêmes ex æquo
+                nearest = np.argpartition(dist, k - 1, axis=1)[:, :k]
+                usable = ~np.isnan(np.take_along_axis(dist, nearest, axis=1))
+                values = donor_values[valid[nearest], col]
+                imputed = (values * usable).sum(axis=1) / usable.sum(axis=1)
+                result[rows[targets[defined]], col] = imputed
+
+        return result[:, :len(self.columns)]
+
+
+def format_imputed(df, df_imputed, missing_mask):
+    """
+    Mise en forme d'une base imputée, identique à celle de `clean_data.impute_values` :
+    arrondi, FORMTYPE recodé en "T1"/"T2"/"T3", colonnes `<variable>_imputed`, et
+    catalogue des statistiques de colonnes attaché (`script.catalog`).
+
+    Args:
+        df (pandas.DataFrame) : base d'origine
+        df_imputed (pandas.DataFrame) : valeurs imputées (FORMTYPE numérique)
+        missing_mask (pandas.DataFrame) : masque des valeurs manquantes d'origine
+
+    Returns:
+        pandas.DataFrame
+    """
+    # Arrondir les colonnes (puisque on est sur des variables principalement catégorielles)
+    df_final = df_imputed.round().astype(int, errors='ignore')
+    df_final["FORMTYPE"] = "T" + df_final["FORMTYPE"].astype(int).astype(str)
+
+    # Ajouter les colonnes _imputed pour savoir quelles valeurs ont été imputées
+    for col in df.columns:
+        df_final[col + "_imputed"] = missing_mask[col]
+
+    # catalogue des statistiques de colonnes, calculé une fois sur la base imputée
+    df_final.attrs[STATISTICS_KEY] = json.dumps(column_statistics(df_final))
+    return df_final
+
+
+def impute_values_pooled(years, dfs, n_neighbors=3, year_as="stratum", year_weight=1.0,
+                         year_window=None):
+    """
+    Imputation de toutes les années à partir d'index de donneurs communs : un index
+    pour les variables générales, un index pour HEIGHT/WEIGHT (FORMTYPE != T1),
+    comme dans `clean_data.impute_values`.
+
+    Args:
+        years (list) : années des enquetes NSCH
+        dfs (dict) : dictionnaire des dataset NSCH (variables communes aux années)
+        n_neighbors (int) : nombre de voisins
+        year_as (str) : "feature" ou "stratum" (voir `DonorIndex`)
+        year_weight (float) : poids de la coordonnée année (mode "feature")
+        year_window (int) : écart maximal entre années receveuse et donneuses (mode "feature")
+
+    Returns:
+        dict : dictionnaire des dataframes imputés
+    """
+    prepared = {}
+    for year in years:
+        # FORMTYPE numérique, sans modifier la base d'origine
+        df = dfs[year].copy()
+        df["FORMTYPE"] = df["FORMTYPE"].str.replace("T", "").astype(float)
+        prepared[year] = df
+
+    columns = prepared[years[0]].columns
+    other_cols = columns.difference(["HEIGHT", "WEIGHT"])
+    hw_cols = ["HEIGHT", "WEIGHT"]
+
+    index_general = DonorIndex(other_cols, year_as, year_weight, year_window)
+    index_hw = DonorIndex(hw_cols, year_as, year_weight, year_window)
+    for year, df in prepared.items():
+        index_general.add(year, df)
+        index_hw.add(year, df.loc[df["FORMTYPE"] != 1])
+
+    dfs_final = {}
+    for year, df in prepared.items():
+        df_imputed = df.astype(float)
+        df_imputed[other_cols] = index_general.query(year, df, n_neighbors)
+        mask_hw = df["FORMTYPE"] != 1
+        df_imputed.loc[mask_hw, hw_cols] = index_hw.query(year, df.loc[mask_hw], n_neighbors)
+        dfs_final[year] = format_imputed(dfs[year], df_imputed[columns], df.isna())
+    return dfs_final
+
+
+# bornes des tranches d'âge (SC_AGE_YEARS) utilisées comme strate : 0-5, 6-11, 12-17 ans
+AGE_BINS = (0, 6, 12, 18)
+
+
+def _impute_block(year, df, other_cols, n_neighbors):
+    """
+    Imputation d'un bloc (strate ou échantillon national) : variables générales sur
+    tout le bloc, HEIGHT/WEIGHT sur les individus de FORMTYPE != T1.
+
+    Returns:
+        tuple : valeurs imputées (variables générales puis HEIGHT/WEIGHT) et masque des
+        cellules sans assez de donneurs dans le bloc
+    """
+    hw_cols = ["HEIGHT", "WEIGHT"]
+    result = df[list(other_cols) + hw_cols].to_numpy(dtype=float)
+    fallback = np.zeros(result.shape, dtype=bool)
+    mask_hw = (df["FORMTYPE"] != 1).to_numpy()
+    parts = [(np.ones(len(df), dtype=bool), list(other_cols), slice(0, len(other_cols))),
+             (mask_hw, hw_cols, slice(len(other_cols), None))]
+    for rows, cols, position in parts:
+        if not rows.any():
+            continue
+        block = df.loc[rows, cols]
+        index = DonorIndex(cols, year_as="stratum")
+        index.add(year, block)
+        result[rows, position] = index.query(year, block, n_neighbors)
+        # moins de n_neighbors donneurs pour une colonne : repli sur l'échantillon national
+        too_few = (block.notna().sum() < n_neighbors).to_numpy()
+        fallback[rows, position] = block.isna().to_numpy() & too_few
+    return result, fallback
+
+
+def strata_keys(df, strata, age_bins=AGE_BINS):
+    """
+    Clés de strate de chaque individu ; SC_AGE_YEARS est découpée en tranches d'âge.
+
+    Args:
+        df (pandas.DataFrame) : base NSCH
+        strata (list) : variables de stratification (ex. ["FIPSST", "FORMTYPE"])
+        age_bins (tuple) : bornes des tranches d'âge
+
+    Returns:
+        list : une Series par variable de stratification
+    """
+    keys = []
+    for var in strata:
+        if var == "SC_AGE_YEARS":
+            keys.append(pd.cut(df[var], bins=age_bins, right=False, labels=False))
+        else:
+            keys.append(df[var])
+    return keys
+
+
+def impute_values_stratified(year, df, strata=("FIPSST", "FORMTYPE"), min_stratum_size=100,
+                             n_neighbors=3, max_workers=1, age_bins=AGE_BINS):
+    """
+    Imputation des plus proches voisins à l'intérieur de strates.
+
+    Les voisins sont recherchés dans la strate de l'individu ; les strates de moins de
+    `min_stratum_size` individus, les individus dont une variable de stratification est
+    manquante et les cellules dont la variable compte moins de `n_neighbors` donneurs
+    dans la strate sont imputés à partir de l'échantillon national.
+
+    Args:
+        year (str) : année du formulaire NSCH
+        df (pandas.DataFrame) : base NSCH (non modifiée)
+        strata (list) : variables de stratification (FIPSST, FORMTYPE, SC_AGE_YEARS...),
+            présentes dans la base
+        min_stratum_size (int) : taille minimale d'une strate
+        n_neighbors (int) : nombre de voisins
+        max_workers (int) : nombre de processus (strates réparties entre les processus)
+        age_bins (tuple) : bornes des tranches d'âge si SC_AGE_YEARS est une strate
+
+    Returns:
+        pandas.DataFrame : base imputée, au format de `clean_data.impute_values`
+    """
+    absent = [var for var in strata if var not in df.columns]
+    if absent:
+        raise ValueError(f"Variables de stratification absentes de la base {year} : "
+                         f"{', '.join(absent)} (à ajouter aux operational_vars de la "
+                         "configuration)")
+
+    missing_mask = df.isna()
+    df_num = df.copy()
+    df_num["FORMTYPE"] = df_num["FORMTYPE"].str.replace("T", "").astype(float)
+    df_num = df_num.astype(float)
+    other_cols = df.columns.difference(["HEIGHT", "WEIGHT"])
+    columns = list(other_cols) + ["HEIGHT", "WEIGHT"]
+
+    groups = df.groupby(strata_keys(df, strata, age_bins), dropna=False, sort=False).indices
+    blocks, national = [], []
+    for key, positions in groups.items():
+        key = key if isinstance(key, tuple) else (key,)
+        if len(positions) < min_stratum_size or any(pd.isna(k) for k in key):
+            national.append(positions)
+        else:
+            blocks.append(positions)
+
+    result = df_num[columns].to_numpy()
+    fallback = np.zeros(result.shape, dtype=bool)
+    arguments = [(year, df_num.iloc[positions], other_cols, n_neighbors) for positions in blocks]
+    if max_workers is not None and max_workers <= 1:
+        outputs = [_impute_block(*args) for args in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            outputs = list(executor.map(_impute_block, *zip(*arguments))) if arguments else []
+    for positions, (values, too_few) in zip(blocks, outputs):
+        result[positions] = values
+        fallback[positions] = too_few
+
+    # petites strates et cellules sans assez de donneurs : échantillon national
+    missing = missing_mask[columns].to_numpy()
+    for positions in national:
+        fallback[positions] = missing[positions]
+    rows = np.flatnonzero(fallback.any(axis=1))
+    if len(rows):
+        index_general = DonorIndex(other_cols, year_as="stratum")
+        index_general.add(year, df_num)
+        values = index_general.query(year, df_num.iloc[rows], n_neighbors)
+        hw = df_num["FORMTYPE"].to_numpy() != 1
+        index_hw = DonorIndex(["HEIGHT", "WEIGHT"], year_as="stratum")
+        index_hw.add(year, df_num.loc[hw])
+        rows_hw = rows[hw[rows]]
+        values_hw = np.full((len(rows), 2), np.nan)
+        values_hw[hw[rows]] = index_hw.query(year, df_num.iloc[rows_hw], n_neighbors)
+        values = np.hstack([values, values_hw])
+        cells = fallback[rows]
+        result[rows] = np.where(cells, values, result[rows])
+
+    df_imputed = pd.DataFrame(result, columns=columns, index=df.index)[df.columns]
+    return format_imputed(df, df_imputed, missing_mask)
@@ -0,0 +1,132 @@
+"""
+Test de charge du service local (`script.server`) : envoie des requêtes GET
+concurrentes sur des connexions keep-alive et rapporte le débit (requêtes par
+seconde) ainsi que les quantiles de latence.
+
+Exemples :
+    python -m script.load_test http://127.0.0.1:8000/indicators?theme=global \
+        --requests 5000 --concurrency 50
+    python -m script.load_test --base http://127.0.0.1:8000 --year 2024   # toutes les routes
+"""
+import argparse
+import asyncio
+import sys
+import time
+from urllib.parse import urlsplit
+
+
+def service_urls(base, year, state=6):
+    """
+    URL de chacune des routes du service (`script.server`), carte comprise.
+
+    Args:
+        base (str) : adresse du service (ex. http://127.0.0.1:8000)
+        year (str) : année des indicateurs et de la carte
+        state (int) : code FIPS de l'État interrogé
+
+    Returns:
+        list
+    """
+    base = base.rstrip("/")
+    return [f"{base}/indicators?theme=global&years={year}", f"{base}/states/{state}",
+            f"{base}/geojson", f"{base}/map/{year}"]
+
+
+async def _client(host, port, targets, n_requests, conditional, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    etags = {}
+    try:
+        for i in range(n_requests):
+            target = targets[i % len(targets)]
+            request = f"GET {target} HTTP/1.1\r\nHost: {host}\r\n"
+            if conditional and target in etags:
+                request += f"If-None-Match: {etags[target]}\r\n"
+            start = time.perf_counter()
+            writer.write((request + "\r\n").encode("latin1"))
+            await writer.drain()
+
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin1").partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+                elif name.lower() == "etag":
+                    etags[target] = value.strip()
+            await reader.readexactly(length)
+
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run_load_test(urls, n_requests=1000, concurrency=20, conditional=True):
+    """
+    Exécute le test de charge.
+
+    Args:
+        urls (list) : URL à interroger (même hôte), parcourues à tour de rôle
+        n_requests (int) : nombre total de requêtes
+        concurrency (int) : nombre de clients simultanés
+        conditional (bool) : renvoyer l'ETag reçu (If-None-Match), comme un navigateur
+
+    Returns:
+        dict : nombre de requêtes, durée, requêtes par seconde, latences (ms) et statuts
+    """
+    first = urlsplit(urls[0])
+    host, port = first.hostname, first.port or 80
+    targets = [urlsplit(u).path + (f"?{urlsplit(u).query}" if urlsplit(u).query else "")
+               for u in urls]
+
+    latencies, statuses = [], {}
+    per_client = [n_requests // concurrency + (i < n_requests % concurrency)
+                  for i in range(concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        _client(host, port, targets, n, conditional, latencies, statuses)
+        for n in per_client if n
+    ])
+    duration = time.perf_counter() - start
+
+    latencies.sort()
+
+    def quantile(q):
+        return 1000 * latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    return {
+        "requests": len(latencies),
+        "duration_s": duration,
+        "requests_per_second": len(latencies) / duration,
+        "latency_p50_ms": quantile(0.50),
+        "latency_p95_ms": quantile(0.95),
+        "latency_p99_ms": quantile(0.99),
+        "statuses": statuses,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge du service des indicateurs")
+    parser.add_argument("urls", nargs="*")
+    parser.add_argument("--base", help="adresse du service : interroge toutes les routes")
+    parser.add_argument("--year", default="2024", help="année des routes générées par --base")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    urls = args.urls + (service_urls(args.base, args.year) if args.base else [])
+    if not urls:
+        parser.error("indiquer des URL ou --base")
+    report = asyncio.run(run_load_test(urls, args.requests, args.concurrency))
+    for key, value in report.items():
+        print(f"{key:>20} : {value:.2f}" if isinstance(value, float) else f"{key:>20} : {value}")
+    # une erreur du serveur (carte, sérialisation...) fait échouer le test
+    if any(status >= 500 for status in report["statuses"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""
+Régressions logistiques pondérées (poids d'enquête FWC) des variables binaires
+(`health_bin_vars`, `mental_bin_vars`, items ACE) sur des ensembles de déterminants
+catégoriels, pour chaque année.
+
+Le plan d'expérience est construit une seule fois (`OneHotDesign`) : matrice creuse
+(scipy.sparse) du codage disjonctif des combinaisons de modalités observées, toutes
+années confondues, et numéro de combinaison de chaque ligne. La vraisemblance ne
+dépend des données individuelles que par les sommes des poids (et des poids au carré,
+pour les écarts-types robustes) par combinaison et par valeur de la variable expliquée :
+chaque modèle se réduit à quelques `np.bincount` puis à des itérations de Newton sur
+quelques centaines de lignes. Les estimations sont exactement celles du modèle sur
+les données individuelles.
+
+Chaque variable expliquée est estimée d'année en année en repartant des coefficients
+de l'année précédente (démarrage à chaud) ; les variables expliquées sont réparties
+entre les processus d'un pool.
+
+Exemple :
+    determinants = {"eco": ["FOODSIT", "ACE1", "CURRINS", "AVOIDCHG"]}
+    outcomes = variables["health_bin_vars"] + variables["mental_bin_vars"]
+    weighted_logistic_models(dfs_final, outcomes, determinants, max_workers=4)
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# scipy (sparse, special, stats) est importé dans les fonctions qui l'utilisent.
+
+RESULT_COLUMNS = ["model", "outcome", "variable", "coefficient", "std_error", "z_value",
+                  "p_value", "n_obs", "iterations", "converged"]
+COVARIANCES = ("HC1", "HC0", "nonrobust")
+
+
+def _column(dfs, year, name):
+    # dictionnaire de DataFrames ou stockage colonne (script.survey)
+    if hasattr(dfs, "column"):
+        return dfs.column(year, name)
+    return dfs[year][name].to_numpy()
+
+
+def _label(level):
+    # modalité lisible : 1.0 -> "1", "T1" -> "T1"
+    return f"{level:g}" if isinstance(level, (float, np.floating)) else str(level)
+
+
+class OneHotDesign:
+    """
+    Plan d'expérience creux des déterminants catégoriels, commun à toutes les années.
+
+    Args:
+        matrix (scipy.sparse.csr_matrix) : codage disjonctif des combinaisons de
+            modalités (combinaisons x colonnes), constante en première colonne et
+            première modalité de chaque déterminant en référence
+        names (list) : noms des colonnes ("const", "FOODSIT=2", ...)
+        patterns (dict) : année -> numéro de combinaison de chaque ligne (-1 : déterminant
+            manquant)
+        weights (dict) : année -> poids de chaque ligne
+    """
+
+    def __init__(self, matrix, names, patterns, weights):
+        self.matrix = matrix
+        self.names = names
+        self.patterns = patterns
+        self.weights = weights
+        self._cache = {}
+
+    @classmethod
+    def build(cls, dfs, determinants, years=None, weight="FWC"):
+        """
+        Construit le plan d'expérience à partir des bases nettoyées.
+
+        Args:
+            dfs : dictionnaire des dataset NSCH, ou stockage colonne (`script.survey`)
+            determinants (list) : variables catégorielles (codes numériques ou texte)
+            years (list) : années (par défaut toutes)
+            weight (str) : colonne des poids d'enquête
+
+        Returns:
+            OneHotDesign
+        """
+        from scipy import sparse
+
+        years = list(years or (dfs.years if hasattr(dfs, "years") else dfs))
+
+        # codes des modalités de chaque année (-1 : manquant), puis modalités observées
+        # toutes années confondues : mêmes colonnes du plan d'expérience chaque année
+        factors = {year: [pd.factorize(_column(dfs, year, var), use_na_sentinel=True)
+                          for var in determinants] for year in years}
+        levels = []
+        for k in range(len(determinants)):
+            uniques = [factors[year][k][1] for year in years]
+            numeric = all(np.asarray(u).dtype.kind in "biuf" for u in uniques)
+            levels.append(np.unique(np.concatenate(
+                [np.asarray(u).astype(float if numeric else str) for u in uniques])))
+
+        # combinaison de modalités de chaque ligne, numérotée en base mixte
+        keys = {}
+        for year in years:
+            key = np.zeros(len(factors[year][0][0]), dtype=np.int64)
+            missing = np.zeros(len(key), dtype=bool)
+            for (code, uniques), level in zip(factors[year], levels):
+                position = np.searchsorted(level, np.asarray(uniques).astype(level.dtype))
+                key = key * len(level) + position[np.maximum(code, 0)]
+                missing |= code < 0
+            keys[year] = np.where(missing, -1, key)
+        combinations, inverse = np.unique(
+            np.concatenate([keys[year] for year in years]), return_inverse=True)
+        offset = int(combinations[0] < 0)  # la combinaison -1 (manquant) n'est pas un motif
+        splits = np.cumsum([len(keys[year]) for year in years])[:-1]
+        patterns = {year: (block - offset).astype(np.int32)
+                    for year, block in zip(years, np.split(inverse, splits))}
+        combinations = combinations[offset:]
+
+        # codage disjonctif des combinaisons (première modalité en référence)
+        n_patterns = len(combinations)
+        rows, cols = [np.arange(n_patterns)], [np.zeros(n_patterns, dtype=np.int64)]
+        names, start, remainder = ["const"], 1, combinations.copy()
+        codes = []
+        for level in reversed(levels):
+            codes.append(remainder % len(level))
+            remainder //= len(level)
+        for var, level, code in zip(determinants, levels, reversed(codes)):
+            coded = np.flatnonzero(code > 0)
+            rows.append(coded)
+            cols.append(start + code[coded] - 1)
+            names += [f"{var}={_label(x)}" for x in level[1:]]
+            start += len(level) - 1
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+        matrix = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)),
+                                   shape=(n_patterns, start))
+
+        weights = {year: _column(dfs, year, weight).astype(float) for year in years}
+        return cls(matrix, names, patterns, weights)
+
+    def __getstate__(self):
+        # les cases précalculées sont reconstruites dans chaque processus
+        return {**self.__dict__, "_cache": {}}
+
+    @property
+    def years(self):
+        return list(self.patterns)
+
+    def _bins(self, year):
+        # case de chaque ligne : 3 × combinaison (+ valeur de la variable expliquée) ;
+        # les lignes sans combinaison vont dans une case supplémentaire, ignorée
+        if year not in self._cache:
+            pattern = self.patterns[year]
+            n_patterns = self.matrix.shape[0]
+            bins = 3 * np.where(pattern < 0, n_patterns, pattern).astype(np.int64)
+            self._cache[year] = bins, self.weights[year] ** 2
+        return self._cache[year]
+
+    def sums(self, year, y):
+        """
+        Sommes des poids et des poids au carré par combinaison, pour une variable
+        expliquée binaire.
+
+        Args:
+            year (str) : année
+            y (numpy.ndarray) : 1 (événement), 0, ou 2 (manquant), une valeur par ligne
+
+        Returns:
+            tuple : (Σw, Σw·y, Σw², Σw²·y) par combinaison, et le nombre de lignes retenues
+        """
+        bins, squares = self._bins(year)
+        n_patterns = self.matrix.shape[0]
+        key = bins + y
+        size = 3 * (n_patterns + 1)
+        count = np.bincount(key, minlength=size).reshape(-1, 3)[:n_patterns, :2]
+        sw = np.bincount(key, weights=self.weights[year],
+                         minlength=size).reshape(-1, 3)[:n_patterns, :2]
+        sw2 = np.bincount(key, weights=squares, minlength=size).reshape(-1, 3)[:n_patterns, :2]
+        return sw.sum(axis=1), sw[:, 1], sw2.sum(axis=1), sw2[:, 1], int(count.sum())
+
+
+def fit_logistic(X, sw, swy, sw2, sw2y, n_obs, start=None, cov="HC1", max_iter=25,
+                 tol=1e-8):
+    """
+    Régression logistique pondérée par la méthode de Newton, sur des données agrégées
+    par combinaison de modalités.
+
+    Args:
+        X (scipy.sparse.csr_matrix) : plan d'expérience (combinaisons x p)
+        sw, swy, sw2, sw2y (numpy.ndarray) : Σw, Σw·y, Σw², Σw²·y par combinaison
+        n_obs (int) : nombre de lignes individuelles (correction HC1)
+        start (numpy.ndarray) : coefficients initiaux (par défaut le modèle sans
+            déterminant : constante = logit de la prévalence pondérée)
+        cov (str) : "HC1" (par défaut), "HC0" ou "nonrobust" (poids traités comme
+            des effectifs)
+        max_iter (int) : nombre maximal d'itérations
+        tol (float) : convergence quand le plus grand pas est inférieur à `tol`
+
+    Returns:
+        dict : "params", "bse", "iterations", "converged"
+    """
+    from scipy.special import expit
+
+    if cov not in COVARIANCES:
+        raise ValueError(f"cov doit valoir {', '.join(COVARIANCES)} : {cov!r}")
+    p = X.shape[1]
+    if start is None:
+        start = np.zeros(p)
+        prevalence = swy.sum() / sw.sum()
+        start[0] = np.log(prevalence / (1 - prevalence))
+    beta = start.copy()
+
+    converged, iterations = False, 0
+    for iterations in range(1, max_iter + 1):
+        mu = expit(X @ beta)
+        gradient = X.T @ (swy - sw * mu)
+        hessian = (X.T @ X.multiply((sw * mu * (1 - mu))[:, None])).toarray()
+        step = np.linalg.pinv(hessian, hermitian=True) @ gradient
+        beta = beta + step
+        if not np.all(np.isfinite(beta)):
+            break
+        if np.abs(step).max() < tol:
+            converged = True
+            break
+
+    mu = expit(X @ beta)
+    hessian = (X.T @ X.multiply((sw * mu * (1 - mu))[:, None])).toarray()
+    bread = np.linalg.pinv(hessian, hermitian=True)
+    if cov == "nonrobust":
+        covariance = bread
+    else:
+        # Σ w²(y - μ)² x x' : y binaire, donc (y - μ)² = y(1 - 2μ) + μ²
+        scores = sw2y * (1 - 2 * mu) + sw2 * mu ** 2
+        meat = (X.T @ X.multiply(scores[:, None])).toarray()
+        covariance = bread @ meat @ bread
+        if cov == "HC1":
+            rank = np.linalg.matrix_rank(hessian, hermitian=True)
+            covariance *= n_obs / (n_obs - rank) if n_obs > rank else np.nan
+    with np.errstate(invalid="ignore"):
+        bse = np.sqrt(np.diagonal(covariance))
+    return {"params": beta, "bse": bse, "iterations": iterations, "converged": converged}
+
+
+def _fit_outcomes(design, outcomes, events, model, cov, max_iter):
+    # tâche d'un processus : chaque variable expliquée, d'année en année
+    from scipy import stats
+
+    tables = []
+    for k, outcome in enumerate(outcomes):
+        start = None
+        for year in design.years:
+            *sums, n_obs = design.sums(year, events[year][k])
+            fit = fit_logistic(design.matrix, *sums, n_obs, start=start, cov=cov,
+                               max_iter=max_iter)
+            # démarrage à chaud : l'année suivante part de ces coefficients
+            start = fit["params"] if fit["converged"] else None
+            with np.errstate(divide="ignore", invalid="ignore"):
+                z_value = fit["params"] / fit["bse"]
+            tables.append(pd.DataFrame({
+                "year": year,
+                "model": model,
+                "outcome": outcome,
+                "variable": design.names,
+                "coefficient": fit["params"],
+                "std_error": fit["bse"],
+                "z_value": z_value,
+                "p_value": 2 * stats.norm.sf(np.abs(z_value)),
+                "n_obs": n_obs,
+                "iterations": fit["iterations"],
+                "converged": fit["converged"],
+            }))
+    return pd.concat(tables, ignore_index=True) if tables else None
+
+
+def weighted_logistic_models(dfs, outcomes, determinants, years=None, weight="FWC",
+                             event=1, cov="HC1", max_workers=None, max_iter=25):
+    """
+    Régressions logistiques pondérées de chaque variable binaire sur chaque ensemble
+    de déterminants, pour chaque année.
+
+    Args:
+        dfs : dictionnaire des dataset NSCH, ou stockage colonne (`script.survey.Survey`)
+        outcomes (list) : variables expliquées binaires (codées 1 = oui, 2 = non)
+        determinants (dict) : nom du modèle -> déterminants catégoriels ; une liste
+            seule définit le modèle "determinants". Une variable expliquée n'est pas
+            estimée sur un ensemble qui la contient.
+        years (list) : années, dans l'ordre du démarrage à chaud (par défaut toutes)
+        weight (str) : colonne des poids d'enquête
+        event (float) : modalité modélisée (par défaut 1 : oui)
+        cov (str) : covariance des estimateurs : "HC1" (par défaut), "HC0" ou "nonrobust"
+        max_workers (int) : nombre de processus (1 : exécution séquentielle)
+        max_iter (int) : nombre maximal d'itérations de Newton
+
+    Returns:
+        pandas.DataFrame : une ligne par (année, modèle, variable expliquée, colonne du
+            plan d'expérience), colonnes year et `RESULT_COLUMNS`
+    """
+    if not isinstance(determinants, dict):
+        determinants = {"determinants": list(determinants)}
+    years = list(years or (dfs.years if hasattr(dfs, "years") else dfs))
+
+    arguments = []
+    for model, variables in determinants.items():
+        design = OneHotDesign.build(dfs, variables, years, weight)
+        selected = [var for var in outcomes if var not in variables]
+        n_tasks = min(len(selected), max_workers or os.cpu_count() or 1)
+        for chunk in np.array_split(np.array(selected, dtype=object), max(n_tasks, 1)):
+            # variable expliquée codée sur un octet : 1 événement, 0 sinon, 2 manquant
+            events = {}
+            for year in years:
+                events[year] = np.empty((len(chunk), len(design.patterns[year])), dtype=np.int8)
+                for k, var in enumerate(chunk):
+                    values = _column(dfs, year, var).astype(float, copy=False)
+                    np.equal(values, event, out=events[year][k], casting="unsafe")
+                    events[year][k][np.isnan(values)] = 2
+            arguments.append((design, list(chunk), events, model, cov, max_iter))
+
+    if max_workers is not None and max_workers <= 1:
+        outputs = [_fit_outcomes(*args) for args in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            outputs = list(executor.map(_fit_outcomes, *zip(*arguments))) if arguments else []
+    outputs = [table for table in outputs if table is not None]
+    if not outputs:
+        return pd.DataFrame(columns=["year"] + RESULT_COLUMNS)
+    return pd.concat(outputs, ignore_index=True)
+
+
+def logistic_statsmodels(dfs, outcomes, determinants, years=None, weight="FWC", event=1,
+                         cov="HC1"):
+    """
+    Référence de `weighted_logistic_models` : un `statsmodels.GLM` binomial par (année,
+    modèle, variable expliquée) sur les données individuelles. Même sortie.
+    """
+    import statsmodels.api as sm
+    from scipy import stats
+
+    if not isinstance(determinants, dict):
+        determinants = {"determinants": list(determinants)}
+    years = list(years or (dfs.years if hasattr(dfs, "years") else dfs))
+
+    tables = []
+    for model, variables in determinants.items():
+        for outcome in [var for var in outcomes if var not in variables]:
+            for year in years:
+                df = pd.DataFrame({name: _column(dfs, year, name)
+                                   for name in dict.fromkeys(variables + [outcome, weight])})
+                df = df.dropna()
+                X = pd.get_dummies(df[variables].map(_label), prefix_sep="=", drop_first=True)
+                X = sm.add_constant(X.astype(float), has_constant="add")
+                # poids en effectifs pour la covariance classique, en poids de variance
+                # pour la covariance robuste (mêmes coefficients)
+                weights = df[weight].astype(float)
+                res = sm.GLM((df[outcome] == event).astype(float), X,
+                             family=sm.families.Binomial(),
+                             **({"freq_weights": weights} if cov == "nonrobust"
+                                else {"var_weights": weights})).fit(
+                                    cov_type="nonrobust" if cov == "nonrobust" else "HC0")
+                bse = res.bse.to_numpy()
+                if cov == "HC1":
+                    bse = bse * np.sqrt(len(df) / (len(df) - X.shape[1]))
+                z_value = res.params.to_numpy() / bse
+                tables.append(pd.DataFrame({
+                    "year": year,
+                    "model": model,
+                    "outcome": outcome,
+                    "variable": res.params.index,
+                    "coefficient": res.params.to_numpy(),
+                    "std_error": bse,
+                    "z_value": z_value,
+                    "p_value": 2 * stats.norm.sf(np.abs(z_value)),
+                    "n_obs": len(df),
+                    "iterations": res.fit_history["iteration"],
+                    "converged": res.converged,
+                }))
+    return pd.concat(tables, ignore_index=True)
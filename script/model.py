@@ -1,8 +1,13 @@
+import numpy as np
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
-from scipy.stats import norm
-from functools import reduce
+
+from script.catalog import STATISTICS_KEY, statistics
+from script.profiling import profiled
+
+# thèmes des sous-indicateurs, dans l'ordre des colonnes de global_health_over_years
+THEMES = ("mental", "health", "eco")
+
+# scipy est importé au premier appel de `pca_indicator_batch`.
 
 
 def weighted_mean(x, w):
@@ -65,24 +70,76 @@ def scale_transformation(year, dfs, variables, cat_variables, bin_variables, gro
     """
     # extract dataframe
     df = dfs[year]
+    # nombre de modalités lu dans le catalogue plutôt que par nunique()
+    stats = statistics(dfs, year, cat_variables)
 
     all_variables = list(set(variables) | set(groups))
 
     df_theme = df[all_variables].copy()
-    if theme == "health":
-        df_theme[cat_variables] = 6 - df_theme[cat_variables]
-    else:
-        for col in cat_variables:
-            df_theme[col] = df_theme[col].nunique() + 1 - df_theme[col]
+    # les valeurs transformées ne correspondent plus au catalogue de la base d'origine
+    df_theme.attrs.pop(STATISTICS_KEY, None)
+    for col in cat_variables:
+        df_theme[col] = orientation(theme, "cat", stats[col]["distinct"])(df_theme[col])
+    for var in bin_variables:
+        df_theme[var] = orientation(theme, "bin")(df_theme[var])
+
+    return df_theme
+
+
+def orientation(theme, kind, n_codes=None):
+    """
+    Transformation d'échelle d'une variable (valeur élevée = meilleure situation).
+
+    Args:
+        theme : str
+            Nom du thème ("micro_eco", "health", "mental_health").
+        kind : str
+            "cat" (variable catégorielle ordinale) ou "bin" (variable binaire 1/2).
+        n_codes : int
+            Nombre de modalités observées (variables catégorielles hors "health").
 
+    Returns:
+        fonction applicable à un scalaire, un tableau numpy ou une Series
+    """
+    if kind == "cat":
+        if theme == "health":
+            return lambda x: 6 - x
+        return lambda x: n_codes + 1 - x
     if theme == "micro_eco":
-        for var in bin_variables:
-            df_theme[var] = abs(df_theme[var] - 2)
-    else:
-        for var in bin_variables:
-            df_theme[var] = df_theme[var] - 1
+        return lambda x: abs(x - 2)
+    return lambda x: x - 1
 
-    return df_theme
+
+def theme_bounds(stats, theme, cat_variables, bin_variables):
+    """
+    Bornes de normalisation d'un thème, lues dans le catalogue des statistiques de
+    colonnes (`script.catalog`) : moyenne des minima et des maxima des variables
+    transformées, égales à celles calculées sur les données.
+
+    Args:
+        stats : dict
+            Catalogue d'une année (`script.catalog.statistics`).
+        theme : str
+            Nom du thème étudié.
+        cat_variables : list
+            Liste des variables catégorielles.
+        bin_variables : list
+            Liste des variables binaires.
+
+    Returns:
+        tuple (minimum, maximum), ou None si une variable a trop de modalités
+        pour que le catalogue les conserve
+    """
+    minima, maxima = [], []
+    for kind, variables in (("cat", cat_variables), ("bin", bin_variables)):
+        for var in variables:
+            if stats[var]["codes"] is None:
+                return None
+            transform = orientation(theme, kind, stats[var]["distinct"])
+            codes = transform(np.asarray(stats[var]["codes"], dtype=float))
+            minima.append(codes.min())
+            maxima.append(codes.max())
+    return sum(minima) / len(minima), sum(maxima) / len(maxima)
 
 
 def state_indicator(df_theme, variables, theme, year, minimum, maximum):
@@ -134,6 +191,179 @@ def state_indicator(df_theme, variables, theme, year, minimum, maximum):
     return df_theme[f"sub_indicator_{theme}_{year}"]
 
 
+def is_columnar(dfs):
+    """
+    Vrai si les bases sont fournies par un stockage colonne (`script.survey.Survey`,
+    `script.survey.SharedSurvey`) plutôt que par un dictionnaire de DataFrames.
+    """
+    return hasattr(dfs, "column")
+
+
+def theme_indicator_columns(year, survey, theme, cat_variables, bin_variables):
+    """
+    Calcul d'un sous-indicateur thématique à partir des colonnes numpy d'un stockage
+    colonne : mêmes transformations et même normalisation que `calculate_indicator`,
+    moyennes pondérées par État calculées avec `numpy.bincount`, sans DataFrame
+    intermédiaire.
+
+    Args:
+        year : str
+            Année d'analyse.
+        survey : script.survey.Survey ou script.survey.SharedSurvey
+            Stockage colonne des bases NSCH (méthode `column(year, name)`).
+        theme : str
+            Nom du thème étudié.
+        cat_variables : list
+            Liste des variables catégorielles du sous-indicateur.
+        bin_variables : list
+            Liste des variables binaires du sous-indicateur.
+
+    Returns:
+        pandas.Series
+            Sous-indicateur normalisé sur [0, 1], indexé par FIPSST.
+    """
+    states, codes = np.unique(survey.column(year, "FIPSST"), return_inverse=True)
+    weights = survey.column(year, "FWC").astype(float, copy=False)
+    total_weight = np.bincount(codes, weights=weights, minlength=len(states))
+    # nombre de modalités et bornes lus dans le catalogue des statistiques de colonnes
+    stats = survey.statistics(year)
+    bounds = theme_bounds(stats, theme, cat_variables, bin_variables)
+
+    means, minima, maxima = [], [], []
+    for var in cat_variables + bin_variables:
+        x = survey.column(year, var).astype(float)
+        # mêmes transformations d'échelle que scale_transformation
+        kind = "cat" if var in cat_variables else "bin"
+        x = orientation(theme, kind, stats[var]["distinct"])(x)
+        weighted = np.where(np.isnan(x), 0, x * weights)
+        means.append(np.bincount(codes, weights=weighted, minlength=len(states)) / total_weight)
+        if bounds is None:  # modalités absentes du catalogue
+            minima.append(np.nanmin(x))
+            maxima.append(np.nanmax(x))
+
+    minimum, maximum = bounds or (sum(minima) / len(minima), sum(maxima) / len(maxima))
+    indicator = (np.mean(means, axis=0) - minimum) / (maximum - minimum)
+    return pd.Series(indicator, index=pd.Index(states, name="FIPSST"),
+                     name=f"sub_indicator_{theme}_{year}")
+
+
+def is_cube(dfs):
+    """
+    Vrai si les bases sont résumées par un cube d'effectifs pondérés
+    (`script.cube.WeightedCube`).
+    """
+    return hasattr(dfs, "weighted_means")
+
+
+def oriented_means(year, cube, theme, cat_variables, bin_variables):
+    """
+    Moyennes pondérées par État des variables d'un thème, orientées comme dans
+    `scale_transformation` (valeur élevée = meilleure situation), et bornes de
+    chaque variable (modalités observées après transformation).
+
+    Args:
+        year : str
+            Année d'analyse.
+        cube : script.cube.WeightedCube
+            Cube des effectifs pondérés contenant les variables du thème.
+        theme : str
+            Nom du thème étudié ("micro_eco", "health", "mental_health").
+        cat_variables : list
+            Liste des variables catégorielles.
+        bin_variables : list
+            Liste des variables binaires.
+
+    Returns:
+        tuple
+            - pandas.DataFrame des moyennes (FIPSST x variables),
+            - pandas.Series des minima par variable,
+            - pandas.Series des maxima par variable.
+    """
+    transforms = {var: orientation(theme, "cat", len(cube.distribution(year, var)))
+                  for var in cat_variables}
+    transforms.update({var: orientation(theme, "bin") for var in bin_variables})
+
+    variables = cat_variables + bin_variables
+    means = cube.weighted_means(year, variables, transforms)
+
+    # bornes de normalisation : modalités observées, après transformation
+    observed = {var: transforms[var](cube.distribution(year, var).index.to_numpy(dtype=float))
+                for var in variables}
+    minimum = pd.Series({var: codes.min() for var, codes in observed.items()}, dtype=float)
+    maximum = pd.Series({var: codes.max() for var, codes in observed.items()}, dtype=float)
+    return means, minimum, maximum
+
+
+def theme_indicator_cube(year, cube, theme, cat_variables, bin_variables):
+    """
+    Calcul d'un sous-indicateur thématique à partir du cube des effectifs pondérés :
+    les transformations d'échelle de `scale_transformation` sont appliquées aux
+    modalités, puis les moyennes pondérées par État sont lues dans le cube.
+
+    Args:
+        year : str
+            Année d'analyse.
+        cube : script.cube.WeightedCube
+            Cube des effectifs pondérés contenant les variables du thème.
+        theme : str
+            Nom du thème étudié.
+        cat_variables : list
+            Liste des variables catégorielles du sous-indicateur.
+        bin_variables : list
+            Liste des variables binaires du sous-indicateur.
+
+    Returns:
+        pandas.Series
+            Sous-indicateur normalisé sur [0, 1], indexé par FIPSST.
+    """
+    means, minimum, maximum = oriented_means(year, cube, theme, cat_variables, bin_variables)
+    indicator = (means.mean(axis=1) - minimum.mean()) / (maximum.mean() - minimum.mean())
+    return indicator.rename(f"sub_indicator_{theme}_{year}")
+
+
+def is_moments(dfs):
+    """
+    Vrai si les bases sont résumées par des accumulateurs de sommes pondérées par État
+    (`script.accumulators.StateMoments`).
+    """
+    return hasattr(dfs, "weighted_variances")
+
+
+def theme_indicator_moments(year, moments, theme, cat_variables, bin_variables):
+    """
+    Calcul d'un sous-indicateur thématique à partir des sommes pondérées par État
+    (Σw, Σw·x) : les transformations d'échelle de `scale_transformation`, affines sur
+    les modalités, s'appliquent aux sommes ; le nombre de modalités et les bornes sont
+    lus dans les statistiques des accumulateurs.
+
+    Args:
+        year : str
+            Année d'analyse.
+        moments : script.accumulators.StateMoments
+            Accumulateurs contenant les variables du thème.
+        theme : str
+            Nom du thème étudié.
+        cat_variables : list
+            Liste des variables catégorielles du sous-indicateur.
+        bin_variables : list
+            Liste des variables binaires du sous-indicateur.
+
+    Returns:
+        pandas.Series
+            Sous-indicateur normalisé sur [0, 1], indexé par FIPSST.
+    """
+    stats = moments.statistics(year)
+    transforms = {var: orientation(theme, "cat", stats[var]["distinct"])
+                  for var in cat_variables}
+    transforms.update({var: orientation(theme, "bin") for var in bin_variables})
+
+    means = moments.weighted_means(year, cat_variables + bin_variables, transforms)
+    minimum, maximum = theme_bounds(stats, theme, cat_variables, bin_variables)
+    indicator = (means.mean(axis=1) - minimum) / (maximum - minimum)
+    return indicator.rename(f"sub_indicator_{theme}_{year}")
+
+
+@profiled()
 def calculate_indicator(year, dfs, theme, cat_variables, bin_variables, groups):
     """
     Calcul effectif d'un sous-indicateur thématique (santé ou santé mentale), en utilisant
@@ -141,7 +371,12 @@ def calculate_indicator(year, dfs, theme, cat_variables, bin_variables, groups):
 
     Args:
         dfs : dict
-            Dictionnaire des bases de données.
+            Dictionnaire des bases de données, stockage colonne
+            (`script.survey.Survey`, `SharedSurvey`) : le calcul passe alors par
+            `theme_indicator_columns`, sans copie des bases, ou cube des effectifs
+            pondérés (`script.cube.WeightedCube`, voir `theme_indicator_cube`), ou
+            accumulateurs de sommes pondérées par État (`script.accumulators.StateMoments`,
+            voir `theme_indicator_moments`).
         year : str
             Année d'analyse, utilisée pour nommer la colonne du sous-indicateur.
         theme : str
@@ -163,17 +398,30 @@ def calculate_indicator(year, dfs, theme, cat_variables, bin_variables, groups):
             le sous-indicateur normalisé sur l'intervalle [0, 1] pour
             le thème et l'année considérés.
     """
+    if is_columnar(dfs):
+        return theme_indicator_columns(year, dfs, theme, cat_variables, bin_variables)
+    # les accumulateurs exposent aussi `weighted_means` : testés avant le cube
+    if is_moments(dfs):
+        return theme_indicator_moments(year, dfs, theme, cat_variables, bin_variables)
+    if is_cube(dfs):
+        return theme_indicator_cube(year, dfs, theme, cat_variables, bin_variables)
+
     variables = cat_variables + bin_variables
     df_theme = scale_transformation(year, dfs, variables, cat_variables, bin_variables, groups,
                                     theme)
 
-    maximum = df_theme[variables].max().sum()/len(df_theme[variables].columns)
-    minimum = df_theme[variables].min().sum()/len(df_theme[variables].columns)
+    # bornes lues dans le catalogue ; parcours des données si les modalités n'y sont pas
+    bounds = theme_bounds(statistics(dfs, year, variables), theme, cat_variables, bin_variables)
+    if bounds is None:
+        bounds = (df_theme[variables].min().sum()/len(df_theme[variables].columns),
+                  df_theme[variables].max().sum()/len(df_theme[variables].columns))
+    minimum, maximum = bounds
 
     indicator = state_indicator(df_theme, variables, theme, year, minimum, maximum)
     return indicator
 
 
+@profiled()
 def economic_pca_indicator(df, state_eco_vars, year):
     """
     Construit un sous-indicateur macro-économique de santé au niveau des États
@@ -201,36 +449,98 @@ def economic_pca_indicator(df, state_eco_vars, year):
             au sous-indicateur macro-économique normalisé sur [0, 1].
     """
     df_macro_state = df[["FIPSST"] + state_eco_vars].copy()
-    X = df_macro_state[state_eco_vars]
+    X = df_macro_state[state_eco_vars].to_numpy(dtype=float)
 
-    scaler = StandardScaler()
-    X_std = scaler.fit_transform(X)
-    X_std = pd.DataFrame(X_std, columns=state_eco_vars, index=df_macro_state.index)
+    # ACP (centrage-réduction, premier axe) et transformation I <- F(I) : voir pca_indicator_batch
+    df_macro_state[f"sub_indicator_macroeco_{year}"] = pca_indicator_batch(X)
+    df_macro_state["FIPSST"] = pd.to_numeric(df_macro_state["FIPSST"], errors="coerce")
+    return df_macro_state
 
-    pca = PCA()
-    pca.fit(X_std)
 
-    loadings = pca.components_[0]
-    weights_raw = abs(loadings)
-    weights = weights_raw / weights_raw.sum()
-    df_macro_state[f"sub_indicator_macroeco_{year}"] = (X_std * weights).sum(axis=1)
+def pca_indicator_batch(X, pooled=False):
+    """
+    Indicateur macro-économique par ACP, calculé pour plusieurs blocs à la fois
+    (années, réplications bootstrap) par une seule décomposition en valeurs
+    singulières vectorisée.
 
-    # Afin de se ramener à des valeurs entre 0 et 1
-    # on normalise notre indicateur et on effectue la transformation I <- F(I)
-    # où F est la fonction de répartition de la loi normale standard.
+    Pour chaque bloc : centrage-réduction des variables (comme StandardScaler),
+    poids égaux à la valeur absolue des coefficients du premier axe de l'ACP
+    (normalisés à 1), indicateur = somme pondérée des variables réduites, puis
+    normalisation et transformation I <- F(I), où F est la fonction de répartition
+    de la loi normale standard, afin de se ramener à des valeurs entre 0 et 1.
 
-    std_indic = (
-        df_macro_state[f"sub_indicator_macroeco_{year}"]
-        - df_macro_state[f"sub_indicator_macroeco_{year}"].mean()
-    ) / df_macro_state[f"sub_indicator_macroeco_{year}"].std()
+    Args:
+        X : numpy.ndarray
+            Tableau (..., États, variables), par exemple (années, États, variables)
+            ou (réplications, années, États, variables).
+        pooled : bool
+            Si vrai, la réduction, les coefficients de l'ACP et la normalisation
+            finale sont estimés une seule fois sur les années empilées (avant-dernier
+            axe de blocs), pour des indicateurs comparables dans le temps.
 
-    df_macro_state[f"sub_indicator_macroeco_{year}"] = norm.cdf(std_indic)
-    df_macro_state["FIPSST"] = pd.to_numeric(df_macro_state["FIPSST"], errors="coerce")
-    return df_macro_state
+    Returns:
+        numpy.ndarray
+            Tableau (..., États) des indicateurs sur [0, 1].
+    """
+    from scipy.special import ndtr
+
+    X = np.asarray(X, dtype=float)
+    shape = X.shape
+    if pooled:
+        if X.ndim < 3:
+            raise ValueError("pooled=True attend un tableau (..., années, États, variables)")
+        X = X.reshape(shape[:-3] + (shape[-3] * shape[-2], shape[-1]))
+
+    std = X.std(axis=-2, keepdims=True)
+    std[std == 0] = 1
+    Z = (X - X.mean(axis=-2, keepdims=True)) / std
+
+    # premier axe de l'ACP de chaque bloc (le signe est sans effet : valeur absolue)
+    _, _, vt = np.linalg.svd(Z, full_matrices=False)
+    loadings = np.abs(vt[..., 0, :])
+    weights = loadings / loadings.sum(axis=-1, keepdims=True)
+    indicator = np.einsum("...sv,...v->...s", Z, weights)
+
+    indicator = ((indicator - indicator.mean(axis=-1, keepdims=True))
+                 / indicator.std(axis=-1, ddof=1, keepdims=True))
+    return ndtr(indicator).reshape(shape[:-1])
+
+
+@profiled()
+def economic_pca_indicators(df, state_eco_vars_dict, years=None, pooled=False):
+    """
+    Sous-indicateurs macro-économiques de toutes les années en un seul calcul
+    (voir `pca_indicator_batch`).
+
+    Args:
+        df : pandas.DataFrame
+            DataFrame des variables macro-économiques par État (colonne "FIPSST").
+        state_eco_vars_dict : dict
+            Variables macro-économiques de chaque année (même nombre pour chaque année,
+            dans le même ordre).
+        years : list
+            Années (par défaut, celles de `state_eco_vars_dict`).
+        pooled : bool
+            Coefficients de l'ACP estimés une seule fois sur les années empilées.
+
+    Returns:
+        pandas.DataFrame
+            Colonnes "FIPSST" et "sub_indicator_macroeco_<year>" pour chaque année.
+    """
+    years = list(years or state_eco_vars_dict)
+    blocks = [df[state_eco_vars_dict[year]].to_numpy(dtype=float) for year in years]
+    if len({block.shape[1] for block in blocks}) > 1:
+        raise ValueError("Les années doivent avoir le même nombre de variables économiques")
+
+    values = pca_indicator_batch(np.stack(blocks), pooled=pooled)
+    df_macro = pd.DataFrame({"FIPSST": pd.to_numeric(df["FIPSST"], errors="coerce")})
+    for i, year in enumerate(years):
+        df_macro[f"sub_indicator_macroeco_{year}"] = values[i]
+    return df_macro
 
 
 def average_economic_indicator(year, df_eco, dfs, theme, cat_variables, bin_variables, groups,
-                               state_eco_vars_dict):
+                               state_eco_vars_dict, indicator_pca=None):
     """
     Construit un sous-indicateur économique global par État en combinant
     des dimensions micro-économiques et macro-économiques.
@@ -268,6 +578,10 @@ def average_economic_indicator(year, df_eco, dfs, theme, cat_variables, bin_vari
             Dictionnaire associant à chaque année la liste des variables
             macro-économiques utilisées dans l'ACP.
 
+        indicator_pca : pandas.DataFrame, optionnel
+            Sous-indicateur macro-économique déjà calculé (colonnes "FIPSST" et
+            "sub_indicator_macroeco_<year>", voir `economic_pca_indicators`).
+
     Returns:
         pandas.Series
             Série indexée par le code FIPS des États (FIPSST) contenant
@@ -275,8 +589,9 @@ def average_economic_indicator(year, df_eco, dfs, theme, cat_variables, bin_vari
             [0, 1] pour l'année considérée.
     """
     indicator_NSCH = calculate_indicator(year, dfs, theme, cat_variables, bin_variables, groups)
-    state_eco_vars = state_eco_vars_dict[year]
-    indicator_pca = economic_pca_indicator(df_eco, state_eco_vars, year)
+    if indicator_pca is None:
+        state_eco_vars = state_eco_vars_dict[year]
+        indicator_pca = economic_pca_indicator(df_eco, state_eco_vars, year)
 
     indicator_eco = indicator_pca.merge(indicator_NSCH, on="FIPSST", how="inner")
     indicator_eco.set_index("FIPSST", inplace=True)
@@ -289,7 +604,7 @@ def over_all_indicators_year(year, df_eco, dfs, groups,
                              mental_category_vars, mental_bin_vars,
                              health_category_vars, health_bin_vars,
                              NSCH_eco_cat_vars, NSCH_eco_bin_vars,
-                             state_eco_vars_dict):
+                             state_eco_vars_dict, indicator_pca=None):
     """
     Calcule l'ensemble des sous-indicateurs thématiques de santé des enfants
     au niveau des États pour une année donnée.
@@ -349,6 +664,9 @@ def over_all_indicators_year(year, df_eco, dfs, groups,
             macro-économiques utilisées dans la construction de l’indicateur
             économique.
 
+        indicator_pca : pandas.DataFrame, optionnel
+            Sous-indicateur macro-économique déjà calculé pour l'année.
+
     Returns:
         tuple of pandas.DataFrame
             Tuple contenant trois DataFrames indexés par le code FIPS des États :
@@ -372,7 +690,7 @@ def over_all_indicators_year(year, df_eco, dfs, groups,
 
     eco_indicator = average_economic_indicator(year, df_eco, dfs, "micro_eco",
                                                NSCH_eco_cat_vars, NSCH_eco_bin_vars, groups,
-                                               state_eco_vars_dict)
+                                               state_eco_vars_dict, indicator_pca)
     eco_indicator = eco_indicator.to_frame(name=f"sub_indicator_eco_{year}")
     eco = eco_indicator[[f"sub_indicator_eco_{year}"]]
 
@@ -383,7 +701,7 @@ def global_health_over_years(years, df_eco, dfs, groups,
                              mental_category_vars, mental_bin_vars,
                              health_category_vars, health_bin_vars,
                              NSCH_eco_cat_vars, NSCH_eco_bin_vars,
-                             state_eco_vars_dict):
+                             state_eco_vars_dict, pooled_pca=False):
 
     """
     Construit l'indicateur global de santé des enfants aux États-Unis
@@ -434,6 +752,11 @@ def global_health_over_years(years, df_eco, dfs, groups,
             macro-économiques utilisées dans la construction de l'indicateur
             économique.
 
+        pooled_pca : bool
+            Si vrai, les coefficients de l'ACP macro-économique sont estimés une
+            seule fois sur l'ensemble des années (indicateurs comparables dans le temps) ;
+            sinon une ACP par année, toutes calculées en un seul appel.
+
     Returns:
         pandas.DataFrame
             DataFrame indexé par le code FIPS des États (FIPSST) contenant :
@@ -441,66 +764,77 @@ def global_health_over_years(years, df_eco, dfs, groups,
             - l'indicateur global de santé des enfants
             ("indicator_global_health_<year>") pour chaque année analysée.
     """
-    indicators_dfs = []
-    for year in years:
-        mental, health, eco = over_all_indicators_year(year, df_eco, dfs, groups,
-                                                       mental_category_vars, mental_bin_vars,
-                                                       health_category_vars, health_bin_vars,
-                                                       NSCH_eco_cat_vars, NSCH_eco_bin_vars,
-                                                       state_eco_vars_dict)
-        indicators_dfs.extend([mental, health, eco])
-
-    indicators_dfs = reduce(lambda left, right: left.join(right, how="inner"), indicators_dfs)
-    for year in years:
-        indicators_dfs[f"indicator_global_health_{year}"] = (
-             indicators_dfs[f"sub_indicator_mental_{year}"] *
-             indicators_dfs[f"sub_indicator_health_{year}"] *
-             indicators_dfs[f"sub_indicator_eco_{year}"])**(1/3)
-
-    return indicators_dfs
-
+    # ACP macro-économique de toutes les années en une seule décomposition
+    df_macro = economic_pca_indicators(df_eco, state_eco_vars_dict, years, pooled=pooled_pca)
 
-def comparison_new_indicator(annual_report, df_global_indicator, df_eco):
+    # format long (année, thème, État, valeur) assemblé en une seule concaténation
+    pieces, keys = [], []
+    for year in years:
+        indicator_pca = df_macro[["FIPSST", f"sub_indicator_macroeco_{year}"]]
+        sub_indicators = over_all_indicators_year(year, df_eco, dfs, groups,
+                                                  mental_category_vars, mental_bin_vars,
+                                                  health_category_vars, health_bin_vars,
+                                                  NSCH_eco_cat_vars, NSCH_eco_bin_vars,
+                                                  state_eco_vars_dict, indicator_pca)
+        for theme, frame in zip(THEMES, sub_indicators):
+            pieces.append(frame.iloc[:, 0])
+            keys.append((year, theme))
+    df_long = pd.concat(pieces, keys=keys, names=["year", "theme", "FIPSST"]).rename("value")
+
+    # tableau (État x année x thème) ; seuls les États présents dans tous les
+    # sous-indicateurs sont conservés (jointure interne : une valeur manquante reste NaN)
+    states = pieces[0].index
+    for piece in pieces[1:]:
+        states = states.intersection(piece.index, sort=False)
+    wide = df_long.unstack(["year", "theme"])
+    wide = wide.reindex(index=states, columns=pd.MultiIndex.from_product([years, THEMES]))
+    sub = wide.to_numpy().reshape(len(wide), len(years), len(THEMES))
+
+    # indicateur global : moyenne géométrique des sous-indicateurs, pour tous les États
+    # et toutes les années en une opération
+    global_health = sub.prod(axis=2) ** (1 / len(THEMES))
+
+    columns = ([f"sub_indicator_{theme}_{year}" for year in years for theme in THEMES]
+               + [f"indicator_global_health_{year}" for year in years])
+    values = np.hstack([sub.reshape(len(wide), -1), global_health])
+    return pd.DataFrame(values, index=wide.index.rename("FIPSST"), columns=columns)
+
+
+AHR_WEIGHTS = {
+    "Social and Economic Factors": 0.3,
+    "Physical Environment": 0.1,
+    "Clinical Care": 0.15,
+    "Behaviors": 0.2,
+    "Health Outcomes": 0.25
+}
+
+
+def ahr_indicator(annual_report, df_eco, weight_dict=None, crosswalk=None):
     """
-    Effectuer la comparaison de l'indicateur produit avec l'indicateur d'America's Health Rankings.
+    Calcule l'indicateur global d'America's Health Rankings par État, comme moyenne
+    pondérée des scores des cinq catégories de mesures.
+
     Args :
         annual_report (dataframe) : base de données d'America's Health Rankings
-        df_global_indicator (dataframe) : base de données de l'indicateur produit
         df_eco (dataframe) : base de données economique permetant de récupérer la correspondance
         entre le nom et le code d'un état
+        weight_dict (dict) : poids de chaque catégorie (par défaut `AHR_WEIGHTS`)
+        crosswalk (script.states.StateCrosswalk) : correspondance des États
+        (par défaut, construite sur `df_eco`)
     Returns:
-        un dataframe obtenu suite à une jointure entre l'indicateur UHF et notre modélisation
+        pandas.Series indexée par le code FIPS des États (FIPSST, entier)
     """
+    from script.states import StateCrosswalk
 
-    measures_to_keep = [
-        "Social and Economic Factors", "Behaviors",
-        "Clinical Care", "Health Outcomes", "Physical Environment"
-    ]
-
-    weight_dict = {
-        "Social and Economic Factors": 0.3,
-        "Physical Environment": 0.1,
-        "Clinical Care": 0.15,
-        "Behaviors": 0.2,
-        "Health Outcomes": 0.25
-    }
-
-    geo_fips_clean = (
-                        df_eco["GeoFIPS"]
-                        .str.replace('"', '')
-                        .str.strip()
-                        .str[:-3]
-                        .astype(str)
-                        .str.lstrip('0')
-    )
-
-    state_to_fips = dict(zip(df_eco["STUSPS"], geo_fips_clean))
+    if weight_dict is None:
+        weight_dict = AHR_WEIGHTS
+    crosswalk = crosswalk or StateCrosswalk.from_frame(df_eco)
 
     # ---------------------------
     # Filtrage et sélection des colonnes
     # ---------------------------
-    df = annual_report[annual_report["Measure"].isin(measures_to_keep)][["Measure", "State",
-                                                                         "Score"]].copy()
+    df = annual_report[annual_report["Measure"].isin(list(weight_dict))][["Measure", "State",
+                                                                          "Score"]].copy()
 
     # ---------------------------
     # Ajout des poids
@@ -514,24 +848,41 @@ def comparison_new_indicator(annual_report, df_global_indicator, df_eco):
         .groupby(df["State"]).transform('sum') / df.groupby("State")["Weight"].transform('sum')
 
     # ---------------------------
-    # Étape 4 : ajout du code FIPS
+    # Ajout du code FIPS, 1 ligne par État
     # ---------------------------
-    df["FIPSST"] = df["State"].map(state_to_fips).astype(str)
-    df_global_indicator.index = df_global_indicator.index.astype(str)
+    df["FIPSST"] = crosswalk.to_fips(df["State"])
+    df = df.dropna(subset=["FIPSST"]).astype({"FIPSST": int})
+    return df.groupby("FIPSST")["global_indicator_UHF"].first()
 
-    # ---------------------------
-    # Étape 5 : garder 1 ligne par État pour fusionner
-    # ---------------------------
-    df_state = df.groupby("FIPSST", as_index=False)["global_indicator_UHF"].first()
+
+def comparison_new_indicator(annual_report, df_global_indicator, df_eco, weight_dict=None,
+                             crosswalk=None):
+    """
+    Effectuer la comparaison de l'indicateur produit avec l'indicateur d'America's Health Rankings.
+    Args :
+        annual_report (dataframe) : base de données d'America's Health Rankings
+        df_global_indicator (dataframe) : base de données de l'indicateur produit
+        df_eco (dataframe) : base de données economique permetant de récupérer la correspondance
+        entre le nom et le code d'un état
+        weight_dict (dict) : poids des catégories d'America's Health Rankings
+        (par défaut `AHR_WEIGHTS`)
+        crosswalk (script.states.StateCrosswalk) : correspondance des États
+        (par défaut, construite sur `df_eco`)
+    Returns:
+        un dataframe obtenu suite à une jointure entre l'indicateur UHF et notre modélisation
+    """
+    df_state = ahr_indicator(annual_report, df_eco, weight_dict, crosswalk).to_frame()
 
     # ---------------------------
-    # Étape 6 : merge avec df_global_indicator
+    # merge avec df_global_indicator (clé entière FIPSST)
     # ---------------------------
-    df_final = df_state.set_index("FIPSST").join(
+    df_global_indicator = df_global_indicator.set_axis(
+        df_global_indicator.index.astype(int), axis=0)
+    df_final = df_state.join(
         df_global_indicator[["indicator_global_health_2024", "sub_indicator_health_2024",
                              "sub_indicator_mental_2024", "sub_indicator_eco_2024"]],
         how="inner"
-    ).reset_index()
+    ).rename_axis("FIPSST").reset_index()
 
     # Sélection des colonnes finales
     df_final = df_final[["FIPSST",
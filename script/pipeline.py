@@ -0,0 +1,364 @@
+"""
+Chaîne de traitement complète, sans noyau Jupyter :
+ingestion -> imputation -> stockage colonne -> cube des effectifs pondérés ->
+régressions pondérées (linéaires, logistiques) -> enrichissement -> indicateurs -> exports.
+
+Le fichier de configuration (JSON, voir `config/pipeline.json`) contient les chemins
+de lecture/écriture et les listes de variables définies dans le notebook.
+"""
+import json
+import os
+
+import pandas as pd
+
+from script import clean_data as cd
+from script import model
+from script import profiling
+from script.states import StateCrosswalk
+from script.survey import write_survey
+
+# configuration livrée avec le dépôt
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              "config", "pipeline.json")
+
+
+def load_config(path):
+    """
+    Lecture du fichier de configuration.
+
+    Args:
+        path (str) : chemin du fichier JSON
+
+    Returns:
+        dict : configuration
+    """
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def final_variables(variables):
+    """
+    Variables conservées dans les bases NSCH (variables thématiques et opérationnelles).
+
+    Args:
+        variables (dict) : section "variables" de la configuration
+
+    Returns:
+        list
+    """
+    return sorted(set(theme_variables(variables)) | set(variables["operational_vars"]))
+
+
+def theme_variables(variables):
+    """
+    Variables thématiques (catégorielles et binaires) des trois sous-indicateurs.
+
+    Args:
+        variables (dict) : section "variables" de la configuration
+
+    Returns:
+        list
+    """
+    keys = ["health_category_vars", "health_bin_vars", "mental_category_vars",
+            "mental_bin_vars", "NSCH_eco_cat_vars", "NSCH_eco_bin_vars"]
+    return sorted({var for key in keys for var in variables[key]})
+
+
+def ingestion(fs, config, years, cache_dir):
+    """
+    Téléchargement et lecture des bases NSCH, du shapefile, des données économiques
+    et du rapport d'America's Health Rankings.
+
+    Args:
+        fs : abstraction du filesystem
+        config (dict) : configuration
+        years (list) : années des enquetes NSCH
+        cache_dir (str) : dossier local de téléchargement
+
+    Returns:
+        dict : dfs (dict de dataframes NSCH), gdf, gdp, annual_report
+    """
+    paths = config["paths"]
+    for sub in ["nsch", "map", "economic"]:
+        os.makedirs(os.path.join(cache_dir, sub), exist_ok=True)
+    local = {sub: os.path.join(cache_dir, sub) + os.sep for sub in ["nsch", "map", "economic"]}
+
+    # tous les téléchargements sont lancés ensemble ; chaque fichier est lu dès son arrivée
+    taches = cd.taches_sas(paths["nsch"], local["nsch"], years)
+    taches["gdf"] = cd.tache_shapefile(paths["map"], local["map"])
+    taches["gdp"] = cd.tache_csv(f"{paths['economic']}{paths['gdp_file']}",
+                                 f"{local['economic']}{paths['gdp_file']}")
+    taches["annual_report"] = cd.tache_csv(f"{paths['nsch']}{paths['annual_report_file']}",
+                                           f"{local['nsch']}{paths['annual_report_file']}",
+                                           latin_encoding=True)
+    raw = cd.lecture_concurrente(fs, taches)
+
+    keep = final_variables(config["variables"])
+    dfs = {year: raw[year].loc[:, raw[year].columns.isin(keep)] for year in years}
+    gdf, gdp, annual_report = raw["gdf"], raw["gdp"], raw["annual_report"]
+    return {"dfs": dfs, "gdf": gdf, "gdp": gdp, "annual_report": annual_report}
+
+
+def imputation(fs, config, years, dfs, workers):
+    """
+    Imputation des valeurs manquantes (ou relecture des bases imputées depuis S3).
+
+    Args:
+        fs : abstraction du filesystem
+        config (dict) : configuration
+        years (list) : années des enquetes NSCH
+        dfs (dict) : dictionnaire des dataset NSCH
+        workers (int) : nombre de processus
+
+    Returns:
+        dict : dictionnaire des dataset NSCH imputés
+    """
+    settings = config.get("imputation", {})
+    if settings.get("read_imputed_from_s3", False):
+        dfs_final = cd.read_on_S3(fs, years)
+    elif settings.get("mode", "year") == "pooled":
+        # index de donneurs commun à toutes les années
+        dfs_final = cd.impute_values_over_dataset(years, dfs, mode="pooled",
+                                                  year_as=settings.get("year_as", "stratum"),
+                                                  year_window=settings.get("year_window"))
+    elif settings.get("mode", "year") == "stratified":
+        # voisins recherchés par strate (État, FORMTYPE...), strates en parallèle
+        dfs_final = cd.impute_values_over_dataset(
+            years, dfs, max_workers=workers, mode="stratified",
+            strata=settings.get("strata", ["FIPSST", "FORMTYPE"]),
+            min_stratum_size=settings.get("min_stratum_size", 100))
+    else:
+        dfs_final = cd.impute_values_over_dataset(years, dfs, max_workers=workers)
+    return dfs_final
+
+
+def quality(config, stage, dfs, years, strict=True):
+    """
+    Contrôle de qualité des bases après une étape (`script.validation`) : contrat
+    complet pour les bases imputées, sans les règles de complétude pour les bases lues.
+
+    Args:
+        config (dict) : configuration
+        stage (str) : nom de l'étape ("ingestion" : bases lues)
+        dfs : dictionnaire des dataset NSCH, ou stockage colonne
+        years (list) : années
+        strict (bool) : lever une ValidationError en cas d'échec
+
+    Returns:
+        pandas.DataFrame : rapport de l'étape (colonne `stage` ajoutée)
+    """
+    from script.validation import build_contract, validate
+
+    contract = build_contract(config, "raw" if stage == "ingestion" else "imputed")
+    report = validate(dfs, contract, years)
+    print(f"    {len(report.failures())} règle(s) en échec sur {len(report.table)}", flush=True)
+    if strict:
+        report.raise_for_failures()
+    return report.table.assign(stage=stage)
+
+
+def enrichment(gdp, gdf):
+    """
+    Jointure et nettoyage des données économiques et géographiques.
+
+    Returns:
+        tuple : (df_eco_geo, df_eco_geo_indic)
+    """
+    df_eco_geo = cd.clean_enrichment_datasets(gdp, gdf)
+    return df_eco_geo, cd.clean_eco_data(df_eco_geo)
+
+
+def cube(config, years, dfs_final, output_dir):
+    """
+    Construction du cube des effectifs pondérés des variables thématiques
+    (`script.cube.build_cube`) et de la matrice des moyennes orientées par État
+    (`script.state_means.build_state_means`), écrits dans `output_dir/cube` et
+    `output_dir/state_means`.
+
+    Returns:
+        script.cube.WeightedCube
+    """
+    from script.cube import build_cube
+    from script.state_means import build_state_means
+
+    weighted_cube = build_cube(dfs_final, theme_variables(config["variables"]), years)
+    weighted_cube.write(os.path.join(output_dir, "cube"))
+    build_state_means(weighted_cube, config["variables"], years).write(
+        os.path.join(output_dir, "state_means"))
+    return weighted_cube
+
+
+def regressions(config, years, dfs_final, output_dir):
+    """
+    Régressions pondérées par (année, État) de la section "regression" de la
+    configuration (`script.regression.weighted_regressions`), écrites dans
+    `output_dir/regressions.csv`.
+
+    Returns:
+        pandas.DataFrame : coefficients et écarts-types, une ligne par régresseur
+    """
+    from script.regression import weighted_regressions
+
+    settings = config["regression"]
+    results = weighted_regressions(dfs_final, settings["outcomes"], settings["regressors"],
+                                   years, by=settings.get("by", ["FIPSST"]),
+                                   cov=settings.get("cov", "HC1"))
+    os.makedirs(output_dir, exist_ok=True)
+    results.to_csv(os.path.join(output_dir, "regressions.csv"), index=False)
+    return results
+
+
+def logistic_models(config, years, dfs_final, output_dir, workers=1):
+    """
+    Régressions logistiques pondérées des variables binaires de la section "logistic"
+    de la configuration (`script.logistic.weighted_logistic_models`), écrites dans
+    `output_dir/logistic.csv`. Les variables expliquées sont désignées par les
+    listes de la section "variables" ("health_bin_vars", ...).
+
+    Returns:
+        pandas.DataFrame : coefficients et écarts-types, une ligne par colonne du modèle
+    """
+    from script.logistic import weighted_logistic_models
+
+    settings = config["logistic"]
+    outcomes = [var for key in settings["outcomes"] for var in config["variables"][key]]
+    results = weighted_logistic_models(dfs_final, outcomes, settings["determinants"], years,
+                                       cov=settings.get("cov", "HC1"), max_workers=workers)
+    os.makedirs(output_dir, exist_ok=True)
+    results.to_csv(os.path.join(output_dir, "logistic.csv"), index=False)
+    return results
+
+
+def indicators(config, years, dfs_final, df_eco):
+    """
+    Construction des sous-indicateurs et de l'indicateur global, à partir du
+    dictionnaire des bases imputées, de leur stockage colonne (`script.survey.Survey`)
+    du cube des effectifs pondérés (`script.cube.WeightedCube`) ou des sommes pondérées
+    par État (`script.accumulators.StateMoments`).
+
+    Returns:
+        pandas.DataFrame : sortie de `model.global_health_over_years`
+    """
+    variables = config["variables"]
+    state_eco_vars_dict = {year: [f"{year}_{var}" for var in variables["eco_templates"]]
+                           for year in years}
+    return model.global_health_over_years(
+        years=years,
+        df_eco=df_eco,
+        dfs=dfs_final,
+        groups=set(variables["groups"]),
+        mental_category_vars=variables["mental_category_vars"],
+        mental_bin_vars=variables["mental_bin_vars"],
+        health_category_vars=variables["health_category_vars"],
+        health_bin_vars=variables["health_bin_vars"],
+        NSCH_eco_cat_vars=variables["NSCH_eco_cat_vars"],
+        NSCH_eco_bin_vars=variables["NSCH_eco_bin_vars"],
+        state_eco_vars_dict=state_eco_vars_dict,
+        pooled_pca=config.get("pca", {}).get("pooled", False))
+
+
+def exports(output_dir, years, df_indicator, annual_report, df_eco_geo, crosswalk=None):
+    """
+    Écriture des résultats : indicateurs (csv et stock parquet), comparaison avec
+    America's Health Rankings et analyse de Kendall. `crosswalk` est la correspondance
+    des États (`script.states.StateCrosswalk`) construite à l'enrichissement.
+
+    Returns:
+        list : chemins écrits
+    """
+    from script.analyse_data import kendall_analysis
+    from script.store import write_indicator_store
+
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+
+    path = os.path.join(output_dir, "indicators.csv")
+    df_indicator.to_csv(path)
+    written.append(path)
+
+    path = os.path.join(output_dir, "indicators")
+    write_indicator_store(df_indicator, path)
+    written.append(path)
+
+    path = os.path.join(output_dir, "kendall.csv")
+    kendall_analysis(df_indicator, years=years).to_csv(path, index=False)
+    written.append(path)
+
+    if "indicator_global_health_2024" in df_indicator.columns:
+        path = os.path.join(output_dir, "comparison_ahr.csv")
+        model.comparison_new_indicator(annual_report, df_indicator, df_eco_geo,
+                                       crosswalk=crosswalk).to_csv(path, index=False)
+        written.append(path)
+    return written
+
+
+def run(config, years=None, workers=1, cache_dir=None, output_dir=None, fs=None):
+    """
+    Exécution de la chaîne complète.
+
+    Args:
+        config (dict) : configuration
+        years (list) : années (par défaut celles de la configuration)
+        workers (int) : nombre de processus pour l'imputation
+        cache_dir (str) : dossier local de téléchargement (par défaut celui de la configuration)
+        output_dir (str) : dossier des exports (par défaut celui de la configuration)
+        fs : abstraction du filesystem (par défaut S3 via s3fs)
+
+    Returns:
+        pandas.DataFrame : indicateurs par État
+    """
+    years = [str(y) for y in (years or config["years"])]
+    cache_dir = cache_dir or config["paths"]["cache_dir"]
+    output_dir = output_dir or config["paths"]["output_dir"]
+    if fs is None:
+        import s3fs
+        fs = s3fs.S3FileSystem(client_kwargs=config.get("s3", {}))
+
+    # contrôle de qualité après chaque étape qui produit des bases individuelles
+    reports = []
+    with profiling.stage("ingestion"):
+        print("Ingestion", flush=True)
+        raw = ingestion(fs, config, years, cache_dir)
+        # bases lues : rapport seulement, l'imputation traite les valeurs manquantes
+        reports.append(quality(config, "ingestion", raw["dfs"], years, strict=False))
+    with profiling.stage("imputation", raw["dfs"]):
+        print("Imputation", flush=True)
+        dfs_final = imputation(fs, config, years, raw["dfs"], workers)
+        reports.append(quality(config, "imputation", dfs_final, years))
+    with profiling.stage("survey", dfs_final):
+        print("Stockage colonne", flush=True)
+        # bases imputées projetées en mémoire : les indicateurs lisent des vues numpy
+        survey = write_survey(dfs_final, os.path.join(cache_dir, "survey"), years)
+        reports.append(quality(config, "survey", survey, years))
+    with profiling.stage("cube", dfs_final):
+        print("Cube des effectifs pondérés", flush=True)
+        cube(config, years, survey, output_dir)
+    if "regression" in config:
+        with profiling.stage("regressions", dfs_final):
+            print("Régressions pondérées", flush=True)
+            regressions(config, years, survey, output_dir)
+    if "logistic" in config:
+        with profiling.stage("logistic", dfs_final):
+            print("Régressions logistiques", flush=True)
+            logistic_models(config, years, survey, output_dir, workers)
+    with profiling.stage("enrichment", raw["gdp"]):
+        print("Enrichissement", flush=True)
+        df_eco_geo, df_eco = enrichment(raw["gdp"], raw["gdf"])
+        # correspondance des États (FIPSST entier, USPS, nom, ligne géographique)
+        crosswalk = StateCrosswalk.from_frame(df_eco_geo)
+    with profiling.stage("indicators", dfs_final):
+        print("Indicateurs", flush=True)
+        df_indicator = indicators(config, years, survey, df_eco)
+    with profiling.stage("exports", df_indicator):
+        print("Exports", flush=True)
+        for path in exports(output_dir, years, df_indicator, raw["annual_report"], df_eco_geo,
+                            crosswalk):
+            print(f"    {path}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    pd.concat(reports, ignore_index=True).to_csv(os.path.join(output_dir, "validation.csv"),
+                                                 index=False)
+    # rapport d'exécution : durées, CPU, mémoire et volumes par étape
+    profiling.write_report(os.path.join(output_dir, "run_report.json"))
+    profiling.write_report(os.path.join(output_dir, "run_report.csv"))
+    return df_indicator
@@ -0,0 +1,226 @@
+"""
+Instrumentation des étapes de calcul : temps réel, temps CPU, variation du pic de
+mémoire (RSS) et nombre de lignes/colonnes traitées, avec un profil cProfile
+optionnel par étape.
+
+Les mesures sont agrégées par étape (nombre d'appels, cumuls et maxima) : la taille
+du rapport ne dépend pas du nombre d'appels des fonctions décorées par `profiled`.
+Elles sont propres au processus : les étapes exécutées dans les processus d'un
+`ProcessPoolExecutor` (imputation, moments par État, ...) ne remontent pas dans le
+rapport du processus principal, où seule l'étape englobante est mesurée (temps réel).
+
+Exemple :
+    from script import profiling
+    profiling.configure(profile_dir="results/profiles")   # optionnel
+    with profiling.stage("imputation"):
+        ...
+    profiling.write_report("results/run_report.json")
+"""
+import cProfile
+import functools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows : pas de mesure du pic de mémoire
+    resource = None
+
+REPORT_COLUMNS = ["stage", "depth", "calls", "wall_s", "wall_max_s", "cpu_s",
+                  "peak_rss_delta_mb", "rows", "columns", "profile"]
+
+# mesures agrégées par (étape, profondeur), dans l'ordre de première apparition
+_records = {}
+_lock = threading.Lock()
+_state = threading.local()
+_settings = {"profile_dir": None}
+
+
+def configure(profile_dir=None):
+    """
+    Active (ou désactive avec None) l'écriture d'un profil cProfile par étape.
+
+    Args:
+        profile_dir (str) : dossier des fichiers `<étape>.prof`
+    """
+    if profile_dir is not None:
+        os.makedirs(profile_dir, exist_ok=True)
+    _settings["profile_dir"] = profile_dir
+
+
+def reset():
+    """
+    Vide le rapport d'exécution.
+    """
+    with _lock:
+        _records.clear()
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en kilo-octets sous Linux
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def _shape(obj):
+    """
+    Nombre de lignes et de colonnes d'un DataFrame, d'une Series ou d'un
+    dictionnaire de DataFrames (None si non applicable).
+    """
+    if isinstance(obj, dict):
+        shapes = [_shape(value) for value in obj.values()]
+        shapes = [s for s in shapes if s is not None]
+        if not shapes:
+            return None
+        return sum(r for r, _ in shapes), max(c for _, c in shapes)
+    shape = getattr(obj, "shape", None)
+    if shape is None or not hasattr(obj, "columns") and len(shape) != 1:
+        return None
+    return shape[0], (shape[1] if len(shape) > 1 else 1)
+
+
+class Stage:
+    """
+    Mesures d'une étape en cours ; `rows` et `columns` peuvent être renseignés
+    dans le bloc `with` si la détection automatique ne convient pas.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+        self.columns = None
+
+    def record_shape(self, obj):
+        shape = _shape(obj)
+        if shape is not None and self.rows is None:
+            self.rows, self.columns = shape
+
+
+@contextmanager
+def stage(name, data=None):
+    """
+    Mesure une étape de calcul et l'ajoute au rapport d'exécution.
+
+    Args:
+        name (str) : nom de l'étape
+        data : DataFrame (ou dict de DataFrames) traité, pour le nombre de lignes/colonnes
+
+    Returns:
+        Stage : objet de l'étape (attributs rows/columns modifiables)
+    """
+    current = Stage(name)
+    current.record_shape(data)
+    depth = getattr(_state, "depth", 0)
+
+    # un seul profileur actif à la fois : seules les étapes de premier niveau sont profilées
+    profiler = None
+    if _settings["profile_dir"] is not None and depth == 0:
+        profiler = cProfile.Profile()
+
+    rss_before = _peak_rss_mb()
+    cpu_before = time.process_time()
+    wall_before = time.perf_counter()
+    _state.depth = depth + 1
+    if profiler is not None:
+        try:
+            profiler.enable()
+        except ValueError:  # un autre profileur est déjà actif (autre thread)
+            profiler = None
+    try:
+        yield current
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        _state.depth = depth
+        wall = time.perf_counter() - wall_before
+        cpu = time.process_time() - cpu_before
+        rss = _peak_rss_mb() - rss_before
+        with _lock:
+            record = _records.setdefault((name, depth), {
+                "stage": name, "depth": depth, "calls": 0, "wall_s": 0.0, "wall_max_s": 0.0,
+                "cpu_s": 0.0, "peak_rss_delta_mb": rss, "rows": None, "columns": None,
+                "profile": None})
+            record["calls"] += 1
+            record["wall_s"] += wall
+            record["wall_max_s"] = max(record["wall_max_s"], wall)
+            record["cpu_s"] += cpu
+            record["peak_rss_delta_mb"] = max(record["peak_rss_delta_mb"], rss)
+            if current.rows is not None:
+                record["rows"] = (record["rows"] or 0) + current.rows
+                record["columns"] = max(record["columns"] or 0, current.columns)
+            if profiler is not None:
+                # un seul profil par étape, cumulé sur ses appels
+                path = os.path.join(_settings["profile_dir"], f"{name}.prof")
+                if record["profile"] is None:
+                    profiler.dump_stats(path)
+                else:
+                    pstats.Stats(profiler).add(path).dump_stats(path)
+                record["profile"] = path
+
+
+def profiled(name=None):
+    """
+    Décorateur : chaque appel de la fonction est mesuré comme une étape.
+    Les lignes/colonnes sont lues sur le premier argument tabulaire (pour un
+    dictionnaire de bases indexé par année, sur la base de l'année passée en
+    argument), à défaut sur le résultat.
+
+    Args:
+        name (str) : nom de l'étape (par défaut, le nom de la fonction)
+    """
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name) as current:
+                values = list(args) + list(kwargs.values())
+                # appels du type f(year, dfs, ...) : seule la base de l'année est traitée
+                keys = [v for v in values if isinstance(v, str)]
+                for value in values:
+                    if isinstance(value, dict):
+                        value = next((value[k] for k in keys if k in value), value)
+                    current.record_shape(value)
+                result = func(*args, **kwargs)
+                current.record_shape(result)
+            return result
+        return wrapper
+    return decorator
+
+
+def report():
+    """
+    Rapport d'exécution : une ligne par étape (et profondeur d'imbrication), avec le
+    nombre d'appels, les temps cumulés (`wall_s`, `cpu_s`), le temps du plus long appel,
+    la plus forte hausse du pic de mémoire et le nombre total de lignes traitées.
+
+    Returns:
+        pandas.DataFrame
+    """
+    import pandas as pd
+
+    with _lock:
+        return pd.DataFrame([dict(r) for r in _records.values()], columns=REPORT_COLUMNS)
+
+
+def write_report(path):
+    """
+    Écrit le rapport d'exécution au format JSON ou CSV (selon l'extension).
+
+    Args:
+        path (str) : chemin du fichier (.json ou .csv)
+    """
+    if path.endswith(".csv"):
+        report().to_csv(path, index=False)
+    else:
+        with _lock:
+            records = [dict(r) for r in _records.values()]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(records, f, indent=2)
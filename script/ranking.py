@@ -0,0 +1,379 @@
+import numpy as np
+import pandas as pd
+
+# scipy.stats est importé dans les fonctions qui l'utilisent (import coûteux).
+
+
+def rank_draws(draws, ascending=False):
+    """
+    Calcule les rangs des États pour chaque réplication et chaque année.
+
+    Les rangs sont obtenus de façon vectorisée par un argsort le long de l'axe des
+    États (1 = meilleur État lorsque ascending=False). Les ex æquo reçoivent le plus
+    petit rang du groupe, comme `DataFrame.rank(method="min")` utilisé pour la
+    heatmap de `analyse_data.state_rankings`.
+
+    Args:
+        draws : numpy.ndarray
+            Tableau de dimension (réplications x États x années) contenant
+            les tirages de l'indicateur.
+        ascending : bool
+            Si False (par défaut), le score le plus élevé reçoit le rang 1.
+
+    Returns:
+        numpy.ndarray
+            Tableau d'entiers de même dimension que `draws` contenant les rangs
+            (de 1 au nombre d'États).
+    """
+    draws = np.asarray(draws, dtype=float)
+    if draws.ndim == 2:
+        draws = draws[np.newaxis]
+    keys = draws if ascending else -draws
+    order = np.argsort(keys, axis=1, kind="stable")
+    sorted_keys = np.take_along_axis(keys, order, axis=1)
+    # rang « min » : position (1-indexée) du début du groupe d'ex æquo
+    position = np.arange(1, draws.shape[1] + 1).reshape(1, -1, 1)
+    starts = np.ones(sorted_keys.shape, dtype=bool)
+    starts[:, 1:] = sorted_keys[:, 1:] != sorted_keys[:, :-1]
+    sorted_ranks = np.maximum.accumulate(np.where(starts, position, 0), axis=1)
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, sorted_ranks, axis=1)
+    return ranks
+
+
+def rank_distribution(ranks):
+    """
+    Distribution empirique des rangs de chaque État pour chaque année.
+
+    Args:
+        ranks : numpy.ndarray
+            Rangs de dimension (réplications x États x années), issus de `rank_draws`.
+
+    Returns:
+        numpy.ndarray
+            Tableau (États x années x rangs) contenant la proportion des
+            réplications dans lesquelles l'État occupe chaque rang.
+    """
+    n_rep, n_states, n_years = ranks.shape
+    # une seule passe de bincount : on décale les rangs de chaque couple (État, année)
+    cell = np.arange(n_states * n_years).reshape(1, n_states, n_years)
+    flat = (cell * n_states + (ranks - 1)).ravel()
+    counts = np.bincount(flat, minlength=n_states * n_years * n_states)
+    return counts.reshape(n_states, n_years, n_states) / n_rep
+
+
+def rank_summary(draws, states, years, level=0.95, ascending=False):
+    """
+    Résume l'incertitude sur les classements : rang médian et intervalle de rang.
+
+    Args:
+        draws : numpy.ndarray
+            Tableau (réplications x États x années) des tirages de l'indicateur.
+        states : list
+            Codes FIPS des États, dans l'ordre du deuxième axe de `draws`.
+        years : list
+            Années, dans l'ordre du troisième axe de `draws`.
+        level : float
+            Niveau de l'intervalle de rang (0.95 par défaut).
+        ascending : bool
+            Si False (par défaut), le score le plus élevé reçoit le rang 1.
+
+    Returns:
+        pandas.DataFrame
+            DataFrame au format long (une ligne par État et par année) contenant :
+            - FIPSST, Year
+            - median_rank : rang médian
+            - rank_low, rank_high : bornes de l'intervalle de rang
+            - mean_rank : rang moyen
+            - prob_top10 : probabilité d'être classé parmi les 10 premiers
+    """
+    ranks = rank_draws(draws, ascending=ascending)
+    alpha = (1 - level) / 2
+    low, median, high = np.quantile(ranks, [alpha, 0.5, 1 - alpha], axis=0,
+                                    method="inverted_cdf")
+
+    n_states, n_years = ranks.shape[1:]
+    return pd.DataFrame({
+        "FIPSST": np.repeat(np.asarray(states), n_years),
+        "Year": np.tile(np.asarray([str(y) for y in years]), n_states),
+        "median_rank": median.ravel(),
+        "rank_low": low.ravel(),
+        "rank_high": high.ravel(),
+        "mean_rank": ranks.mean(axis=0).ravel(),
+        "prob_top10": (ranks <= 10).mean(axis=0).ravel(),
+    })
+
+
+def indicator_draws(df_indicator, years, prefix="indicator_global_health"):
+    """
+    Construit le tableau de tirages (1 x États x années) à partir de l'estimation
+    ponctuelle de l'indicateur, afin d'utiliser le moteur de classement sans réplications.
+
+    Args:
+        df_indicator : pandas.DataFrame
+            Indicateurs indexés par FIPSST, colonnes `<prefix>_<année>`.
+        years : list
+            Années à retenir.
+        prefix : str
+            Préfixe des colonnes de l'indicateur.
+
+    Returns:
+        numpy.ndarray
+            Tableau de dimension (1 x États x années).
+    """
+    cols = [f"{prefix}_{y}" for y in years]
+    return df_indicator[cols].to_numpy(dtype=float)[np.newaxis]
+
+
+def _tie_statistics(sorted_values):
+    """
+    Statistiques d'ex æquo par ligne, calculées sur des valeurs déjà triées.
+
+    Args:
+        sorted_values : numpy.ndarray
+            Tableau (lignes x n) trié le long du dernier axe.
+
+    Returns:
+        tuple of numpy.ndarray
+            Pour chaque ligne : somme de t(t-1)/2, de t(t-1)(t-2) et de
+            t(t-1)(2t+5) sur les groupes d'ex æquo de taille t.
+    """
+    n_rows, n = sorted_values.shape
+    starts = np.ones((n_rows, n), dtype=bool)
+    starts[:, 1:] = sorted_values[:, 1:] != sorted_values[:, :-1]
+    # identifiant global de chaque groupe d'ex æquo (toutes lignes confondues)
+    group_id = np.cumsum(starts.ravel()) - 1
+    sizes = np.bincount(group_id).astype(float)
+    group_row = np.repeat(np.arange(n_rows), starts.sum(axis=1))
+    return (np.bincount(group_row, sizes * (sizes - 1) / 2, minlength=n_rows),
+            np.bincount(group_row, sizes * (sizes - 1) * (sizes - 2), minlength=n_rows),
+            np.bincount(group_row, sizes * (sizes - 1) * (2 * sizes + 5), minlength=n_rows))
+
+
+def _discordant_pairs(y_dense):
+    """
+    Compte les inversions strictes de chaque ligne (algorithme de Knight).
+
+    Les lignes doivent être ordonnées selon la première variable ; le décompte
+    est fait en O(n log n) par un arbre de Fenwick, vectorisé sur les lignes.
+
+    Args:
+        y_dense : numpy.ndarray
+            Rangs denses (0 à n-1) de la seconde variable, dimension (lignes x n).
+
+    Returns:
+        numpy.ndarray
+            Nombre de paires discordantes pour chaque ligne.
+    """
+    n_rows, n = y_dense.shape
+    tree = np.zeros((n_rows, n + 1), dtype=np.int64)
+    rows = np.arange(n_rows)
+    discordant = np.zeros(n_rows, dtype=np.int64)
+
+    for j in range(n):
+        # nombre d'éléments déjà vus de rang <= y_j
+        seen = np.zeros(n_rows, dtype=np.int64)
+        i = y_dense[:, j] + 1
+        while (i > 0).any():
+            active = i > 0
+            seen[active] += tree[rows[active], i[active]]
+            i = np.where(active, i - (i & -i), 0)
+        discordant += j - seen
+
+        i = y_dense[:, j] + 1
+        while (i <= n).any():
+            active = i <= n
+            tree[rows[active], i[active]] += 1
+            i = np.where(active, i + (i & -i), n + 1)
+    return discordant
+
+
+def _omit_missing(func, x, y, n_out=2):
+    """
+    Applique une mesure d'accord calculée par lot (`func(x, y)` sur des lignes de même
+    longueur, renvoyant `n_out` tableaux) en écartant, pour chaque couple de lignes,
+    les États dont l'un des deux scores manque. Les lignes complètes sont traitées en
+    un seul lot, les autres une à une.
+
+    Returns:
+        tuple of numpy.ndarray de dimension (...), NaN s'il reste moins de deux États
+    """
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    batch_shape, n = x.shape[:-1], x.shape[-1]
+    x = x.reshape(-1, n)
+    y = y.reshape(-1, n)
+    missing = np.isnan(x) | np.isnan(y)
+    incomplete = missing.any(axis=1)
+
+    results = [np.full(len(x), np.nan) for _ in range(n_out)]
+    complete = np.flatnonzero(~incomplete)
+    batches = [(complete, x[complete], y[complete])] if len(complete) else []
+    for row in np.flatnonzero(incomplete):
+        keep = ~missing[row]
+        if keep.sum() >= 2:
+            batches.append(([row], x[row, keep][np.newaxis], y[row, keep][np.newaxis]))
+    for rows, x_rows, y_rows in batches:
+        for out, value in zip(results, func(x_rows, y_rows)):
+            out[rows] = np.asarray(value).reshape(-1)
+    return tuple(out.reshape(batch_shape) for out in results)
+
+
+def kendall_tau_b(x, y):
+    """
+    Tau-b de Kendall et p-value (approximation normale avec correction des
+    ex æquo, comme `scipy.stats.kendalltau(method="asymptotic")`) pour un lot
+    de couples de classements.
+
+    Args:
+        x, y : numpy.ndarray
+            Scores de dimension (..., n) ; le calcul est fait indépendamment pour
+            chaque ligne, ce qui permet de traiter des matrices de réplications.
+            Les États dont l'un des deux scores manque sont écartés, couple par
+            couple (comme `nan_policy="omit"` de scipy).
+
+    Returns:
+        tuple of numpy.ndarray
+            tau-b et p-value bilatérale, de dimension (...).
+    """
+    return _omit_missing(_kendall_tau_b, x, y)
+
+
+def _kendall_tau_b(x, y):
+    # lignes de même longueur, sans valeur manquante
+    from scipy.stats import norm, rankdata
+
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    batch_shape, n = x.shape[:-1], x.shape[-1]
+    x = x.reshape(-1, n)
+    y = y.reshape(-1, n)
+
+    # tri lexicographique (x, y) : deux argsort stables successifs
+    order = np.argsort(y, axis=1, kind="stable")
+    order = np.take_along_axis(order, np.argsort(np.take_along_axis(x, order, axis=1),
+                                                 axis=1, kind="stable"), axis=1)
+    x_sorted = np.take_along_axis(x, order, axis=1)
+    y_sorted = np.take_along_axis(y, order, axis=1)
+
+    y_dense = rankdata(y_sorted, method="dense", axis=1).astype(np.int64) - 1
+    discordant = _discordant_pairs(y_dense)
+
+    # ex æquo joints : couples (x, y) identiques consécutifs après le tri
+    joint = rankdata(x_sorted, method="dense", axis=1) * (n + 1) + y_dense
+    joint_ties, _, _ = _tie_statistics(joint)
+
+    x_ties, x0, x1 = _tie_statistics(x_sorted)
+    y_ties, y0, y1 = _tie_statistics(np.sort(y, axis=1))
+
+    total = n * (n - 1) / 2
+    con_minus_dis = total - x_ties - y_ties + joint_ties - 2 * discordant
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tau = con_minus_dis / np.sqrt(total - x_ties) / np.sqrt(total - y_ties)
+        m = n * (n - 1.)
+        var = ((m * (2 * n + 5) - x1 - y1) / 18
+               + (2 * x_ties * y_ties) / m + x0 * y0 / (9 * m * (n - 2)))
+        pvalue = 2 * norm.sf(np.abs(con_minus_dis) / np.sqrt(var))
+    return tau.reshape(batch_shape), pvalue.reshape(batch_shape)
+
+
+def spearman_rho(x, y):
+    """
+    Coefficient de Spearman et p-value (loi de Student à n-2 degrés de liberté)
+    pour un lot de couples de classements.
+
+    Args:
+        x, y : numpy.ndarray
+            Scores de dimension (..., n).
+            Les États dont l'un des deux scores manque sont écartés, couple par
+            couple (comme `nan_policy="omit"` de scipy).
+
+    Returns:
+        tuple of numpy.ndarray
+            rho et p-value bilatérale, de dimension (...).
+    """
+    return _omit_missing(_spearman_rho, x, y)
+
+
+def _spearman_rho(x, y):
+    from scipy.stats import rankdata, t as student
+
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    n = x.shape[-1]
+    rx = rankdata(x, axis=-1)
+    ry = rankdata(y, axis=-1)
+    rx = rx - rx.mean(axis=-1, keepdims=True)
+    ry = ry - ry.mean(axis=-1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rho = (rx * ry).sum(axis=-1) / np.sqrt((rx ** 2).sum(axis=-1) * (ry ** 2).sum(axis=-1))
+        t_stat = rho * np.sqrt((n - 2) / ((1 - rho) * (1 + rho)))
+    pvalue = 2 * student.sf(np.abs(t_stat), n - 2)
+    return rho, pvalue
+
+
+def top_k_overlap(x, y, k=10):
+    """
+    Part des k meilleurs États (scores les plus élevés) communs aux deux classements.
+
+    Args:
+        x, y : numpy.ndarray
+            Scores de dimension (..., n).
+            Les États dont l'un des deux scores manque sont écartés, couple par
+            couple (comme `nan_policy="omit"` de scipy).
+        k : int
+            Taille du sommet de classement comparé.
+
+    Returns:
+        numpy.ndarray
+            Proportion de recouvrement dans [0, 1], de dimension (...).
+    """
+    overlap, = _omit_missing(lambda a, b: (_top_k_overlap(a, b, k),), x, y, n_out=1)
+    return overlap
+
+
+def _top_k_overlap(x, y, k):
+    from scipy.stats import rankdata
+
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    ranks_x = rankdata(-x, method="ordinal", axis=-1)
+    ranks_y = rankdata(-y, method="ordinal", axis=-1)
+    return ((ranks_x <= k) & (ranks_y <= k)).sum(axis=-1) / k
+
+
+def pairwise_agreement(df, pairs=None, k=10):
+    """
+    Mesure, en une seule passe, l'accord entre des couples de colonnes d'indicateurs :
+    tau-b de Kendall, rho de Spearman (avec leurs p-values) et recouvrement du top-k.
+
+    Args:
+        df : pandas.DataFrame
+            Indicateurs par État (une ligne par État, une colonne par indicateur).
+        pairs : list of tuple, optionnel
+            Couples de colonnes à comparer. Par défaut, tous les couples de colonnes.
+        k : int
+            Taille du sommet de classement utilisé pour le recouvrement.
+
+    Returns:
+        pandas.DataFrame
+            Une ligne par couple : column_a, column_b, kendall_tau, kendall_p_value,
+            spearman_rho, spearman_p_value, top_k_overlap.
+    """
+    if pairs is None:
+        columns = list(df.columns)
+        pairs = [(a, b) for i, a in enumerate(columns) for b in columns[i + 1:]]
+
+    values = df.to_numpy(dtype=float).T
+    position = {col: i for i, col in enumerate(df.columns)}
+    x = values[[position[a] for a, _ in pairs]]
+    y = values[[position[b] for _, b in pairs]]
+
+    tau, tau_p = kendall_tau_b(x, y)
+    rho, rho_p = spearman_rho(x, y)
+
+    return pd.DataFrame({
+        "column_a": [a for a, _ in pairs],
+        "column_b": [b for _, b in pairs],
+        "kendall_tau": tau,
+        "kendall_p_value": tau_p,
+        "spearman_rho": rho,
+        "spearman_p_value": rho_p,
+        "top_k_overlap": top_k_overlap(x, y, k=k),
+    })
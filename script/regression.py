@@ -0,0 +1,249 @@
+"""
+Régressions linéaires pondérées (poids d'enquête FWC) par groupe : une régression par
+(année, État) et par variable expliquée, toutes estimées ensemble.
+
+Pour chaque année, les lignes sont triées une fois par groupe ; les produits croisés
+pondérés X'WX et X'Wy de tous les groupes sont calculés en un passage (un produit
+matriciel par segment contigu), puis tous les systèmes sont résolus en lot
+(pseudo-inverse sur le tableau (groupes x p x p)). Les écarts-types robustes
+(HC0, HC1) ou classiques sont calculés de la même façon sur les résidus.
+
+Les estimations sont celles de `statsmodels.WLS(y, X, weights=FWC).fit(cov_type=...)`
+(`regressions_statsmodels`, boucle de référence utilisée par le benchmark).
+
+Exemple :
+    conditions = ["K2Q40A", "K2Q42A", "K2Q43B", "K2Q61A", "BLINDNESS", "BLOOD"]
+    weighted_regressions(dfs_final, ["K2Q01", "K2Q01_D"], conditions)
+    weighted_regressions(dfs_final, ["K2Q01"], conditions, by=[])   # modèle national
+"""
+import numpy as np
+import pandas as pd
+
+# scipy.stats est importé dans les fonctions qui l'utilisent (import coûteux).
+
+RESULT_COLUMNS = ["outcome", "variable", "coefficient", "std_error", "t_value", "p_value",
+                  "n_obs", "r_squared"]
+COVARIANCES = ("HC1", "HC0", "nonrobust")
+
+
+def _column(dfs, year, name):
+    # dictionnaire de DataFrames ou stockage colonne (script.survey)
+    if hasattr(dfs, "column"):
+        return dfs.column(year, name)
+    return dfs[year][name].to_numpy()
+
+
+def _sorted_design(dfs, year, outcomes, regressors, by, weight, add_constant):
+    """
+    Lignes complètes d'une année triées par groupe.
+
+    Returns:
+        tuple : (X, Y, w, bornes des segments, clés des groupes)
+    """
+    columns = {name: _column(dfs, year, name).astype(float, copy=False)
+               for name in dict.fromkeys(regressors + outcomes + [weight])}
+    complete = np.ones(len(columns[weight]), dtype=bool)
+    for values in columns.values():
+        complete &= np.isfinite(values)
+
+    if len(by) == 1:
+        code, keys = pd.factorize(_column(dfs, year, by[0]), sort=True)
+        keys = pd.MultiIndex.from_arrays([keys], names=by)
+    elif by:
+        code, keys = pd.MultiIndex.from_arrays(
+            [_column(dfs, year, name) for name in by]).factorize(sort=True)
+    else:
+        code, keys = np.zeros(len(complete), dtype=np.int64), None
+    # un seul tri : chaque groupe devient un segment contigu
+    rows = np.flatnonzero(complete)
+    rows = rows[np.argsort(code[rows], kind="stable")]
+    code = code[rows]
+    present = np.unique(code)
+    bounds = np.append(np.searchsorted(code, present), len(code))
+
+    design = [np.ones(len(rows))] if add_constant else []
+    X = np.column_stack(design + [columns[name][rows] for name in regressors])
+    Y = np.column_stack([columns[name][rows] for name in outcomes])
+    keys = None if keys is None else keys[present]
+    return X, Y, columns[weight][rows], bounds, keys
+
+
+def fit_groups(X, Y, w, bounds, cov="HC1", add_constant=True):
+    """
+    Estime les régressions pondérées de tous les groupes (segments contigus de lignes).
+
+    Args:
+        X (numpy.ndarray) : régresseurs (n x p), lignes triées par groupe
+        Y (numpy.ndarray) : variables expliquées (n x q)
+        w (numpy.ndarray) : poids (n)
+        bounds (numpy.ndarray) : bornes des segments (G + 1)
+        cov (str) : "HC1" (par défaut), "HC0" ou "nonrobust"
+        add_constant (bool) : X contient la constante ; sinon le R² est non centré,
+            comme dans statsmodels
+
+    Returns:
+        dict : "params" et "bse" (G x q x p), "nobs", "rank" (G), "r_squared" (G x q)
+    """
+    if cov not in COVARIANCES:
+        raise ValueError(f"cov doit valoir {', '.join(COVARIANCES)} : {cov!r}")
+    n_groups, p, q = len(bounds) - 1, X.shape[1], Y.shape[1]
+    segments = [slice(bounds[k], bounds[k + 1]) for k in range(n_groups)]
+
+    # passage 1 : produits croisés pondérés de chaque groupe
+    xtwx = np.empty((n_groups, p, p))
+    xtwy = np.empty((n_groups, p, q))
+    for k, rows in enumerate(segments):
+        wx = X[rows] * w[rows, None]
+        xtwx[k] = X[rows].T @ wx
+        xtwy[k] = wx.T @ Y[rows]
+
+    # résolution en lot ; la pseudo-inverse tolère les groupes où une variable est constante
+    bread = np.linalg.pinv(xtwx, hermitian=True)
+    params = bread @ xtwy                                   # (G, p, q)
+    nobs = np.diff(bounds)
+    rank = np.linalg.matrix_rank(xtwx, hermitian=True)
+    df_resid = nobs - rank
+
+    # passage 2 : résidus, sommes de carrés et matrice « viande » des covariances robustes
+    meat = np.zeros((n_groups, q, p, p))
+    ssr = np.empty((n_groups, q))
+    sst = np.empty((n_groups, q))
+    for k, rows in enumerate(segments):
+        x, y, wk = X[rows], Y[rows], w[rows]
+        resid = y - x @ params[k]
+        ssr[k] = wk @ resid ** 2
+        if add_constant:
+            y = y - (wk @ y) / wk.sum()
+        sst[k] = wk @ y ** 2
+        if cov != "nonrobust":
+            for j in range(q):
+                score = x * (wk * resid[:, j])[:, None]
+                meat[k, j] = score.T @ score
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if cov == "nonrobust":
+            scale = np.where(df_resid[:, None] > 0, ssr / df_resid[:, None], np.nan)
+            covariance = scale[:, :, None, None] * bread[:, None]
+        else:
+            covariance = bread[:, None] @ meat @ bread[:, None]
+            if cov == "HC1":
+                correction = np.where(df_resid > 0, nobs / df_resid, np.nan)
+                covariance *= correction[:, None, None, None]
+        bse = np.sqrt(np.diagonal(covariance, axis1=2, axis2=3))
+        r_squared = 1 - ssr / sst
+
+    return {"params": params.transpose(0, 2, 1), "bse": bse, "nobs": nobs, "rank": rank,
+            "df_resid": df_resid, "r_squared": r_squared}
+
+
+def _tidy(fit, year, keys, by, outcomes, names, cov):
+    # une ligne par (groupe, variable expliquée, régresseur)
+    from scipy import stats
+
+    n_groups, q, p = fit["params"].shape
+    coefficient = fit["params"].ravel()
+    std_error = fit["bse"].ravel()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_value = coefficient / std_error
+    if cov == "nonrobust":
+        df = np.repeat(fit["df_resid"], q * p)
+        p_value = 2 * stats.t.sf(np.abs(t_value), np.where(df > 0, df, np.nan))
+    else:
+        # comme statsmodels : loi normale pour les covariances robustes
+        p_value = 2 * stats.norm.sf(np.abs(t_value))
+
+    table = pd.DataFrame({
+        "year": year,
+        "outcome": np.tile(np.repeat(outcomes, p), n_groups),
+        "variable": np.tile(names, n_groups * q),
+        "coefficient": coefficient,
+        "std_error": std_error,
+        "t_value": t_value,
+        "p_value": p_value,
+        "n_obs": np.repeat(fit["nobs"], q * p),
+        "r_squared": np.repeat(fit["r_squared"].ravel(), p),
+    })
+    for level, name in enumerate(by):
+        values = keys.get_level_values(level)
+        table.insert(1 + level, name, np.repeat(
+            values.astype(int) if name == "FIPSST" else values, q * p))
+    return table
+
+
+def weighted_regressions(dfs, outcomes, regressors, years=None, by=("FIPSST",),
+                         weight="FWC", cov="HC1", add_constant=True):
+    """
+    Régressions linéaires pondérées de chaque variable expliquée sur les mêmes
+    régresseurs, pour chaque année et chaque groupe (par défaut chaque État).
+
+    Les lignes retenues sont celles où les régresseurs, toutes les variables
+    expliquées et le poids sont renseignés.
+
+    Args:
+        dfs : dictionnaire des dataset NSCH, ou stockage colonne (`script.survey`)
+        outcomes (list) : variables expliquées
+        regressors (list) : régresseurs
+        years (list) : années (par défaut toutes)
+        by (list) : colonnes définissant les groupes ; vide : un modèle par année
+        weight (str) : colonne des poids d'enquête
+        cov (str) : covariance des estimateurs : "HC1" (par défaut), "HC0" ou "nonrobust"
+        add_constant (bool) : ajoute la constante ("const")
+
+    Returns:
+        pandas.DataFrame : une ligne par (année, groupe, variable expliquée, régresseur),
+            colonnes year, <by>, `RESULT_COLUMNS`
+    """
+    outcomes, regressors, by = list(outcomes), list(regressors), list(by or [])
+    years = list(years or (dfs.years if hasattr(dfs, "years") else dfs))
+    names = (["const"] if add_constant else []) + regressors
+
+    tables = []
+    for year in years:
+        X, Y, w, bounds, keys = _sorted_design(dfs, year, outcomes, regressors, by, weight,
+                                               add_constant)
+        fit = fit_groups(X, Y, w, bounds, cov, add_constant)
+        tables.append(_tidy(fit, year, keys, by, outcomes, names, cov))
+    return pd.concat(tables, ignore_index=True)
+
+
+def regressions_statsmodels(dfs, outcomes, regressors, years=None, by=("FIPSST",),
+                            weight="FWC", cov="HC1", add_constant=True):
+    """
+    Référence de `weighted_regressions` : un `statsmodels.WLS` par (année, groupe,
+    variable expliquée), sur les mêmes lignes. Même sortie.
+    """
+    import statsmodels.api as sm
+
+    outcomes, regressors, by = list(outcomes), list(regressors), list(by or [])
+    years = list(years or (dfs.years if hasattr(dfs, "years") else dfs))
+
+    tables = []
+    for year in years:
+        df = pd.DataFrame({name: _column(dfs, year, name)
+                           for name in dict.fromkeys(by + regressors + outcomes + [weight])})
+        df = df.dropna(subset=regressors + outcomes + [weight])
+        groups = df.groupby(by, sort=True) if by else [((), df)]
+        for key, group in groups:
+            X = group[regressors].astype(float)
+            if add_constant:
+                X = sm.add_constant(X, has_constant="add")
+            for outcome in outcomes:
+                res = sm.WLS(group[outcome].astype(float), X,
+                             weights=group[weight].astype(float)).fit(cov_type=cov)
+                table = pd.DataFrame({
+                    "year": year,
+                    "outcome": outcome,
+                    "variable": res.params.index,
+                    "coefficient": res.params.to_numpy(),
+                    "std_error": res.bse.to_numpy(),
+                    "t_value": res.tvalues.to_numpy(),
+                    "p_value": res.pvalues.to_numpy(),
+                    "n_obs": int(res.nobs),
+                    "r_squared": res.rsquared,
+                })
+                key = key if isinstance(key, tuple) else (key,)
+                for level, name in enumerate(by):
+                    table.insert(1 + level, name, int(key[level]) if name == "FIPSST"
+                                 else key[level])
+                tables.append(table)
+    return pd.concat(tables, ignore_index=True)
@@ -0,0 +1,179 @@
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from script.model import THEMES
+from script.ranking import kendall_tau_b, rank_draws
+
+RULES = ("arithmetic", "geometric", "min")
+
+
+def sub_indicator_array(df_indicator, years, themes=THEMES):
+    """
+    Extrait les sous-indicateurs sous forme d'un tableau (États x années x thèmes).
+
+    Args:
+        df_indicator : pandas.DataFrame
+            Indicateurs indexés par FIPSST, colonnes `sub_indicator_<thème>_<année>`
+            (sortie de `model.global_health_over_years`).
+        years : list
+            Années à retenir.
+        themes : tuple
+            Thèmes à retenir, dans l'ordre des poids.
+
+    Returns:
+        numpy.ndarray
+            Tableau de dimension (États x années x thèmes).
+    """
+    cols = [f"sub_indicator_{theme}_{year}" for year in years for theme in themes]
+    values = df_indicator[cols].to_numpy(dtype=float)
+    return values.reshape(len(df_indicator), len(years), len(themes))
+
+
+def weight_grid(n_themes=len(THEMES), step=0.1):
+    """
+    Grille régulière de vecteurs de poids sur le simplexe (poids positifs de somme 1).
+
+    Args:
+        n_themes : int
+            Nombre de thèmes.
+        step : float
+            Pas de la grille.
+
+    Returns:
+        numpy.ndarray
+            Tableau (configurations x thèmes).
+    """
+    n_steps = int(round(1 / step))
+    grid = [w for w in product(range(n_steps + 1), repeat=n_themes - 1)
+            if sum(w) <= n_steps]
+    grid = np.array([list(w) + [n_steps - sum(w)] for w in grid], dtype=float)
+    return grid / n_steps
+
+
+def random_weights(n_configs, n_themes=len(THEMES), seed=None):
+    """
+    Échantillon aléatoire uniforme de vecteurs de poids sur le simplexe (loi de Dirichlet).
+
+    Args:
+        n_configs : int
+            Nombre de configurations à tirer.
+        n_themes : int
+            Nombre de thèmes.
+        seed : int, optionnel
+            Graine du générateur aléatoire.
+
+    Returns:
+        numpy.ndarray
+            Tableau (configurations x thèmes).
+    """
+    rng = np.random.default_rng(seed)
+    return rng.dirichlet(np.ones(n_themes), size=n_configs)
+
+
+def aggregate(sub_indicators, weights, rule="geometric"):
+    """
+    Agrège les sous-indicateurs pour toutes les configurations de poids à la fois.
+
+    Args:
+        sub_indicators : numpy.ndarray
+            Tableau (États x années x thèmes), valeurs dans [0, 1].
+        weights : numpy.ndarray
+            Tableau (configurations x thèmes) ; chaque ligne est normalisée à 1.
+        rule : str
+            "arithmetic" (moyenne pondérée), "geometric" (moyenne géométrique
+            pondérée, règle de l'indicateur global) ou "min" (minimum des thèmes
+            de poids non nul).
+
+    Returns:
+        numpy.ndarray
+            Indicateurs agrégés de dimension (configurations x États x années).
+    """
+    weights = np.atleast_2d(np.asarray(weights, dtype=float))
+    weights = weights / weights.sum(axis=1, keepdims=True)
+
+    if rule == "arithmetic":
+        return np.einsum("syt,ct->csy", sub_indicators, weights)
+    if rule == "geometric":
+        with np.errstate(divide="ignore"):
+            log_sub = np.log(sub_indicators)
+        # un poids nul neutralise le thème, même si le sous-indicateur vaut 0
+        log_sub = np.where(np.isneginf(log_sub), -1e300, log_sub)
+        return np.exp(np.einsum("syt,ct->csy", log_sub, weights))
+    if rule == "min":
+        active = weights[:, np.newaxis, np.newaxis, :] > 0
+        return np.where(active, sub_indicators[np.newaxis], np.inf).min(axis=-1)
+    raise ValueError(f"Règle d'agrégation inconnue : {rule}")
+
+
+def sensitivity_analysis(df_indicator, years, weights, rules=RULES, reference=None,
+                         themes=THEMES):
+    """
+    Évalue la sensibilité des classements aux poids et à la règle d'agrégation.
+
+    Toutes les configurations (poids x règles) sont évaluées simultanément par des
+    opérations sur tableaux. Chaque configuration est comparée au classement de
+    référence de l'indicateur global (moyenne géométrique non pondérée) et,
+    si `reference` est fourni, à l'indicateur d'America's Health Rankings.
+
+    Args:
+        df_indicator : pandas.DataFrame
+            Indicateurs indexés par FIPSST (sortie de `model.global_health_over_years`).
+        years : list
+            Années à analyser.
+        weights : numpy.ndarray
+            Vecteurs de poids (configurations x thèmes), par exemple issus de
+            `weight_grid` ou `random_weights`.
+        rules : tuple
+            Règles d'agrégation à évaluer.
+        reference : pandas.Series, optionnel
+            Indicateur externe indexé par FIPSST (par exemple `model.ahr_indicator`).
+        themes : tuple
+            Thèmes, dans l'ordre des colonnes de `weights`.
+
+    Returns:
+        tuple
+            - pandas.DataFrame : une ligne par (configuration, règle, année) avec les poids,
+              le décalage de rang moyen et maximal par rapport au classement de référence,
+              le tau de Kendall avec ce classement et, le cas échéant, le tau et la p-value
+              avec l'indicateur externe.
+            - numpy.ndarray : décalages de rang (configurations x États x années), dans
+              l'ordre des lignes du DataFrame (règle puis configuration).
+    """
+    weights = np.atleast_2d(np.asarray(weights, dtype=float))
+    if reference is not None:
+        states = df_indicator.index.intersection(reference.index)
+        df_indicator = df_indicator.loc[states]
+        reference = reference.loc[states].to_numpy(dtype=float)
+
+    sub = sub_indicator_array(df_indicator, years, themes)
+    baseline = aggregate(sub, np.ones((1, len(themes))), "geometric")[0]
+    baseline_ranks = rank_draws(baseline[np.newaxis])[0]
+
+    scores = np.concatenate([aggregate(sub, weights, rule) for rule in rules])
+    ranks = rank_draws(scores)
+    shifts = ranks - baseline_ranks[np.newaxis]
+
+    # tau de Kendall : dernier axe = États
+    scores_t = scores.transpose(0, 2, 1)
+    tau_baseline, _ = kendall_tau_b(scores_t, baseline.T[np.newaxis])
+
+    n_configs, n_years = len(weights), len(years)
+    summary = pd.DataFrame({
+        "config": np.tile(np.repeat(np.arange(n_configs), n_years), len(rules)),
+        "rule": np.repeat(list(rules), n_configs * n_years),
+        "Year": np.tile([str(y) for y in years], n_configs * len(rules)),
+    })
+    for i, theme in enumerate(themes):
+        summary[f"weight_{theme}"] = np.tile(np.repeat(weights[:, i], n_years), len(rules))
+    summary["mean_abs_rank_shift"] = np.abs(shifts).mean(axis=1).ravel()
+    summary["max_abs_rank_shift"] = np.abs(shifts).max(axis=1).ravel()
+    summary["tau_baseline"] = tau_baseline.ravel()
+
+    if reference is not None:
+        tau_ref, p_ref = kendall_tau_b(scores_t, reference)
+        summary["tau_reference"] = tau_ref.ravel()
+        summary["p_value_reference"] = p_ref.ravel()
+
+    return summary, shifts
@@ -0,0 +1,270 @@
+"""
+Service HTTP local (asyncio) exposant les indicateurs précalculés.
+
+Routes :
+- /indicators?theme=...&years=...&states=... : indicateurs au format long (JSON)
+- /states/<FIPSST> : tous les indicateurs d'un État (JSON)
+- /geojson : contours simplifiés des États (GeoJSON)
+- /map/<année> : carte choroplèthe Folium de l'indicateur global (HTML)
+
+Les réponses sont conservées dans un cache LRU en mémoire et servies avec un ETag :
+une requête portant `If-None-Match` identique reçoit une réponse 304 sans corps.
+
+Exemple :
+    python -m script.server --store results/indicators \
+        --shapefile data/map/cb_2024_us_state_20m.shp
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+
+from script.states import StateCrosswalk
+from script.store import IndicatorStore
+
+STATUS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+          405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class BadRequest(ValueError):
+    """
+    Paramètres de requête invalides (réponse 400).
+    """
+
+
+def records_json(df):
+    """
+    Sérialise un DataFrame en liste d'objets JSON ; les valeurs manquantes
+    (sous-indicateur non calculé pour un État, ...) deviennent `null`.
+
+    Returns:
+        bytes
+    """
+    records = df.astype(object).where(df.notna(), None).to_dict(orient="records")
+    return json.dumps(records, allow_nan=False).encode()
+
+
+class ResponseCache:
+    """
+    Cache LRU des réponses (corps, type de contenu, ETag), indexé par l'URL demandée.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, body, content_type):
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.entries[key] = (body, content_type, etag)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return self.entries[key]
+
+
+class IndicatorServer:
+    """
+    Serveur des indicateurs : les données (stock d'indicateurs, contours des États)
+    sont chargées une seule fois au démarrage puis partagées par toutes les requêtes.
+
+    Args:
+        store : IndicatorStore
+            Stock d'indicateurs (voir `script.store`).
+        gdf : geopandas.GeoDataFrame, optionnel
+            Contours des États (shapefile du Census), avec les colonnes STATEFP et NAME.
+        tolerance : float
+            Tolérance de simplification des polygones (en degrés).
+        cache_size : int
+            Nombre de réponses conservées dans le cache LRU.
+    """
+
+    def __init__(self, store, gdf=None, tolerance=0.01, cache_size=256):
+        self.store = store
+        self.cache = ResponseCache(cache_size)
+        # rendus en cours : des requêtes simultanées sur la même URL partagent un seul rendu
+        self.pending = {}
+        self.df_geo = None
+        self.crosswalk = None
+        self.geojson = None
+        if gdf is not None:
+            gdf = gdf.to_crs(epsg=4326)
+            gdf["geometry"] = gdf.geometry.simplify(tolerance, preserve_topology=True)
+            # colonnes attendues par analyse_data.map_united_states
+            self.df_geo = gdf.assign(FIPSST=gdf["STATEFP"].astype(int), GeoName=gdf["NAME"])
+            self.crosswalk = StateCrosswalk.from_frame(self.df_geo)
+            self.geojson = gdf[["STATEFP", "STUSPS", "NAME", "geometry"]].to_json().encode()
+
+    # ---------------------------
+    # Construction des réponses
+    # ---------------------------
+
+    def _indicators(self, query):
+        def values(name):
+            raw = query.get(name)
+            return None if raw is None else [v for item in raw for v in item.split(",") if v]
+
+        states = values("states")
+        invalid = [s for s in states or [] if not s.isdigit()]
+        if invalid:
+            raise BadRequest(f"codes FIPS invalides : {', '.join(invalid)}")
+        df = self.store.get(theme=values("theme"), years=values("years"), states=states)
+        return records_json(df), "application/json"
+
+    def _state(self, fips):
+        df = self.store.get(states=[int(fips)])
+        if df.empty:
+            return None
+        return records_json(df), "application/json"
+
+    def _map(self, year):
+        from script.analyse_data import map_united_states
+
+        df_indicator = self.store.get(theme="global", years=[year], wide=True)
+        if df_indicator.empty or self.df_geo is None:
+            return None
+        m = map_united_states(df_indicator, self.df_geo, year, self.crosswalk)
+        return m.get_root().render().encode(), "text/html; charset=utf-8"
+
+    def render(self, path, query):
+        """
+        Construit la réponse d'une route (sans passer par le cache).
+
+        Returns:
+            tuple (corps, type de contenu), ou None si la ressource n'existe pas ;
+            lève BadRequest si les paramètres de la requête sont invalides
+        """
+        parts = [p for p in path.split("/") if p]
+        if parts == ["indicators"]:
+            return self._indicators(query)
+        if len(parts) == 2 and parts[0] == "states" and parts[1].isdigit():
+            return self._state(parts[1])
+        if parts == ["geojson"] and self.geojson is not None:
+            return self.geojson, "application/geo+json"
+        if len(parts) == 2 and parts[0] == "map" and parts[1].isdigit():
+            return self._map(parts[1])
+        return None
+
+    async def respond(self, target, headers):
+        """
+        Réponse à une requête GET : (statut, en-têtes, corps).
+        """
+        entry = self.cache.get(target)
+        if entry is None:
+            if target not in self.pending:
+                url = urlsplit(target)
+                # rendu bloquant (lecture parquet, carte Folium) : exécuté hors de la boucle
+                self.pending[target] = asyncio.ensure_future(
+                    asyncio.to_thread(self.render, url.path, parse_qs(url.query)))
+            task = self.pending[target]
+            try:
+                result = await asyncio.shield(task)
+            except BadRequest as error:
+                # réponse d'erreur jamais mise en cache
+                return 400, {"Content-Type": "text/plain; charset=utf-8"}, str(error).encode()
+            finally:
+                if task.done():
+                    self.pending.pop(target, None)
+            if result is None:
+                return 404, {"Content-Type": "text/plain"}, b"Not Found"
+            entry = self.cache.get(target) or self.cache.put(target, *result)
+
+        body, content_type, etag = entry
+        response_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if headers.get("if-none-match") == etag:
+            return 304, response_headers, b""
+        response_headers["Content-Type"] = content_type
+        return 200, response_headers, body
+
+    # ---------------------------
+    # Protocole HTTP/1.1 minimal (keep-alive)
+    # ---------------------------
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin1").split()
+                except ValueError:
+                    await self._send(writer, 400, {}, b"Bad Request", False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = (version == "HTTP/1.1"
+                              and headers.get("connection", "").lower() != "close")
+                if method not in ("GET", "HEAD"):
+                    await self._send(writer, 405, {}, b"Method Not Allowed", keep_alive)
+                else:
+                    try:
+                        status, response_headers, body = await self.respond(target, headers)
+                    except Exception as error:  # la connexion ne doit pas tomber
+                        status, response_headers, body = 500, {}, str(error).encode()
+                    if method == "HEAD":
+                        response_headers["Content-Length"] = str(len(body))
+                        body = b""
+                    await self._send(writer, status, response_headers, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _send(writer, status, headers, body, keep_alive):
+        headers.setdefault("Content-Length", str(len(body)))
+        headers["Connection"] = "keep-alive" if keep_alive else "close"
+        head = f"HTTP/1.1 {status} {STATUS[status]}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode("latin1") + b"\r\n" + body)
+        await writer.drain()
+
+    async def serve(self, host="127.0.0.1", port=8000):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Service local des indicateurs de santé")
+    parser.add_argument("--store", required=True, help="dossier du stock d'indicateurs")
+    parser.add_argument("--shapefile", help="shapefile des États (cb_2024_us_state_20m.shp)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--cache-size", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    gdf = None
+    if args.shapefile:
+        import geopandas as gpd
+        gdf = gpd.read_file(args.shapefile)
+
+    server = IndicatorServer(IndicatorStore(args.store), gdf, cache_size=args.cache_size)
+    print(f"Service disponible sur http://{args.host}:{args.port}")
+    asyncio.run(server.serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
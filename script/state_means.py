@@ -0,0 +1,171 @@
+"""
+Matrice des moyennes pondérées par (année, État) de chaque variable candidate, orientées
+comme dans `model.scale_transformation` (valeur élevée = meilleure situation).
+
+Un sous-indicateur thématique n'est que la moyenne de ces colonnes, normalisée par la
+moyenne des bornes de chaque variable : un thème se définit donc comme un sous-ensemble
+de colonnes, évalué sans relire les bases. `StateMeans.evaluate` calcule d'un seul
+produit matriciel des centaines de compositions alternatives.
+
+Exemple :
+    means = build_state_means(cube, config["variables"])
+    means.evaluate({"health": config["variables"]["health_bin_vars"],
+                    "health_sans_dents": ["K2Q40A", "K2Q42A", "BLOOD"]})
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# thème -> (thème de `scale_transformation`, listes de la configuration) ; la partie NSCH
+# du sous-indicateur eco s'appelle micro_eco : l'ACP macro-économique n'est pas ici
+THEME_KEYS = {
+    "mental": ("mental_health", "mental_category_vars", "mental_bin_vars"),
+    "health": ("health", "health_category_vars", "health_bin_vars"),
+    "micro_eco": ("micro_eco", "NSCH_eco_cat_vars", "NSCH_eco_bin_vars"),
+}
+
+
+def build_state_means(source, variables, years=None):
+    """
+    Calcule les moyennes orientées de toutes les variables thématiques de la
+    configuration, chacune orientée selon le thème dans lequel elle est déclarée.
+
+    Args:
+        source : cube des effectifs pondérés (`script.cube.WeightedCube`), ou
+            dictionnaire des dataset NSCH imputés (le cube est alors construit)
+        variables (dict) : section "variables" de la configuration ; une variable
+            candidate s'ajoute en la déclarant dans la liste du thème voulu
+        years (list) : années (par défaut, toutes celles de la source)
+
+    Returns:
+        StateMeans
+    """
+    from script.model import oriented_means
+
+    if not hasattr(source, "weighted_means"):
+        from script.cube import build_cube
+        from script.pipeline import theme_variables
+        source = build_cube(source, theme_variables(variables), years)
+    years = list(years or source.years)
+
+    means, minimum, maximum = {}, {}, {}
+    for year in years:
+        year_means, year_min, year_max = [], [], []
+        for theme, cat_key, bin_key in THEME_KEYS.values():
+            # une variable déclarée dans deux thèmes garde l'orientation du premier
+            seen = {var for frame in year_means for var in frame.columns}
+            cat = [var for var in variables[cat_key] if var not in seen]
+            bins = [var for var in variables[bin_key] if var not in seen]
+            if not cat + bins:
+                continue
+            frame, low, high = oriented_means(year, source, theme, cat, bins)
+            year_means.append(frame)
+            year_min.append(low)
+            year_max.append(high)
+        means[year] = pd.concat(year_means, axis=1)
+        minimum[year] = pd.concat(year_min)
+        maximum[year] = pd.concat(year_max)
+
+    return StateMeans(pd.concat(means, names=["year", "FIPSST"]),
+                      pd.DataFrame(minimum).T, pd.DataFrame(maximum).T)
+
+
+class StateMeans:
+    """
+    Moyennes orientées par (année, État) et bornes par (année, variable).
+
+    Args:
+        means (pandas.DataFrame) : index (year, FIPSST), une colonne par variable
+        minimum (pandas.DataFrame) : index year, une colonne par variable
+        maximum (pandas.DataFrame) : index year, une colonne par variable
+    """
+
+    def __init__(self, means, minimum, maximum):
+        self.years = list(means.index.get_level_values("year").unique())
+        self.variables = list(means.columns)
+        self.states = np.sort(means.index.get_level_values("FIPSST").unique().to_numpy())
+        full = pd.MultiIndex.from_product([self.years, self.states], names=["year", "FIPSST"])
+        # tableaux denses (année, État, variable) et (année, variable)
+        self._means = means.reindex(index=full, columns=self.variables).to_numpy(
+            dtype=float).reshape(len(self.years), len(self.states), len(self.variables))
+        self._minimum = minimum.reindex(index=self.years, columns=self.variables).to_numpy(float)
+        self._maximum = maximum.reindex(index=self.years, columns=self.variables).to_numpy(float)
+
+    @property
+    def means(self):
+        """
+        Moyennes orientées au format (year, FIPSST) x variables.
+        """
+        index = pd.MultiIndex.from_product([self.years, self.states], names=["year", "FIPSST"])
+        return pd.DataFrame(self._means.reshape(-1, len(self.variables)), index=index,
+                            columns=self.variables)
+
+    def bounds(self):
+        """
+        Bornes (minimum, maximum) des variables orientées, indexées par année.
+        """
+        return (pd.DataFrame(self._minimum, index=self.years, columns=self.variables),
+                pd.DataFrame(self._maximum, index=self.years, columns=self.variables))
+
+    def write(self, path):
+        """
+        Écrit la matrice et ses bornes (trois fichiers parquet) dans le dossier `path`.
+        """
+        os.makedirs(path, exist_ok=True)
+        minimum, maximum = self.bounds()
+        self.means.to_parquet(os.path.join(path, "means.parquet"))
+        minimum.rename_axis("year").to_parquet(os.path.join(path, "minimum.parquet"))
+        maximum.rename_axis("year").to_parquet(os.path.join(path, "maximum.parquet"))
+
+    @classmethod
+    def read(cls, path):
+        """
+        Lit une matrice écrite par `write`.
+        """
+        return cls(*(pd.read_parquet(os.path.join(path, f"{name}.parquet"))
+                     for name in ("means", "minimum", "maximum")))
+
+    def evaluate(self, compositions, years=None):
+        """
+        Sous-indicateurs normalisés de plusieurs compositions de thèmes, calculés
+        par un seul produit matriciel.
+
+        Args:
+            compositions (dict) : nom du thème -> liste de variables
+            years (list) : années (par défaut toutes)
+
+        Returns:
+            pandas.DataFrame
+                Indexé par FIPSST, colonnes `sub_indicator_<nom>_<année>` classées par
+                année puis par thème, comme dans `model.global_health_over_years`. Un
+                État auquel manque une variable du thème a une valeur manquante.
+        """
+        names = list(compositions)
+        empty = [name for name in names if not compositions[name]]
+        if empty:
+            raise ValueError(f"Compositions sans variable : {empty}")
+        unknown = {var for name in names for var in compositions[name]} - set(self.variables)
+        if unknown:
+            raise KeyError(f"Variables absentes de la matrice : {sorted(unknown)}")
+
+        position = {var: i for i, var in enumerate(self.variables)}
+        members = np.zeros((len(self.variables), len(names)))
+        for k, name in enumerate(names):
+            members[[position[var] for var in compositions[name]], k] = 1
+        weights = members / members.sum(axis=0)
+
+        rows = [self.years.index(year) for year in (years or self.years)]
+        means = self._means[rows]
+        # les valeurs manquantes ne doivent pas contaminer les autres thèmes (0 * NaN)
+        missing = np.isnan(means) @ members > 0
+        indicator = np.nan_to_num(means) @ weights
+        indicator[missing] = np.nan
+        low = np.nan_to_num(self._minimum[rows]) @ weights
+        high = np.nan_to_num(self._maximum[rows]) @ weights
+        indicator = (indicator - low[:, None, :]) / (high - low)[:, None, :]
+
+        # (année, État, thème) -> colonnes par année puis par thème
+        columns = [f"sub_indicator_{name}_{self.years[row]}" for row in rows for name in names]
+        values = indicator.transpose(1, 0, 2).reshape(len(self.states), -1)
+        return pd.DataFrame(values, index=pd.Index(self.states, name="FIPSST"), columns=columns)
@@ -0,0 +1,137 @@
+"""
+Table de correspondance des États : code FIPS (entier), code USPS, nom et position de
+la ligne dans la table géographique (géométrie).
+
+Les codes FIPS sont extraits une seule fois, à l'ingestion (`parse_geofips`, colonne
+FIPSST entière de `clean_data.clean_enrichment_datasets`) ; les cartes, classements
+et comparaisons (`analyse_data.map_united_states`, `analyse_data.state_rankings`,
+`model.ahr_indicator`) joignent ensuite sur cette clé entière, sans reconstruire de
+dictionnaire ni analyser de chaînes à chaque appel.
+
+Exemple :
+    states = StateCrosswalk.from_frame(df_eco_geo)
+    states.to_fips(annual_report["State"])        # codes USPS -> FIPSST
+    states.align(df_indicator["indicator_global_health_2024"])
+"""
+import numpy as np
+import pandas as pd
+
+# (code FIPS, code USPS, nom) des 50 États et du District de Columbia
+STATES = [
+    (1, "AL", "Alabama"), (2, "AK", "Alaska"), (4, "AZ", "Arizona"), (5, "AR", "Arkansas"),
+    (6, "CA", "California"), (8, "CO", "Colorado"), (9, "CT", "Connecticut"),
+    (10, "DE", "Delaware"), (11, "DC", "District of Columbia"), (12, "FL", "Florida"),
+    (13, "GA", "Georgia"), (15, "HI", "Hawaii"), (16, "ID", "Idaho"), (17, "IL", "Illinois"),
+    (18, "IN", "Indiana"), (19, "IA", "Iowa"), (20, "KS", "Kansas"), (21, "KY", "Kentucky"),
+    (22, "LA", "Louisiana"), (23, "ME", "Maine"), (24, "MD", "Maryland"),
+    (25, "MA", "Massachusetts"), (26, "MI", "Michigan"), (27, "MN", "Minnesota"),
+    (28, "MS", "Mississippi"), (29, "MO", "Missouri"), (30, "MT", "Montana"),
+    (31, "NE", "Nebraska"), (32, "NV", "Nevada"), (33, "NH", "New Hampshire"),
+    (34, "NJ", "New Jersey"), (35, "NM", "New Mexico"), (36, "NY", "New York"),
+    (37, "NC", "North Carolina"), (38, "ND", "North Dakota"), (39, "OH", "Ohio"),
+    (40, "OK", "Oklahoma"), (41, "OR", "Oregon"), (42, "PA", "Pennsylvania"),
+    (44, "RI", "Rhode Island"), (45, "SC", "South Carolina"), (46, "SD", "South Dakota"),
+    (47, "TN", "Tennessee"), (48, "TX", "Texas"), (49, "UT", "Utah"), (50, "VT", "Vermont"),
+    (51, "VA", "Virginia"), (53, "WA", "Washington"), (54, "WV", "West Virginia"),
+    (55, "WI", "Wisconsin"), (56, "WY", "Wyoming"),
+]
+
+
+def parse_geofips(geofips):
+    """
+    Code FIPS entier d'un État à partir du GeoFIPS du BEA (' "01000"' -> 1).
+
+    Args:
+        geofips (pandas.Series) : colonne GeoFIPS
+
+    Returns:
+        pandas.Series d'entiers
+    """
+    return geofips.str.replace('"', '').str.strip().str[:-3].astype(int)
+
+
+class StateCrosswalk:
+    """
+    Correspondance FIPSST (entier) -> code USPS, nom et ligne de la table géographique.
+
+    Args:
+        table (pandas.DataFrame) : indexée par FIPSST (entier), colonnes "usps" et
+            "name" (catégorielles) et "row" (position dans la table géographique)
+    """
+
+    def __init__(self, table):
+        self.table = table
+        # code USPS -> FIPSST par les codes de la catégorie (pas de dictionnaire Python)
+        usps = self.table["usps"]
+        self._fips_by_code = np.zeros(len(usps.cat.categories), dtype=np.int64)
+        self._fips_by_code[usps.cat.codes.to_numpy()] = self.table.index.to_numpy()
+
+    @classmethod
+    def from_frame(cls, df, fips="FIPSST", usps="STUSPS", name="GeoName"):
+        """
+        Correspondance construite sur une table géographique (une ligne par État), par
+        exemple la sortie de `clean_data.clean_enrichment_datasets`.
+
+        Args:
+            df (pandas.DataFrame) : table avec les colonnes FIPSST (entier), STUSPS et
+                GeoName ; à défaut de FIPSST, le code est extrait de GeoFIPS
+            fips, usps, name (str) : noms des colonnes
+
+        Returns:
+            StateCrosswalk
+        """
+        codes = df[fips] if fips in df.columns else parse_geofips(df["GeoFIPS"])
+        table = pd.DataFrame({
+            "usps": pd.Categorical(df[usps].to_numpy()),
+            "name": pd.Categorical(df[name].to_numpy()),
+            "row": np.arange(len(df)),
+        }, index=pd.Index(codes.to_numpy(dtype=np.int64), name="FIPSST"))
+        return cls(table)
+
+    @classmethod
+    def default(cls):
+        """
+        Correspondance des 50 États et du District de Columbia (`STATES`), sans table
+        géographique (`row` : position dans `STATES`).
+        """
+        return cls.from_frame(pd.DataFrame(STATES, columns=["FIPSST", "STUSPS", "GeoName"]))
+
+    @property
+    def fips(self):
+        return self.table.index
+
+    def to_fips(self, usps):
+        """
+        Codes FIPS d'une colonne de codes USPS (valeur manquante si le code est inconnu).
+
+        Args:
+            usps (pandas.Series) : codes USPS
+
+        Returns:
+            pandas.Series (entiers nullables), même index que `usps`
+        """
+        codes = pd.Categorical(usps, categories=self.table["usps"].cat.categories).codes
+        fips = pd.array(self._fips_by_code[codes], dtype="Int64")
+        fips[codes < 0] = pd.NA
+        return pd.Series(fips, index=usps.index, name="FIPSST")
+
+    def names(self, fips=None):
+        """
+        Noms des États, dans l'ordre de `fips` (par défaut, ordre de la table).
+        """
+        names = self.table["name"]
+        return names if fips is None else names.reindex(fips)
+
+    def align(self, data):
+        """
+        Données indexées par FIPSST réordonnées selon la table (une ligne par État,
+        valeur manquante pour un État absent).
+        """
+        return data.reindex(self.fips)
+
+    def rows(self, frame):
+        """
+        Lignes de la table géographique `frame` (celle qui a servi à construire la
+        correspondance), dans l'ordre de la table.
+        """
+        return frame.iloc[self.table["row"].to_numpy()]
@@ -0,0 +1,139 @@
+import re
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# colonnes du format large produit par model.global_health_over_years
+WIDE_COLUMN = re.compile(
+    r"^(?:sub_indicator_(?P<theme>\w+?)|indicator_global_health)_(?P<year>\d{4})$")
+
+STORE_SCHEMA = pa.schema([
+    ("FIPSST", pa.int16()),
+    ("value", pa.float64()),
+    ("theme", pa.string()),
+    ("year", pa.string()),
+])
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("theme", pa.string()), ("year", pa.string())]), flavor="hive")
+
+
+def indicators_to_long(df_indicator):
+    """
+    Passe les indicateurs du format large (`sub_indicator_<thème>_<année>`,
+    `indicator_global_health_<année>`) au format long (État, année, thème, valeur).
+
+    Args:
+        df_indicator : pandas.DataFrame
+            Indicateurs indexés par FIPSST (sortie de `model.global_health_over_years`).
+
+    Returns:
+        pandas.DataFrame
+            Colonnes FIPSST, year, theme, value. L'indicateur global porte le
+            thème "global".
+    """
+    df_long = df_indicator.rename_axis("FIPSST").reset_index().melt(
+        id_vars="FIPSST", var_name="column", value_name="value")
+    parts = df_long["column"].str.extract(WIDE_COLUMN)
+    df_long["theme"] = parts["theme"].fillna("global")
+    df_long["year"] = parts["year"]
+    df_long = df_long.dropna(subset=["year"]).drop(columns="column")
+    df_long["FIPSST"] = df_long["FIPSST"].astype(int)
+    return df_long[["FIPSST", "year", "theme", "value"]]
+
+
+def long_to_indicators(df_long):
+    """
+    Reconstruit le format large attendu par les fonctions de visualisation et de
+    comparaison à partir du format long.
+
+    Args:
+        df_long : pandas.DataFrame
+            Colonnes FIPSST, year, theme, value.
+
+    Returns:
+        pandas.DataFrame
+            Indicateurs indexés par FIPSST, colonnes `sub_indicator_<thème>_<année>`
+            et `indicator_global_health_<année>`.
+    """
+    names = ("sub_indicator_" + df_long["theme"] + "_" + df_long["year"]).where(
+        df_long["theme"] != "global", "indicator_global_health_" + df_long["year"])
+    wide = df_long.assign(column=names).pivot(index="FIPSST", columns="column", values="value")
+    wide.columns.name = None
+    return wide
+
+
+def write_indicator_store(df_indicator, path, filesystem=None):
+    """
+    Écrit les indicateurs au format long dans un jeu de données parquet
+    partitionné par thème et par année (`theme=<thème>/year=<année>/`).
+
+    Args:
+        df_indicator : pandas.DataFrame
+            Indicateurs indexés par FIPSST (sortie de `model.global_health_over_years`).
+        path (str) : dossier de destination
+        filesystem : système de fichiers pyarrow ou fsspec (optionnel, local par défaut)
+
+    Returns:
+        rien
+    """
+    df_long = indicators_to_long(df_indicator)
+    table = pa.Table.from_pandas(df_long, schema=STORE_SCHEMA, preserve_index=False)
+    ds.write_dataset(table, path, format="parquet", partitioning=PARTITIONING,
+                     filesystem=filesystem, existing_data_behavior="delete_matching")
+
+
+class IndicatorStore:
+    """
+    Accès en lecture au stock d'indicateurs écrit par `write_indicator_store`.
+
+    Seuls les fichiers des partitions (thème, année) demandées sont lus, et les
+    États sont filtrés au moment de la lecture.
+    """
+
+    def __init__(self, path, filesystem=None):
+        self.dataset = ds.dataset(path, format="parquet", partitioning=PARTITIONING,
+                                  filesystem=filesystem)
+
+    def get(self, theme=None, years=None, states=None, wide=False):
+        """
+        Lecture d'une sélection d'indicateurs.
+
+        Args:
+            theme (str ou list) : thème(s) ("mental", "health", "eco", "global", ...)
+            years (list) : années
+            states (list) : codes FIPS des États
+            wide (bool) : renvoyer le format large de `model.global_health_over_years`
+
+        Returns:
+            pandas.DataFrame au format long (ou large si `wide=True`)
+        """
+        conditions = []
+        if theme is not None:
+            themes = [theme] if isinstance(theme, str) else list(theme)
+            conditions.append(ds.field("theme").isin(themes))
+        if years is not None:
+            conditions.append(ds.field("year").isin([str(y) for y in years]))
+        if states is not None:
+            conditions.append(ds.field("FIPSST").isin([int(s) for s in states]))
+
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+
+        df_long = self.dataset.to_table(filter=expression).to_pandas()
+        df_long = df_long[["FIPSST", "year", "theme", "value"]]
+        if wide:
+            return long_to_indicators(df_long)
+        return df_long.sort_values(["theme", "year", "FIPSST"]).reset_index(drop=True)
+
+    def partitions(self):
+        """
+        Couples (thème, année) disponibles, lus depuis l'arborescence sans ouvrir les fichiers.
+
+        Returns:
+            list of tuple
+        """
+        keys = [ds.get_partition_keys(fragment.partition_expression)
+                for fragment in self.dataset.get_fragments()]
+        return sorted({(key["theme"], key["year"]) for key in keys})
@@ -0,0 +1,326 @@
+"""
+Bases NSCH imputées conservées sur disque au format Feather (Arrow IPC, non
+compressé), un fichier par année, et lues par projection mémoire (memory map).
+
+Les colonnes numériques sont exposées sous forme de vues numpy sans copie
+(`Survey.column`) : les étapes d'indicateurs (`model.calculate_indicator`) et
+d'ACM lisent directement les pages du fichier, partagées par tous les processus
+qui ouvrent le même dossier.
+
+Le catalogue des statistiques de colonnes (`script.catalog`) est conservé dans les
+métadonnées du schéma de chaque fichier (`Survey.statistics`).
+
+`SharedSurvey` offre la même interface à partir de blocs
+`multiprocessing.shared_memory` : seul un descripteur de quelques centaines
+d'octets est transmis aux processus d'un pool, qui lisent les colonnes sans
+sérialisation ni duplication de la mémoire.
+
+Exemple :
+    write_survey(dfs_final, "data/survey/")
+    survey = Survey("data/survey/")
+    fwc = survey.column("2024", "FWC")     # numpy.ndarray en lecture seule
+    df = survey["2024"]                     # DataFrame construit sur les mêmes tampons
+
+    with SharedSurvey.create(dfs_final) as shared:
+        executor.map(calculate, [shared] * 16)   # chaque tâche reçoit le descripteur
+"""
+import json
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from script.catalog import (STATISTICS_KEY, attached_statistics, column_statistics,
+                            parse_statistics)
+
+
+def _survey_path(directory, year):
+    return os.path.join(directory, f"nsch_{year}.feather")
+
+
+def _to_table(df):
+    """
+    Conversion d'une base en table Arrow ; les NaN des colonnes numériques restent des
+    NaN (et non des valeurs nulles Arrow) pour permettre la lecture sans copie.
+    """
+    arrays = {}
+    for col in df.columns:
+        values = df[col].to_numpy()
+        if values.dtype.kind in "biuf":
+            arrays[col] = pa.array(values)
+        else:
+            arrays[col] = pa.array(df[col].astype(object).tolist())
+    return pa.table(arrays)
+
+
+def _statistics_text(df):
+    # catalogue attaché à la base (`script.catalog`), calculé s'il est absent ou périmé
+    return attached_statistics(df) or json.dumps(column_statistics(df))
+
+
+def write_survey(dfs, directory, years=None):
+    """
+    Écrit les bases NSCH (une par année) au format Feather non compressé, en un seul
+    bloc par fichier (condition de la lecture sans copie). Le catalogue des statistiques
+    de colonnes (`script.catalog`) est écrit dans les métadonnées du schéma.
+
+    Args:
+        dfs (dict) : dictionnaire des dataset NSCH imputés
+        directory (str) : dossier local
+        years (list) : années à écrire (par défaut toutes)
+
+    Returns:
+        Survey : accès en lecture au dossier écrit
+    """
+    os.makedirs(directory, exist_ok=True)
+    for year in (years or list(dfs)):
+        table = _to_table(dfs[year])
+        table = table.replace_schema_metadata({STATISTICS_KEY: _statistics_text(dfs[year])})
+        path = _survey_path(directory, year)
+        # écriture dans un fichier temporaire : un lecteur ne voit jamais un fichier partiel
+        feather.write_feather(table, path + ".tmp", compression="uncompressed",
+                              chunksize=max(table.num_rows, 1))
+        os.replace(path + ".tmp", path)
+    return Survey(directory)
+
+
+class Survey:
+    """
+    Accès aux bases NSCH d'un dossier écrit par `write_survey`.
+
+    Seul le chemin du dossier est transmis lors de la sérialisation (pickle) : chaque
+    processus rouvre les fichiers par projection mémoire au lieu de recevoir une copie
+    des données.
+
+    Args:
+        directory (str) : dossier contenant les fichiers `nsch_<année>.feather`
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._tables = {}
+
+    def __getstate__(self):
+        return {"directory": self.directory}
+
+    def __setstate__(self, state):
+        self.__init__(state["directory"])
+
+    @property
+    def years(self):
+        names = sorted(os.listdir(self.directory), reverse=True)
+        return [name[len("nsch_"):-len(".feather")] for name in names
+                if name.startswith("nsch_") and name.endswith(".feather")]
+
+    def __contains__(self, year):
+        return os.path.exists(_survey_path(self.directory, year))
+
+    def table(self, year):
+        """
+        Table Arrow d'une année, projetée en mémoire (ouverte au premier accès).
+        """
+        if year not in self._tables:
+            self._tables[year] = feather.read_table(_survey_path(self.directory, year),
+                                                    memory_map=True)
+        return self._tables[year]
+
+    def columns(self, year):
+        return self.table(year).column_names
+
+    def column(self, year, name):
+        """
+        Colonne d'une année sous forme de tableau numpy : vue sans copie sur le fichier
+        projeté pour les colonnes numériques, copie pour les autres (booléens, texte).
+
+        Args:
+            year (str) : année
+            name (str) : variable
+
+        Returns:
+            numpy.ndarray
+        """
+        chunked = self.table(year).column(name)
+        array = chunked.chunk(0) if chunked.num_chunks == 1 else chunked.combine_chunks()
+        try:
+            return array.to_numpy(zero_copy_only=True)
+        except pa.ArrowInvalid:
+            return array.to_numpy(zero_copy_only=False)
+
+    def statistics(self, year):
+        """
+        Catalogue des statistiques de colonnes (`script.catalog`), lu dans les
+        métadonnées du fichier sans parcourir les colonnes.
+        """
+        metadata = self.table(year).schema.metadata or {}
+        text = metadata.get(STATISTICS_KEY.encode())
+        if text is None:  # fichier écrit sans catalogue
+            return column_statistics(self.frame(year))
+        return parse_statistics(text.decode())
+
+    def frame(self, year, columns=None):
+        """
+        DataFrame d'une année ; les colonnes numériques partagent les tampons du
+        fichier projeté (un bloc pandas par colonne, pas de consolidation).
+
+        Args:
+            year (str) : année
+            columns (list) : variables à lire (par défaut toutes)
+
+        Returns:
+            pandas.DataFrame
+        """
+        table = self.table(year)
+        if columns is not None:
+            table = table.select(list(columns))
+        return table.to_pandas(split_blocks=True)
+
+    def __getitem__(self, year):
+        # compatibilité avec les fonctions qui attendent un dictionnaire de DataFrames
+        return self.frame(year)
+
+
+# alignement (octets) du début de chaque colonne dans un bloc de mémoire partagée
+_ALIGNMENT = 64
+
+
+def _attach(name):
+    """
+    Ouverture d'un bloc de mémoire partagée existant, sans le confier au
+    resource_tracker (seul le processus propriétaire le supprime).
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 : les processus d'un pool partagent le resource_tracker
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedSurvey:
+    """
+    Colonnes numériques des bases NSCH en mémoire partagée, un bloc par année.
+
+    Même interface de lecture que `Survey` (`years`, `columns`, `column`, `frame`,
+    `[année]`) : les fonctions de `script.model` l'acceptent à la place du
+    dictionnaire de DataFrames. La sérialisation (pickle) ne transmet que la
+    description des blocs (nom, position, type et longueur des colonnes).
+
+    Le processus qui a créé les blocs (`create`) doit les libérer avec `close`,
+    ou utiliser l'objet comme gestionnaire de contexte.
+
+    Args:
+        layout (dict) : année -> {"name": nom du bloc, "length": nombre de lignes,
+            "columns": {variable: (position en octets, type numpy)},
+            "statistics": (position, longueur) du catalogue JSON dans le bloc}
+    """
+
+    def __init__(self, layout, owner=False):
+        self.layout = layout
+        self._owner = owner
+        self._blocks = {}
+
+    @classmethod
+    def create(cls, dfs, columns=None, years=None):
+        """
+        Copie (une seule fois) les colonnes numériques des bases en mémoire partagée.
+
+        Args:
+            dfs (dict) : dictionnaire des dataset NSCH imputés
+            columns (list) : variables à partager (par défaut toutes les colonnes numériques)
+            years (list) : années à partager (par défaut toutes)
+
+        Returns:
+            SharedSurvey : propriétaire des blocs créés
+        """
+        layout, blocks = {}, {}
+        for year in (years or list(dfs)):
+            df = dfs[year]
+            selected = [col for col in (columns or df.columns)
+                        if df[col].to_numpy().dtype.kind in "biuf"]
+            offsets, size = {}, 0
+            for col in selected:
+                dtype = df[col].to_numpy().dtype
+                offsets[col] = (size, dtype.str)
+                size += -(-len(df) * dtype.itemsize // _ALIGNMENT) * _ALIGNMENT
+            # catalogue des statistiques (JSON) à la suite des colonnes, hors du descripteur
+            text = _statistics_text(df).encode()
+            shm = shared_memory.SharedMemory(create=True, size=size + len(text))
+            for col, (offset, dtype) in offsets.items():
+                view = np.ndarray(len(df), dtype=dtype, buffer=shm.buf, offset=offset)
+                view[:] = df[col].to_numpy()
+            shm.buf[size:size + len(text)] = text
+            layout[year] = {"name": shm.name, "length": len(df), "columns": offsets,
+                            "statistics": (size, len(text))}
+            blocks[year] = shm
+        survey = cls(layout, owner=True)
+        survey._blocks = blocks
+        return survey
+
+    def __getstate__(self):
+        return {"layout": self.layout}
+
+    def __setstate__(self, state):
+        self.__init__(state["layout"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def years(self):
+        return list(self.layout)
+
+    def __contains__(self, year):
+        return year in self.layout
+
+    def columns(self, year):
+        return list(self.layout[year]["columns"])
+
+    def column(self, year, name):
+        """
+        Colonne d'une année : vue numpy (lecture seule) sur le bloc de mémoire partagée.
+        """
+        if year not in self._blocks:
+            self._blocks[year] = _attach(self.layout[year]["name"])
+        offset, dtype = self.layout[year]["columns"][name]
+        view = np.ndarray(self.layout[year]["length"], dtype=dtype,
+                          buffer=self._blocks[year].buf, offset=offset)
+        view.flags.writeable = False
+        return view
+
+    def statistics(self, year):
+        """
+        Catalogue des statistiques de colonnes (`script.catalog`), lu dans le bloc de
+        mémoire partagée.
+        """
+        if year not in self._blocks:
+            self._blocks[year] = _attach(self.layout[year]["name"])
+        offset, length = self.layout[year]["statistics"]
+        return parse_statistics(bytes(self._blocks[year].buf[offset:offset + length]).decode())
+
+    def frame(self, year, columns=None):
+        """
+        DataFrame d'une année construit sur les vues de la mémoire partagée (sans copie).
+        """
+        columns = columns or self.columns(year)
+        return pd.DataFrame({col: self.column(year, col) for col in columns}, copy=False)
+
+    def __getitem__(self, year):
+        return self.frame(year)
+
+    def close(self):
+        """
+        Détache les blocs ; le processus propriétaire les supprime également.
+        """
+        for shm in self._blocks.values():
+            try:
+                shm.close()
+            except BufferError:  # vues encore référencées : projection libérée avec elles
+                pass
+            if self._owner:
+                shm.unlink()
+        self._blocks = {}
+        self._owner = False
@@ -0,0 +1,219 @@
+"""
+Données synthétiques au format des sources du projet, pour les mesures de
+performance sans accès aux fichiers SAS du stockage S3 :
+- bases NSCH (FIPSST, FWC, FORMTYPE, variables ordinales/binaires, HEIGHT/WEIGHT),
+- données économiques au format BEA (SASUMMARY),
+- shapefile simplifié des États,
+- rapport d'America's Health Rankings.
+"""
+import numpy as np
+import pandas as pd
+
+from script.pipeline import DEFAULT_CONFIG, load_config
+from script.states import STATES
+
+# variables économiques du fichier BEA (sans l'année)
+BEA_DESCRIPTIONS = [
+    "Disposable personal income",
+    "Gross domestic product (GDP)",
+    "Implicit regional price deflator 10/",
+    "Per capita disposable personal income 7/",
+    "Per capita personal consumption expenditures (PCE) 8/",
+    "Per capita personal income 6/",
+    "Personal consumption expenditures",
+    "Personal income",
+    "Real GDP (millions of chained 2017 dollars) 1/",
+    "Real PCE (millions of constant (2017) dollars) 3/",
+    "Real per capita PCE 5/",
+    "Real per capita personal income 4/",
+    "Real personal income (millions of constant (2017) dollars) 2/",
+    "Regional price parities (RPPs) 9/",
+    "Total employment (number of jobs)",
+]
+
+
+def codebook(variables=None):
+    """
+    Nombre de modalités (codées de 1 à k) de chaque variable thématique.
+
+    Args:
+        variables (dict) : section "variables" de la configuration
+        (par défaut, celle de `config/pipeline.json`)
+
+    Returns:
+        dict : variable -> nombre de modalités
+    """
+    if variables is None:
+        variables = load_config(DEFAULT_CONFIG)["variables"]
+    codes = {}
+    for var in variables["health_category_vars"]:
+        codes[var] = 5
+    for var in variables["mental_category_vars"] + variables["NSCH_eco_cat_vars"]:
+        codes[var] = 4
+    for key in ["health_bin_vars", "mental_bin_vars", "NSCH_eco_bin_vars"]:
+        for var in variables[key]:
+            codes[var] = 2
+    return codes
+
+
+def synthetic_nsch(n_rows, seed=None, variables=None, missing_rate=0.05, imputed=False,
+                   include_age=False):
+    """
+    Génère une base au format NSCH.
+
+    Les États sont tirés selon une loi de Dirichlet (effectifs inégaux), les poids FWC
+    selon une loi log-normale, FORMTYPE selon l'âge (T1 : 0-5 ans, T2 : 6-11 ans,
+    T3 : 12-17 ans). HEIGHT et WEIGHT sont absents pour FORMTYPE = T1.
+
+    Args:
+        n_rows (int) : nombre d'individus
+        seed (int) : graine du générateur aléatoire
+        variables (dict) : section "variables" de la configuration
+        missing_rate (float) : taux moyen de valeurs manquantes par variable
+        imputed (bool) : produire une base au format post-imputation
+            (pas de valeur manquante hors HEIGHT/WEIGHT pour T1, FIPSST entier)
+        include_age (bool) : ajouter la variable d'âge SC_AGE_YEARS
+
+    Returns:
+        pandas.DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    fips = np.array([code for code, _, _ in STATES])
+    state_share = rng.dirichlet(np.full(len(fips), 5.0))
+    position = rng.choice(len(fips), size=n_rows, p=state_share)
+    state = fips[position]
+    # effet État : certains États ont des réponses systématiquement meilleures
+    effect = rng.normal(0, 0.3, len(fips))[position]
+
+    age = rng.integers(0, 18, size=n_rows)
+    formtype = np.where(age <= 5, 1, np.where(age <= 11, 2, 3))
+
+    data = {
+        "FIPSST": state if imputed else np.char.zfill(state.astype(str), 2),
+        "FWC": rng.lognormal(mean=5.5, sigma=0.8, size=n_rows),
+        "FORMTYPE": np.char.add("T", formtype.astype(str)),
+    }
+    if include_age:
+        data["SC_AGE_YEARS"] = age.astype(float)
+
+    for var, n_codes in codebook(variables).items():
+        # modalité 1 = meilleure situation, plus probable dans les États à effet positif
+        latent = rng.normal(0, 1, size=n_rows) - effect
+        cuts = np.quantile(latent, np.linspace(0, 1, n_codes + 1)[1:-1] ** 0.7)
+        values = (np.searchsorted(cuts, latent) + 1).astype(float)
+        if not imputed:
+            values[rng.random(n_rows) < rng.uniform(0, 2 * missing_rate)] = np.nan
+        data[var] = values
+
+    older = formtype != 1
+    height = np.where(older, 100 + 5 * age + rng.normal(0, 8, n_rows), np.nan)
+    weight = np.where(older, 15 + 2.8 * age + rng.normal(0, 6, n_rows), np.nan)
+    if not imputed:
+        height[older & (rng.random(n_rows) < missing_rate)] = np.nan
+        weight[older & (rng.random(n_rows) < missing_rate)] = np.nan
+    data["HEIGHT"] = np.round(height)
+    data["WEIGHT"] = np.round(weight)
+
+    return pd.DataFrame(data)
+
+
+def synthetic_dfs(years=("2024", "2023", "2022", "2021"), n_rows=55_000, seed=0, **kwargs):
+    """
+    Génère le dictionnaire des bases NSCH indexé par année.
+
+    Args:
+        years (list) : années
+        n_rows (int) : nombre d'individus par année
+        seed (int) : graine (décalée pour chaque année)
+        **kwargs : arguments de `synthetic_nsch`
+
+    Returns:
+        dict : année -> pandas.DataFrame
+    """
+    return {str(year): synthetic_nsch(n_rows, seed=seed + i, **kwargs)
+            for i, year in enumerate(years)}
+
+
+def synthetic_gdp(seed=0):
+    """
+    Génère un fichier économique au format BEA (SASUMMARY__ALL_AREAS_1998_2024.csv),
+    avec la ligne agrégée des États-Unis et les quatre lignes de notes de bas de page.
+
+    Args:
+        seed (int) : graine du générateur aléatoire
+
+    Returns:
+        pandas.DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    years = [str(y) for y in range(1998, 2025)]
+    areas = [(0, "United States")] + [(code, name) for code, _, name in STATES]
+    rows = []
+    for code, name in areas:
+        size = rng.lognormal(11, 1)
+        for line, description in enumerate(BEA_DESCRIPTIONS, start=1):
+            level = size * rng.lognormal(0, 0.3)
+            growth = 1 + rng.normal(0.03, 0.01, len(years))
+            values = level * np.cumprod(growth)
+            row = {"GeoFIPS": f' "{code:02d}000"', "GeoName": name, "Region": 0,
+                   "TableName": "SASUMMARY", "LineCode": line,
+                   "IndustryClassification": "...", "Description": description,
+                   "Unit": "Millions of current dollars"}
+            row.update({year: f"{v:.1f}" for year, v in zip(years, values)})
+            rows.append(row)
+    df = pd.DataFrame(rows)
+    notes = pd.DataFrame({"GeoFIPS": ["Note.", "Note.", "Note.", "Source:"]})
+    return pd.concat([df, notes], ignore_index=True)
+
+
+def synthetic_shapefile(path=None):
+    """
+    Génère un GeoDataFrame au format du shapefile cb_2024_us_state_20m
+    (un rectangle par État, plus Porto Rico), et l'écrit si `path` est fourni.
+
+    Args:
+        path (str) : chemin du fichier .shp à écrire (optionnel)
+
+    Returns:
+        geopandas.GeoDataFrame
+    """
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    states = STATES + [(72, "PR", "Puerto Rico")]
+    geometry = [box(-125 + 5 * (i % 12), 25 + 5 * (i // 12),
+                    -121 + 5 * (i % 12), 29 + 5 * (i // 12)) for i in range(len(states))]
+    gdf = gpd.GeoDataFrame({
+        "STATEFP": [f"{code:02d}" for code, _, _ in states],
+        "STATENS": [f"{code:08d}" for code, _, _ in states],
+        "GEOIDFQ": [f"0400000US{code:02d}" for code, _, _ in states],
+        "GEOID": [f"{code:02d}" for code, _, _ in states],
+        "STUSPS": [usps for _, usps, _ in states],
+        "NAME": [name for _, _, name in states],
+        "LSAD": "00",
+        "ALAND": np.arange(len(states), dtype=np.int64) * 10 ** 9,
+        "AWATER": np.arange(len(states), dtype=np.int64) * 10 ** 7,
+    }, geometry=geometry, crs="EPSG:4269")
+    if path is not None:
+        gdf.to_file(path)
+    return gdf
+
+
+def synthetic_annual_report(seed=0):
+    """
+    Génère un rapport annuel au format d'America's Health Rankings
+    (une ligne par État et par catégorie de mesures).
+
+    Args:
+        seed (int) : graine du générateur aléatoire
+
+    Returns:
+        pandas.DataFrame
+    """
+    from script.model import AHR_WEIGHTS
+
+    rng = np.random.default_rng(seed)
+    rows = [{"Edition": 2024, "Report Type": "2024 Annual", "Measure": measure,
+             "State": usps, "Score": rng.normal(0, 0.5)}
+            for _, usps, _ in STATES for measure in AHR_WEIGHTS]
+    return pd.DataFrame(rows)
@@ -0,0 +1,194 @@
+"""
+Contrôle de qualité des bases NSCH : un contrat déclaré (section "validation" de
+la configuration) est vérifié en un seul passage vectorisé par année, les années
+étant contrôlées en parallèle.
+
+Règles du contrat :
+- "missing" : aucune valeur manquante hors des colonnes `nullable` (bases imputées),
+- "missing_formtype" : colonnes `required_unless_formtype` complètes hors du
+  FORMTYPE exempté (HEIGHT/WEIGHT hors T1),
+- "code_range" : modalités entières comprises dans les bornes du codebook,
+- "positive" : poids FWC strictement positifs,
+- "states" : présence de tous les États attendus (FIPSST).
+
+Le résultat est un rapport structuré (une ligne par règle, variable et année), et non
+une assertion qui s'arrête au premier échec.
+
+Exemple :
+    report = validate(dfs_final, build_contract(config))
+    report.failures()            # lignes en échec
+    report.raise_for_failures()  # ValidationError listant tous les échecs
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from script.states import STATES
+
+REPORT_COLUMNS = ["year", "check", "column", "failures", "rows", "passed", "detail"]
+
+
+class ValidationError(AssertionError):
+    """
+    Échec du contrôle de qualité (sous-classe d'AssertionError, comme les assertions
+    de l'ancien `test_imputed`).
+    """
+
+
+def build_contract(config, stage="imputed"):
+    """
+    Contrat de qualité déduit de la configuration.
+
+    Args:
+        config (dict) : configuration (sections "variables" et "validation")
+        stage (str) : "imputed" (bases imputées : contrat complet) ou "raw"
+            (bases lues : sans les règles de complétude)
+
+    Returns:
+        dict : {"nullable", "required_unless_formtype", "ranges", "positive",
+            "states", "complete"}
+    """
+    variables, settings = config["variables"], config.get("validation", {})
+    ranges = {var: tuple(bounds)
+              for key, bounds in settings.get("code_ranges", {}).items()
+              for var in variables[key]}
+    return {
+        "complete": stage == "imputed",
+        "nullable": settings.get("nullable", ["HEIGHT", "WEIGHT"]),
+        "required_unless_formtype": settings.get(
+            "required_unless_formtype", {"formtype": "T1", "columns": ["HEIGHT", "WEIGHT"]}),
+        "ranges": ranges,
+        "positive": settings.get("positive", ["FWC"]),
+        "states": sorted(code for code, _, _ in STATES),
+    }
+
+
+def _record(year, check, column, failures, rows, detail=""):
+    return {"year": year, "check": check, "column": column, "failures": int(failures),
+            "rows": int(rows), "passed": failures == 0, "detail": detail}
+
+
+def validate_year(year, dfs, contract):
+    """
+    Contrôle d'une année en un seul passage : chaque colonne est lue une fois (vue
+    numpy sans copie pour les colonnes flottantes) et toutes ses règles sont évaluées
+    sur ce tableau.
+
+    Args:
+        year (str) : année
+        dfs : dictionnaire des dataset NSCH, ou stockage colonne (`script.survey`)
+        contract (dict) : contrat (voir `build_contract`)
+
+    Returns:
+        list : lignes du rapport (voir `REPORT_COLUMNS`)
+    """
+    exempt = contract["required_unless_formtype"]
+    nullable, ranges = set(contract["nullable"]), contract["ranges"]
+    # DataFrame, ou DataFrame construit sur les vues du stockage colonne (sans copie)
+    df = dfs[year]
+    n_rows = len(df)
+    required = None
+    if contract["complete"] and exempt["formtype"] and "FORMTYPE" in df.columns:
+        required = (df["FORMTYPE"].astype(str) != exempt["formtype"]).to_numpy(dtype=bool)
+
+    records = []
+    for col in df.columns:
+        values = df[col].to_numpy()
+        if values.dtype.kind not in "biuf":
+            if contract["complete"] and col not in nullable:
+                records.append(_record(year, "missing", col, df[col].isna().sum(), n_rows))
+            continue
+        values = values.astype(float, copy=False)
+        missing = np.isnan(values)
+
+        if contract["complete"] and col not in nullable:
+            records.append(_record(year, "missing", col, missing.sum(), n_rows))
+        if required is not None and col in exempt["columns"]:
+            records.append(_record(year, "missing_formtype", col, (missing & required).sum(),
+                                   required.sum(), f"FORMTYPE != {exempt['formtype']}"))
+
+        if col in ranges:
+            low, high = ranges[col]
+            # hors bornes ou non entier ; les valeurs manquantes relèvent de la règle "missing"
+            with np.errstate(invalid="ignore"):
+                invalid = ((values < low) | (values > high) | (values != np.floor(values))) \
+                    & ~missing
+            failures = invalid.sum()
+            detail = f"[{low:g}, {high:g}]"
+            if failures:
+                examples = np.unique(values[invalid])[:5]
+                detail += " ; exemples : " + ", ".join(f"{x:g}" for x in examples)
+            records.append(_record(year, "code_range", col, failures, n_rows, detail))
+
+        if col in contract["positive"]:
+            with np.errstate(invalid="ignore"):
+                records.append(_record(year, "positive", col, (values <= 0).sum(), n_rows))
+
+        if col == "FIPSST" and contract["states"]:
+            present = set(np.unique(values[~missing]).astype(int).tolist())
+            absent = sorted(set(contract["states"]) - present)
+            records.append(_record(year, "states", col, len(absent), len(contract["states"]),
+                                   ", ".join(f"{code:02d}" for code in absent)))
+    return records
+
+
+def validate(dfs, contract, years=None, max_workers=None):
+    """
+    Contrôle de qualité de plusieurs années, en parallèle (threads : les calculs
+    numpy libèrent le GIL).
+
+    Args:
+        dfs : dictionnaire des dataset NSCH, ou stockage colonne (`script.survey`)
+        contract (dict) : contrat (voir `build_contract`)
+        years (list) : années (par défaut toutes)
+        max_workers (int) : nombre de threads (par défaut une par année)
+
+    Returns:
+        ValidationReport
+    """
+    years = list(years or (dfs.years if hasattr(dfs, "years") else dfs))
+    with ThreadPoolExecutor(max_workers=max_workers or max(len(years), 1)) as executor:
+        results = executor.map(lambda year: validate_year(year, dfs, contract), years)
+        records = [record for result in results for record in result]
+    return ValidationReport(pd.DataFrame(records, columns=REPORT_COLUMNS))
+
+
+class ValidationReport:
+    """
+    Rapport du contrôle de qualité.
+
+    Args:
+        table (pandas.DataFrame) : une ligne par (année, règle, variable), colonnes
+            `REPORT_COLUMNS`
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    @property
+    def passed(self):
+        return bool(self.table["passed"].all())
+
+    def failures(self):
+        """
+        Lignes du rapport en échec.
+        """
+        return self.table[~self.table["passed"]]
+
+    def summary(self):
+        """
+        Nombre de règles contrôlées et en échec par année et par type de règle.
+        """
+        return self.table.groupby(["year", "check"]).agg(
+            checked=("passed", "size"), failed=("passed", lambda s: int((~s).sum())))
+
+    def raise_for_failures(self):
+        """
+        Lève une ValidationError listant tous les échecs (aucune si le contrat est respecté).
+        """
+        failures = self.failures()
+        if len(failures):
+            lines = [f"{row.year} {row.check} {row.column} : {row.failures}/{row.rows} {row.detail}"
+                     for row in failures.itertuples()]
+            raise ValidationError("Contrôle de qualité en échec :\n" + "\n".join(lines))